@@ -0,0 +1,102 @@
+import os
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+import barcode
+from barcode.writer import ImageWriter
+
+
+# Loaded once per process instead of on every label
+@functools.lru_cache(maxsize=1)
+def _label_font():
+    try:
+        return ImageFont.truetype("arial.ttf", 16)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def label_path(barcode_dir, barcode_id):
+    return os.path.join(barcode_dir, f"{barcode_id}.png")
+
+
+def render_label(barcode_id, barcode_dir):
+    """
+    Render a Code128 label with the barcode text below it, in memory, and
+    write the PNG once. Module level so process pools can pickle it.
+    """
+    filename = label_path(barcode_dir, barcode_id)
+    img = barcode.get('code128', str(barcode_id), writer=ImageWriter()).render()
+
+    font = _label_font()
+    draw = ImageDraw.Draw(img)
+    bbox = draw.textbbox((0, 0), str(barcode_id), font=font)
+    text_w = bbox[2] - bbox[0]  # right - left
+    text_h = bbox[3] - bbox[1]  # bottom - top
+
+    img_w, img_h = img.size
+    new_img = Image.new("RGB", (img_w, img_h + text_h + 10), "white")
+    new_img.paste(img, (0, 0))
+    draw = ImageDraw.Draw(new_img)
+    draw.text(((img_w - text_w) // 2, img_h + 5), str(barcode_id), fill="black", font=font)
+
+    # Write beside the target and swap in, so a half-written file never looks current
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    new_img.save(tmp, format="PNG")
+    os.replace(tmp, filename)
+    return filename
+
+
+class BarcodeRenderer:
+    """
+    Renders barcode label PNGs off the GUI thread. A label only depends on
+    its barcode text, so one that already exists on disk is never redrawn.
+    """
+
+    def __init__(self, barcode_dir="barcodes", workers=1):
+        self.barcode_dir = barcode_dir
+        os.makedirs(self.barcode_dir, exist_ok=True)
+        # A single worker keeps the queue in submission order
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="barcode")
+
+    def is_current(self, barcode_id):
+        try:
+            return os.path.getsize(label_path(self.barcode_dir, barcode_id)) > 0
+        except OSError:
+            return False
+
+    def submit(self, barcode_id):
+        """Queue a label; returns a Future resolving to the PNG path."""
+        if self.is_current(barcode_id):
+            done = Future()
+            done.set_result(label_path(self.barcode_dir, barcode_id))
+            return done
+        return self._executor.submit(self._render_if_missing, barcode_id)
+
+    # Re-checked on the worker, so repeated saves of a part queued together render once
+    def _render_if_missing(self, barcode_id):
+        if self.is_current(barcode_id):
+            return label_path(self.barcode_dir, barcode_id)
+        return render_label(barcode_id, self.barcode_dir)
+
+    def render_missing(self, barcode_ids, workers=None):
+        """
+        Render every label in barcode_ids that is not on disk yet, spread over
+        a process pool. Returns the number of labels rendered.
+        """
+        existing = set(os.listdir(self.barcode_dir))
+        missing = [b for b in barcode_ids if f"{b}.png" not in existing]
+        if not missing:
+            return 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(render_label, missing, [self.barcode_dir] * len(missing), chunksize=64):
+                pass
+        return len(missing)
+
+    def remove(self, barcode_id):
+        filename = label_path(self.barcode_dir, barcode_id)
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,1182 @@
+"""
+Latency benchmarks for the data layer. Every scenario runs against a
+throwaway database in a temp directory, never against inventory.db.
+
+    python benchmark.py connections --products 5000 --ops 2000
+    python benchmark.py checkout --lines 100 --carts 200
+    python benchmark.py analytics --sales 100000
+    python benchmark.py migrations --products 100000
+    python benchmark.py search --products 200000
+    python benchmark.py barcodes --products 2000
+    python benchmark.py history --sales 200000
+    python benchmark.py rollups --sales 200000
+    python benchmark.py report --lines 1000000
+    python benchmark.py lowstock --products 200000
+    python benchmark.py forecast --products 50000 --days 730
+    python benchmark.py cache --products 100000 --scans 20000
+    python benchmark.py scan --lines 200
+    python benchmark.py ids --ids 20000 --processes 4
+    python benchmark.py tills --tills 4 --sales 500
+    python benchmark.py server --clients 8 --requests 500
+    python benchmark.py ui --products 200000
+    python benchmark.py ledger --products 20000 --movements 2000000
+    python benchmark.py customers --sales 300000 --customers 3000
+    python benchmark.py invoices --sales 1000000 --customers 5000
+    python benchmark.py bills --sales 2000
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from database import Database
+from inventory_manager import InventoryManager
+from migrations import migrate
+from profit_report import ProfitReport
+from sales_analytics import SalesAnalytics
+from sales_manager import SaleManager, OutOfStockError
+from sequences import Sequence, format_barcode, format_invoice, has_valid_check_digit
+from stock_ledger import SNAPSHOT_MIN_MOVEMENTS, stock_at
+from customer_manager import CustomerManager, name_key
+from bill_printer import BillPrinter, render_escpos, render_pdf
+
+
+def _seed_catalogue(database, products):
+    rows = [
+        (f"B{i:08d}", f"PART {i}", f"COMPANY {i % 50}", 100.0 + i % 400, 120.0 + i % 400, 1)
+        for i in range(products)
+    ]
+    with database.transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO categories (category_id, category_name) VALUES (1, 'Quantity')")
+        conn.executemany("""
+            INSERT INTO products (barcode_id, item_name, company, purchase_rate, sale_rate, category_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany(
+            "INSERT INTO stock_units (barcode_id, unit_type, amount) VALUES (?, 'Quantity', 1000000)",
+            [(row[0],) for row in rows]
+        )
+    return [row[0] for row in rows]
+
+
+def _timeit(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(args_list) * 1e6  # microseconds per operation
+
+
+def _report(title, rows):
+    print(f"\n{title}")
+    print(f"{'operation':<24}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:<24}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+# The pre-pool access pattern: a fresh connection and commit per call
+def _legacy_get_product(path, barcode_id):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("""
+            SELECT p.barcode_id, p.item_name, p.company, c.category_name as category_id,
+                   p.purchase_rate, p.sale_rate, s.unit_type, s.amount
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.category_id
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+            WHERE p.barcode_id = ?
+        """, (barcode_id,)).fetchone()
+
+
+def _legacy_update_stock(path, barcode_id, amount_change):
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE stock_units SET amount = amount + ? WHERE barcode_id = ?",
+                     (amount_change, barcode_id))
+        conn.commit()
+
+
+def bench_connections(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        rng = random.Random(42)
+        picks = [rng.choice(barcodes) for _ in range(args.ops)]
+
+        rows = [
+            ("get_product",
+             _timeit(_legacy_get_product, [(path, b) for b in picks]),
+             _timeit(inventory.get_product, [(b,) for b in picks])),
+            ("update_stock",
+             _timeit(_legacy_update_stock, [(path, b, -1) for b in picks]),
+             _timeit(inventory.update_stock, [(b, -1) for b in picks])),
+        ]
+        Database.get(path).close()
+
+    _report(f"Per-operation latency, {args.products} products, {args.ops} ops", rows)
+
+
+def bench_checkout(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        sales = SaleManager(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        rng = random.Random(42)
+        carts = [
+            [{"barcode_id": b, "quantity": rng.randint(1, 3)} for b in rng.sample(barcodes, args.lines)]
+            for _ in range(args.carts)
+        ]
+
+        timings = []
+        for cart in carts:
+            start = time.perf_counter()
+            sales.checkout(cart, "Bench Customer")
+            timings.append((time.perf_counter() - start) * 1000)
+        Database.get(path).close()
+
+    timings.sort()
+    print(f"\ncheckout, {args.lines}-line carts, {args.carts} carts, {args.products} products")
+    print(f"median {timings[len(timings) // 2]:.2f} ms   "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms   max {timings[-1]:.2f} ms")
+
+
+def bench_analytics(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        sales = SaleManager(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        # Sales written the old way: items only in items_json, spread over a year
+        rng = random.Random(42)
+        rows = []
+        for i in range(args.sales):
+            items = [
+                {"barcode_id": b, "name": b, "quantity": 1, "price_per_unit": 10.0, "total_price": 10.0}
+                for b in rng.sample(barcodes, rng.randint(1, 5))
+            ]
+            day = f"2025-{1 + i * 12 // args.sales:02d}-{1 + i % 28:02d} 12:00:00"
+            rows.append((day, json.dumps(items), 10.0 * len(items), "Bench", f"INV{i:09d}"))
+        with inventory.database.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO sales (timestamp, items_json, total_price, customer_name, invoice_no)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+
+        start = time.perf_counter()
+        sales.backfill_sale_items()
+        backfill = time.perf_counter() - start
+
+        target, month = barcodes[0], ("2025-03-01 00:00:00", "2025-04-01 00:00:00")
+
+        def python_scan():
+            conn = inventory.database.connection()
+            qty = 0
+            for timestamp, items_json in conn.execute("SELECT timestamp, items_json FROM sales"):
+                if month[0] <= timestamp < month[1]:
+                    qty += sum(item["quantity"] for item in json.loads(items_json) if item["barcode_id"] == target)
+            return qty
+
+        before = _timeit(python_scan, [()] * 5)
+        after = _timeit(sales.get_product_sales, [(target, *month)] * 200)
+        assert python_scan() == sales.get_product_sales(target, *month)[0]
+        Database.get(path).close()
+
+    print(f"\nsale_items backfill of {args.sales} sales: {backfill:.2f} s")
+    _report("Units of one barcode sold in a month", [("get_product_sales", before, after)])
+
+
+# Schema of the inventory.db that shipped before migrations existed
+LEGACY_SCHEMA = """
+    CREATE TABLE categories (category_id INTEGER PRIMARY KEY AUTOINCREMENT, category_name TEXT NOT NULL UNIQUE);
+    CREATE TABLE products (barcode_id TEXT PRIMARY KEY, item_name TEXT NOT NULL, company TEXT,
+                           purchase_rate REAL, sale_rate REAL, category_id INTEGER);
+    CREATE TABLE stock_units (stock_id INTEGER PRIMARY KEY AUTOINCREMENT, barcode_id TEXT NOT NULL,
+                              unit_type TEXT NOT NULL, amount REAL NOT NULL);
+    CREATE TABLE sales (id INTEGER PRIMARY KEY AUTOINCREMENT, barcode_id TEXT, quantity INTEGER, total_price REAL,
+                        timestamp TEXT DEFAULT (datetime('now')), customer_name TEXT, invoice_no TEXT, items_json TEXT);
+"""
+
+
+def _join_product(conn, barcode_id):
+    return conn.execute("""
+        SELECT p.barcode_id, p.item_name, p.company, c.category_name, p.purchase_rate, p.sale_rate,
+               s.unit_type, s.amount
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.category_id
+        LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+        WHERE p.barcode_id = ?
+    """, (barcode_id,)).fetchone()
+
+
+def _join_all_products(conn):
+    return conn.execute("""
+        SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+        FROM products p
+        LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+    """).fetchall()
+
+
+def bench_migrations(args):
+    # Plain SQL on both sides: InventoryManager expects the migrated schema, and
+    # the same queries before and after isolate what migrate() changes
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        with sqlite3.connect(path) as conn:
+            conn.executescript(LEGACY_SCHEMA)
+        database = Database.get(path)
+        barcodes = _seed_catalogue(database, args.products)
+
+        rng = random.Random(42)
+        picks = [(rng.choice(barcodes),) for _ in range(args.ops)]
+        conn = database.connection()
+
+        ops = [("get_product", lambda b: _join_product(conn, b), picks),
+               ("get_all_products", lambda: _join_all_products(conn), [()] * 3)]
+        before = [_timeit(fn, fn_args) for _, fn, fn_args in ops]
+        print()
+        migrate(database, log=print)
+        rows = [(name, b, _timeit(fn, fn_args)) for (name, fn, fn_args), b in zip(ops, before)]
+        database.close()
+
+    _report(f"Product join cost, {args.products} products", rows)
+
+
+def bench_search(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        _seed_catalogue(inventory.database, args.products)
+
+        # What the dashboard did per keystroke before: load everything, filter in Python
+        def python_filter(text):
+            return [p for p in inventory.get_all_products() if text in p[1].lower()][:args.limit]
+
+        queries = ["p", "pa", "par", "part", "part 12", "part 123", "compan", "company 7"]
+        rows = [(f"'{q}'",
+                 _timeit(python_filter, [(q,)] * 3),
+                 _timeit(inventory.search, [(q, args.limit)] * 50))
+                for q in queries]
+        Database.get(path).close()
+
+    _report(f"Search per keystroke, {args.products} products, top {args.limit}", rows)
+
+
+def bench_barcodes(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        barcode_dir = os.path.join(tmp, "barcodes")
+        inventory = InventoryManager(db=path, barcode_dir=barcode_dir)
+
+        def add(i):
+            return inventory.add_product(barcode_id=f"A{i:08d}", name=f"PART {i}", company="C",
+                                         category_id=1, purchase_rate=1.0, sale_rate=2.0, amount=1)
+
+        # add_product used to render its label inline; waiting on the render reproduces that
+        inline = _timeit(lambda i: inventory.barcodes.submit(add(i)).result(), [(i,) for i in range(50)])
+        queued = _timeit(add, [(i,) for i in range(50, 100)])
+        inventory.barcodes.shutdown()
+
+        _seed_catalogue(inventory.database, args.products)
+        start = time.perf_counter()
+        drawn = inventory.render_missing_barcodes(workers=args.workers)
+        bulk = time.perf_counter() - start
+        Database.get(path).close()
+
+    _report("add_product latency on the calling thread", [("add_product", inline, queued)])
+    print(f"\nrender_missing_barcodes: {drawn} labels in {bulk:.2f} s ({drawn / bulk:.0f} labels/s)")
+
+
+def bench_history(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sales = SaleManager(db=path)
+        rng = random.Random(42)
+        rows = []
+        for i in range(args.sales):
+            items = [{"barcode_id": f"B{rng.randrange(5000):08d}", "name": f"PART {i}", "quantity": 1,
+                      "price_per_unit": 10.0, "total_price": 10.0} for _ in range(rng.randint(1, 5))]
+            rows.append((f"2025-{1 + i * 12 // args.sales:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00",
+                         json.dumps(items), SaleManager.items_summary(items), 10.0 * len(items), f"INV{i:09d}"))
+        with sales.database.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO sales (timestamp, items_json, items_summary, total_price, customer_name, invoice_no)
+                VALUES (?, ?, ?, ?, 'Bench', ?)
+            """, rows)
+
+        # What opening View Sales did before: every sale, every items_json parsed
+        def load_all():
+            return [(row[0], ", ".join(f"{item['name']} x{item['quantity']}" for item in json.loads(row[2])))
+                    for row in sales.get_all_sales()]
+
+        def scroll(pages):
+            page = sales.get_sales_page(limit=100)
+            for _ in range(pages - 1):
+                page = sales.get_sales_page(page[-1][1], page[-1][0], 100)
+
+        rows = [("open window", _timeit(load_all, [()] * 2), _timeit(scroll, [(1,)] * 50)),
+                ("scroll 10 pages", _timeit(load_all, [()] * 2), _timeit(scroll, [(10,)] * 20))]
+        Database.get(path).close()
+
+    _report(f"Sales history, {args.sales} sales", rows)
+
+
+def bench_rollups(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        sales = SaleManager(db=path)
+        analytics = SalesAnalytics(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        # A year of sales, written as items_json and folded into sale_items/sales_daily by the backfill
+        rng = random.Random(42)
+        rows = []
+        for i in range(args.sales):
+            items = [
+                {"barcode_id": b, "name": b, "quantity": 1, "price_per_unit": 10.0, "total_price": 10.0}
+                for b in rng.sample(barcodes, rng.randint(1, 5))
+            ]
+            day = f"2025-{1 + i * 12 // args.sales:02d}-{1 + i % 28:02d} 12:00:00"
+            rows.append((day, json.dumps(items), 10.0 * len(items), "Bench", f"INV{i:09d}"))
+        with inventory.database.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO sales (timestamp, items_json, total_price, customer_name, invoice_no)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        sales.backfill_sale_items()
+
+        conn = inventory.database.connection()
+
+        def month_scan():
+            return conn.execute("""
+                SELECT SUM(si.qty), SUM(si.line_total), SUM(si.qty * si.unit_cost)
+                FROM sales s JOIN sale_items si ON si.sale_id = s.id
+                WHERE s.timestamp >= '2025-03-01' AND s.timestamp < '2025-04-01'
+            """).fetchone()
+
+        def category_scan():
+            return conn.execute("""
+                SELECT p.category_id, SUM(si.line_total)
+                FROM sale_items si JOIN products p ON p.barcode_id = si.barcode_id
+                GROUP BY p.category_id
+            """).fetchall()
+
+        assert month_scan()[1] == analytics.totals("2025-03-01", "2025-04-01").revenue
+        rows = [("month totals", _timeit(month_scan, [()] * 5), _timeit(analytics.totals, [("2025-03-01", "2025-04-01")] * 20)),
+                ("year by category", _timeit(category_scan, [()] * 3), _timeit(analytics.by_category, [("2025-01-01", "2026-01-01")] * 5)),
+                ("get_sales_summary", _timeit(lambda: conn.execute("SELECT SUM(total_price) FROM sales").fetchone(), [()] * 5),
+                 _timeit(sales.get_sales_summary, [()] * 20))]
+        Database.get(path).close()
+
+    _report(f"Sales KPIs, {args.sales} sales, {args.products} products", rows)
+
+
+def bench_report(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        SaleManager(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+        cost = {b: 100.0 + i % 400 for i, b in enumerate(barcodes)}
+
+        # Four-line sales written straight into sales and sale_items
+        rng = random.Random(42)
+        sales, lines = [], []
+        for sale_id in range(1, args.lines // 4 + 1):
+            items = [{"barcode_id": b, "quantity": 2, "total_price": 2 * (cost[b] + 20)}
+                     for b in rng.sample(barcodes, 4)]
+            sales.append((sale_id, json.dumps(items), sum(i["total_price"] for i in items), f"INV{sale_id:09d}"))
+            lines.extend((sale_id, i["barcode_id"], 2, i["total_price"], cost[i["barcode_id"]]) for i in items)
+        with inventory.database.transaction() as conn:
+            conn.executemany("INSERT INTO sales (id, items_json, total_price, invoice_no) VALUES (?, ?, ?, ?)", sales)
+            conn.executemany("""
+                INSERT INTO sale_items (sale_id, barcode_id, qty, line_total, unit_cost) VALUES (?, ?, ?, ?, ?)
+            """, lines)
+        del sales, lines
+
+        # Per-row Python over items_json, as a report would be written without sale_items
+        def python_report():
+            revenue, cogs = {}, {}
+            conn = inventory.database.connection()
+            for (items_json,) in conn.execute("SELECT items_json FROM sales"):
+                for item in json.loads(items_json):
+                    b = item["barcode_id"]
+                    revenue[b] = revenue.get(b, 0) + item["total_price"]
+                    cogs[b] = cogs.get(b, 0) + item["quantity"] * cost[b]
+            ranked = sorted(revenue, key=revenue.get, reverse=True)
+            return sum(revenue.values()) - sum(cogs.values()), ranked
+
+        def numpy_report():
+            report = ProfitReport(db=path)
+            report.abc_classes()
+            report.top_movers()
+            report.dead_stock()
+            return report
+
+        before = _timeit(python_report, [()])
+        after = _timeit(numpy_report, [()] * 3)
+        profit = numpy_report().summary()["gross_profit"]
+        assert abs(profit - python_report()[0]) < 1e-6 * abs(profit)
+        Database.get(path).close()
+
+    _report(f"Profit report, {args.lines} sale lines, {args.products} products", [("full report", before, after)])
+
+
+def bench_lowstock(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        # Every part gets a level; about 1% sit below it
+        rng = random.Random(42)
+        with inventory.database.transaction() as conn:
+            conn.executemany("UPDATE stock_units SET amount = ?, reorder_level = 10 WHERE barcode_id = ?",
+                             [(rng.randint(0, 9) if rng.random() < 0.01 else 100, b) for b in barcodes])
+
+        def table_scan():
+            conn = inventory.database.connection()
+            return conn.execute("""
+                SELECT s.barcode_id, p.item_name, p.company, s.amount, s.reorder_level
+                FROM stock_units s NOT INDEXED
+                JOIN products p ON p.barcode_id = s.barcode_id
+                WHERE s.amount <= s.reorder_level
+                ORDER BY s.amount - s.reorder_level, p.item_name
+            """).fetchall()
+
+        assert table_scan() == inventory.get_low_stock()
+        sale = rng.sample(barcodes, 5)
+        rows = [("get_low_stock", _timeit(table_scan, [()] * 10), _timeit(inventory.get_low_stock, [()] * 50)),
+                ("check 5 sold parts", _timeit(table_scan, [()] * 10), _timeit(inventory.get_low_stock, [(sale,)] * 500))]
+        Database.get(path).close()
+
+    _report(f"Low stock, {args.products} products", rows)
+
+
+def bench_forecast(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        SaleManager(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+
+        # Rollup rows straight into sales_daily: each day a few percent of the catalogue sells
+        rng = random.Random(42)
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        per_day = max(1, args.products // 25)
+        with inventory.database.transaction() as conn:
+            for age in range(args.days):
+                day = (today - datetime.timedelta(days=age)).isoformat()
+                conn.executemany(
+                    "INSERT INTO sales_daily (date, barcode_id, qty, revenue, cost) VALUES (?, ?, ?, 0, 0)",
+                    [(day, b, rng.randint(1, 5)) for b in rng.sample(barcodes, per_day)]
+                )
+            conn.execute("UPDATE stock_units SET amount = abs(random() % 40)")
+            conn.execute("INSERT INTO sales (items_json, total_price, invoice_no) VALUES ('[]', 0, 'INV0')")
+        rollup_rows = per_day * args.days
+
+        # Per-row Python: a dict of running sums per barcode
+        def python_velocity():
+            conn = inventory.database.connection()
+            ma, ewma = {}, {}
+            decay = 0.5 ** (1 / 14)
+            for date, barcode_id, qty in conn.execute("SELECT date, barcode_id, qty FROM sales_daily"):
+                age = (today - datetime.date.fromisoformat(date)).days
+                if age < 28:
+                    ma[barcode_id] = ma.get(barcode_id, 0) + qty / 28
+                ewma[barcode_id] = ewma.get(barcode_id, 0) + qty * decay ** age
+            return ma, ewma
+
+        def cold():
+            inventory._velocity = None
+            inventory.suggest_purchase_order()
+
+        rows = [("velocity + PO (cold)", _timeit(python_velocity, [()]), _timeit(cold, [()] * 3)),
+                ("velocity (cached)", _timeit(python_velocity, [()]), _timeit(inventory.sales_velocity, [()] * 100))]
+        po = inventory.suggest_purchase_order()
+        Database.get(path).close()
+
+    print(f"\n{rollup_rows} rollup rows, {sum(len(lines) for lines in po.values())} parts suggested "
+          f"across {len(po)} companies")
+    _report(f"Demand forecast, {args.products} products, {args.days} days", rows)
+
+
+def bench_cache(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        cached = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        uncached = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"), cache=False)
+        barcodes = _seed_catalogue(cached.database, args.products)
+
+        # Counter traffic: a few hundred fast movers make up most scans
+        rng = random.Random(42)
+        fast = rng.sample(barcodes, 300)
+        scans = [rng.choice(fast) if rng.random() < 0.9 else rng.choice(barcodes) for _ in range(args.scans)]
+
+        def scan_to_cart(inventory, barcode_id, cart):
+            product = inventory.get_product(barcode_id)
+            line = cart.setdefault(barcode_id, [product[1], product[5], 0])
+            line[2] += 1
+
+        cart_off, cart_on = {}, {}
+        before = _timeit(scan_to_cart, [(uncached, b, cart_off) for b in scans])
+        cached.product_cache.reset_stats()
+        after = _timeit(scan_to_cart, [(cached, b, cart_on) for b in scans])
+        assert cart_on == cart_off
+        hits, misses, size = cached.product_cache.stats()
+        Database.get(path).close()
+
+    print(f"\n{hits} hits, {misses} misses ({hits / (hits + misses):.0%}), {size} rows cached")
+    _report(f"Scan to cart, {args.products} products, {args.scans} scans", [("get_product + cart", before, after)])
+
+
+def bench_scan(args):
+    import tkinter as tk
+    from sell_window import SellWindow
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        sales = SaleManager(db=path)
+        barcodes = _seed_catalogue(inventory.database, args.products)
+        rng = random.Random(42)
+        # Each line scanned three times: a new row, then two in-place updates
+        scans = [b for b in rng.sample(barcodes, args.lines) for _ in range(3)]
+        rng.shuffle(scans)
+
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            print(f"\nscan needs a display for the Tk window ({e})")
+            Database.get(path).close()
+            return
+        root.withdraw()
+        window = SellWindow(inventory, sales, parent=None)
+
+        timings = []
+        for barcode_id in scans:
+            start = time.perf_counter()
+            window.barcode_entry.insert(0, barcode_id)
+            window.add_barcode()
+            window.win.update_idletasks()  # include the redraw of the changed row
+            timings.append((time.perf_counter() - start) * 1000)
+        root.destroy()
+        Database.get(path).close()
+
+    timings.sort()
+    print(f"\nscan to display, {args.lines}-line cart, {len(scans)} scans")
+    print(f"median {timings[len(timings) // 2]:.2f} ms   "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms   max {timings[-1]:.2f} ms")
+
+
+def _allocate_ids(path, name, block_size, count):
+    sequence = Sequence(Database.get(path), name, block_size)
+    return [sequence.next_value() for _ in range(count)]
+
+
+def bench_ids(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(Database.get(path))
+
+        rows = []
+        for block_size in (1, 100, 1000):
+            sequence = Sequence(Database.get(path), f"single{block_size}", block_size)
+            per_id = _timeit(sequence.next_value, [()] * args.ids)
+            rows.append((f"block of {block_size}", per_id))
+
+        # Every process reserves its own blocks from the same row at once
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            results = pool.starmap(_allocate_ids, [(path, "shared", 100, args.ids)] * args.processes)
+        elapsed = time.perf_counter() - start
+        Database.get(path).close()
+
+    numbers = [n for result in results for n in result]
+    assert len(set(numbers)) == len(numbers), "duplicate numbers handed out"
+    assert all(result == sorted(result) for result in results)
+    assert all(has_valid_check_digit(format_barcode(n)) for n in numbers[:1000])
+
+    print(f"\n{args.ids} numbers per run")
+    for name, per_id in rows:
+        print(f"{name:<24}{per_id:>10.1f} us/id {1e6 / per_id:>12.0f} ids/s")
+    print(f"{args.processes} processes, block of 100: {len(numbers)} numbers, no duplicates, "
+          f"{len(numbers) / elapsed:.0f} ids/s including process start")
+
+
+def _run_till(path, till, sales, barcodes):
+    manager = SaleManager(db=path)
+    rng = random.Random(till)
+    sold, out_of_stock, timings = 0, 0, []
+    for _ in range(sales):
+        cart = [{"barcode_id": b, "quantity": rng.randint(1, 3)} for b in rng.sample(barcodes, rng.randint(1, 5))]
+        start = time.perf_counter()
+        try:
+            manager.checkout(cart, f"Till {till}")
+            sold += 1
+        except OutOfStockError:
+            out_of_stock += 1
+        timings.append(time.perf_counter() - start)
+    Database.get(path).close()
+    return sold, out_of_stock, timings
+
+
+def bench_tills(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database = Database.get(path)
+        migrate(database)
+        barcodes = _seed_catalogue(database, args.products)
+        # Little stock on few parts, so tills keep selling the same last units
+        with database.transaction() as conn:
+            conn.execute("UPDATE stock_units SET amount = ?", (args.stock,))
+        database.close()
+
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(args.tills) as pool:
+            results = pool.starmap(_run_till, [(path, till, args.sales, barcodes) for till in range(args.tills)])
+        elapsed = time.perf_counter() - start
+
+        conn = database.connection()
+        sales = conn.execute("SELECT COUNT(*), COUNT(DISTINCT invoice_no) FROM sales").fetchone()
+        sold_qty = dict(conn.execute("SELECT barcode_id, SUM(qty) FROM sale_items GROUP BY barcode_id").fetchall())
+        stock = dict(conn.execute("SELECT barcode_id, amount FROM stock_units").fetchall())
+        database.close()
+
+    sold = sum(result[0] for result in results)
+    out_of_stock = sum(result[1] for result in results)
+    timings = sorted(t * 1000 for result in results for t in result[2])
+    lost = [b for b in barcodes if stock[b] + sold_qty.get(b, 0) != args.stock]
+    oversold = [b for b in barcodes if stock[b] < 0]
+
+    print(f"\n{args.tills} tills x {args.sales} carts, {args.products} parts of {args.stock} units each")
+    print(f"{sold} sales, {out_of_stock} refused for stock, {sold / elapsed:.0f} sales/s including process start")
+    print(f"checkout median {timings[len(timings) // 2]:.2f} ms   "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms   max {timings[-1]:.2f} ms")
+    print(f"sales rows {sales[0]}, distinct invoices {sales[1]}, "
+          f"lost updates {len(lost)}, oversold parts {len(oversold)}")
+    assert sales[0] == sales[1] == sold and not lost and not oversold
+
+
+def _run_client(url, client, requests, barcodes, checkout_share):
+    from inventory_server import InventoryClient
+
+    api = InventoryClient(url)
+    rng = random.Random(client)
+    timings = {"lookup": [], "search": [], "checkout": []}
+    refused = 0
+    for _ in range(requests):
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < checkout_share:
+            kind = "checkout"
+            cart = [{"barcode_id": b, "quantity": rng.randint(1, 3)} for b in rng.sample(barcodes, rng.randint(1, 5))]
+            try:
+                api.checkout(cart, f"Client {client}")
+            except OutOfStockError:
+                refused += 1
+        elif roll < checkout_share + 0.1:
+            kind = "search"
+            api.search(f"PART {rng.randint(1, 9)}", limit=20)
+        else:
+            kind = "lookup"
+            assert api.get_product_by_barcode(rng.choice(barcodes))
+        timings[kind].append(time.perf_counter() - start)
+    return timings, refused
+
+
+def bench_server(args):
+    import threading
+    from inventory_server import InventoryServer, InventoryService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        service = InventoryService(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        barcodes = _seed_catalogue(service.inventory.database, args.products)
+        with service.inventory.database.transaction() as conn:
+            conn.execute("UPDATE stock_units SET amount = ?", (args.stock,))
+        server = InventoryServer(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            results = pool.starmap(_run_client, [(url, client, args.requests, barcodes, args.checkouts)
+                                                 for client in range(args.clients)])
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+        conn = service.inventory.database.connection()
+        sales = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        sold_qty = dict(conn.execute("SELECT barcode_id, SUM(qty) FROM sale_items GROUP BY barcode_id").fetchall())
+        stock = dict(conn.execute("SELECT barcode_id, amount FROM stock_units").fetchall())
+        Database.get(path).close()
+
+    total = args.clients * args.requests
+    refused = sum(result[1] for result in results)
+    lost = [b for b in barcodes if stock[b] + sold_qty.get(b, 0) != args.stock or stock[b] < 0]
+    print(f"\n{args.clients} clients x {args.requests} requests, {total / elapsed:.0f} requests/s "
+          f"including process start")
+    for kind in ("lookup", "search", "checkout"):
+        timings = sorted(t * 1000 for result in results for t in result[0][kind])
+        if timings:
+            print(f"{kind:<10}{len(timings):>7}   median {timings[len(timings) // 2]:6.2f} ms   "
+                  f"p95 {timings[int(len(timings) * 0.95)]:6.2f} ms   max {timings[-1]:7.2f} ms")
+    print(f"{sales} sales, {refused} refused for stock, {service.writer.jobs} writes in "
+          f"{service.writer.batches} transactions, lost updates {len(lost)}")
+    assert not lost
+
+
+def bench_ui(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QElapsedTimer, QEventLoop, QTimer
+    from PyQt6.QtWidgets import QApplication
+    from db_worker import DbWorker
+
+    app = QApplication.instance() or QApplication([])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        inventory = InventoryManager(db=path, barcode_dir=os.path.join(tmp, "barcodes"))
+        _seed_catalogue(inventory.database, args.products)
+        worker = DbWorker()
+        # A report-sized read: the whole catalogue in one query
+        heavy = (inventory.get_products_page, None, args.products)
+        inventory.get_products_page(None, args.products)  # warm the page cache for both runs
+
+        def frame_gaps(start_query):
+            """Ms between 60 fps ticks while start_query() runs its query; returns (gaps, query ms)."""
+            gaps, clock, loop, done = [], QElapsedTimer(), QEventLoop(), []
+            ticker = QTimer(interval=16)
+            ticker.timeout.connect(lambda: (gaps.append(clock.restart()), len(done) and loop.quit()))
+            started = time.perf_counter()
+            clock.start()
+            ticker.start()
+            QTimer.singleShot(0, lambda: start_query(lambda *_: done.append(time.perf_counter() - started)))
+            loop.exec()
+            ticker.stop()
+            return gaps, done[0] * 1000
+
+        def on_gui_thread(finished):
+            finished(heavy[0](*heavy[1:]))
+
+        def on_worker(finished):
+            worker.submit(*heavy, on_result=finished)
+
+        results = [("GUI thread", *frame_gaps(on_gui_thread)), ("DbWorker", *frame_gaps(on_worker))]
+        worker.wait()
+        inventory.barcodes.shutdown()
+        Database.get(path).close()
+
+    print(f"\n{args.products}-row read while a 16 ms (60 fps) timer ticks")
+    for name, gaps, query_ms in results:
+        late = sum(gap > 33 for gap in gaps)
+        print(f"{name:<12} query {query_ms:8.1f} ms   longest frame {max(gaps):6.0f} ms   "
+              f"frames over 33 ms: {late} of {len(gaps)}")
+
+
+def bench_ledger(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database = Database.get(path)
+        migrate(database)
+        barcodes = _seed_catalogue(database, args.products)
+
+        # A year of movements, with a snapshot whenever one would have come due
+        rng = random.Random(42)
+        start = datetime.datetime(2025, 1, 1)
+        step = 365 * 86400 / args.movements
+        every = max(SNAPSHOT_MIN_MOVEMENTS, args.products)
+        amounts = dict.fromkeys(barcodes, 0.0)
+        conn = database.connection()
+        with database.transaction():
+            conn.execute("DELETE FROM stock_movements")
+            conn.execute("DELETE FROM stock_snapshot_items")
+            conn.execute("DELETE FROM stock_snapshots")
+            for first in range(0, args.movements, every):
+                rows = []
+                for i in range(first, min(first + every, args.movements)):
+                    barcode_id = rng.choice(barcodes)
+                    qty = rng.choice((-1, -1, -2, 5)) if i >= args.products else 100
+                    amounts[barcode_id] += qty
+                    when = (start + datetime.timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S")
+                    rows.append((i + 1, barcode_id, when, "sale" if qty < 0 else "receipt", qty))
+                conn.executemany("INSERT INTO stock_movements (id, barcode_id, timestamp, kind, qty) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+                snapshot = conn.execute("INSERT INTO stock_snapshots (taken_at, last_movement_id) VALUES (?, ?)",
+                                        (rows[-1][2], rows[-1][0])).lastrowid
+                conn.executemany("INSERT INTO stock_snapshot_items (snapshot_id, barcode_id, amount) VALUES (?, ?, ?)",
+                                 [(snapshot, b, amount) for b, amount in amounts.items()])
+
+        days = [f"2025-{month:02d}-{rng.randint(1, 28):02d}" for month in range(1, 13)]
+        picks = [(day, [rng.choice(barcodes)]) for day in days]
+
+        def replay(when, barcode_ids=None):
+            only = "AND barcode_id = ?" if barcode_ids else ""
+            return dict(conn.execute(f"SELECT barcode_id, SUM(qty) FROM stock_movements "
+                                     f"WHERE timestamp < ? {only} GROUP BY barcode_id",
+                                     (when, *(barcode_ids or ()))).fetchall())
+
+        def nonzero(amounts):
+            return {b: a for b, a in amounts.items() if a}
+
+        assert all(nonzero(replay(day)) == nonzero(stock_at(database, day)) for day in days[:3])
+        assert all(replay(day, ids) == stock_at(database, day, ids) for day, ids in picks)
+        rows = [
+            ("catalogue at a date", _timeit(replay, [(day,) for day in days]),
+             _timeit(stock_at, [(database, day) for day in days])),
+            ("one part at a date", _timeit(replay, picks), _timeit(stock_at, [(database, *pick) for pick in picks])),
+        ]
+        Database.get(path).close()
+
+    _report(f"Point-in-time stock, {args.products} products, {args.movements} movements: "
+            f"full replay vs nearest snapshot", rows)
+
+
+def bench_customers(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        customers = CustomerManager(db=path)
+        rng = random.Random(42)
+        names = [f"Workshop {i:05d} {rng.choice(('Autos', 'Motors', 'Garage'))}" for i in range(args.customers)]
+        rows = []
+        for i in range(args.sales):
+            customer = rng.randrange(args.customers)
+            total = float(rng.randint(100, 5000))
+            rows.append((f"2025-{1 + i * 12 // args.sales:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00", total,
+                         names[customer], f"INV{i:09d}", customer + 1, total if rng.random() < 0.8 else 0.0))
+        with customers.database.transaction() as conn:
+            conn.executemany("INSERT INTO customers (customer_id, name, name_key) VALUES (?, ?, ?)",
+                             [(i + 1, name, name_key(name)) for i, name in enumerate(names)])
+            conn.executemany("""
+                INSERT INTO sales (timestamp, items_json, total_price, customer_name, invoice_no, customer_id, amount_paid)
+                VALUES (?, '[]', ?, ?, ?, ?, ?)
+            """, rows)
+            conn.execute("""
+                UPDATE customers SET (invoices, billed, paid, last_sale_at) = (
+                    SELECT COUNT(*), SUM(total_price), SUM(amount_paid), MAX(timestamp)
+                    FROM sales WHERE sales.customer_id = customers.customer_id)
+            """)
+        conn = customers.database.connection()
+        picks = [rng.randrange(args.customers) for _ in range(20)]
+
+        # Before: free-text customer_name, matched with LIKE over every sale
+        def invoices_by_name(name):
+            return conn.execute("SELECT invoice_no, total_price FROM sales WHERE customer_name LIKE ? "
+                                "ORDER BY timestamp", (name,)).fetchall()
+
+        def balance_by_name(name):
+            return conn.execute("SELECT SUM(total_price - amount_paid) FROM sales WHERE customer_name LIKE ?",
+                                (name,)).fetchone()
+
+        def complete_by_name(prefix):
+            return conn.execute("SELECT DISTINCT customer_name FROM sales WHERE customer_name LIKE ? LIMIT 10",
+                                (prefix + "%",)).fetchall()
+
+        rows = [
+            ("customer's invoices", _timeit(invoices_by_name, [(names[i],) for i in picks]),
+             _timeit(customers.statement, [(i + 1,) for i in picks])),
+            ("outstanding balance", _timeit(balance_by_name, [(names[i],) for i in picks]),
+             _timeit(customers.get_customer, [(i + 1,) for i in picks])),
+            ("autocomplete", _timeit(complete_by_name, [(names[i][:12],) for i in picks]),
+             _timeit(customers.suggest, [(names[i][:12],) for i in picks])),
+            ("autocomplete, short", _timeit(complete_by_name, [(names[i][:4],) for i in picks]),
+             _timeit(customers.suggest, [(names[i][:4],) for i in picks])),
+        ]
+        for i in picks[:3]:
+            balance = balance_by_name(names[i])[0]
+            assert abs(customers.get_customer(i + 1).balance - balance) < 1e-6
+            assert len(customers.statement(i + 1).lines) == len(invoices_by_name(names[i]))
+        Database.get(path).close()
+
+    _report(f"Customer lookups, {args.sales} sales, {args.customers} customers: LIKE scan vs customers table", rows)
+
+
+def bench_invoices(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sales = SaleManager(db=path)
+        rng = random.Random(42)
+        names = [f"Workshop {i:05d}" for i in range(args.customers)]
+        with sales.database.transaction() as conn:
+            conn.executemany("INSERT INTO customers (customer_id, name, name_key) VALUES (?, ?, ?)",
+                             [(i + 1, name, name_key(name)) for i, name in enumerate(names)])
+            for chunk in range(0, args.sales, 100000):
+                rows = []
+                for i in range(chunk, min(chunk + 100000, args.sales)):
+                    customer = rng.randrange(args.customers)
+                    total = float(rng.randint(100, 50000))
+                    rows.append((f"2025-{1 + i * 12 // args.sales:02d}-{1 + i * 336 // args.sales % 28:02d} "
+                                 f"{i % 24:02d}:{i % 60:02d}:00", "PART x1", total,
+                                 names[customer], format_invoice(i + 1), customer + 1, total))
+                conn.executemany("""
+                    INSERT INTO sales (timestamp, items_json, items_summary, total_price, customer_name,
+                                       invoice_no, customer_id, amount_paid)
+                    VALUES (?, '[]', ?, ?, ?, ?, ?, ?)
+                """, rows)
+        conn = sales.database.connection()
+        picks = [rng.randrange(args.customers) for _ in range(20)]
+        invoices = [format_invoice(rng.randrange(1, args.sales)) for _ in range(20)]
+
+        # Before: exact invoice number only, or LIKE over every sale, paged by OFFSET, for anything else
+        def like_search(pattern, start, end, min_total, offset=0):
+            return conn.execute("""
+                SELECT id, timestamp, items_summary, total_price, customer_name, invoice_no FROM sales
+                WHERE invoice_no LIKE ? AND customer_name LIKE ? AND timestamp >= ? AND timestamp < ?
+                  AND total_price >= ?
+                ORDER BY timestamp DESC LIMIT 50 OFFSET ?
+            """, (pattern[0], pattern[1], start, end, min_total, offset)).fetchall()
+
+        def like_pages(n, *search):
+            for page in range(n):
+                like_search(*search, page * 50)
+
+        def pages(n, **filters):
+            page = sales.search_invoices(limit=50, **filters)
+            for _ in range(n - 1):
+                if len(page) < 50:
+                    break
+                page = sales.search_invoices(after=page[-1], limit=50, **filters)
+            return page
+
+        cases = [
+            ("invoice prefix", [(("%s%%" % i[:-2], "%"), "", "~", 0) for i in invoices],
+             [(1,) for _ in invoices], [{"invoice_prefix": i[:-2]} for i in invoices]),
+            ("date range", [(("%", "%"), "2025-06-01", "2025-06-08", 0)] * 5,
+             [(1,)] * 5, [{"start": "2025-06-01", "end": "2025-06-08"}] * 5),
+            ("date range, 10 pages", [(("%", "%"), "2025-06-01", "2025-06-08", 0)] * 5,
+             [(10,)] * 5, [{"start": "2025-06-01", "end": "2025-06-08"}] * 5),
+            ("customer name prefix", [(("%", "Workshop 01%"), "", "~", 0)] * 5,
+             [(1,)] * 5, [{"customer": "Workshop 01"}] * 5),
+            ("customer", [(("%", names[c] + "%"), "", "~", 0) for c in picks],
+             [(1,) for _ in picks], [{"customer": names[c]} for c in picks]),
+            ("amount + month", [(("%", "%"), "2025-03-01", "2025-04-01", 49900)] * 5,
+             [(1,)] * 5, [{"start": "2025-03-01", "end": "2025-04-01", "min_total": 49900}] * 5),
+        ]
+        rows = []
+        for label, before_args, after_args, filters in cases:
+            before = [(n, *search) for (n,), search in zip(after_args, before_args)]
+            after = [(n, f) for (n,), f in zip(after_args, filters)]
+            rows.append((label, _timeit(like_pages, before),
+                         _timeit(lambda n, f: pages(n, **f), after)))
+        for i in invoices[:3]:
+            assert sales.search_invoices(invoice_prefix=i)[0][5] == i
+        Database.get(path).close()
+
+    _report(f"Invoice search, {args.sales} invoices: LIKE scan vs covering indexes", rows)
+
+
+def bench_bills(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sales = SaleManager(db=path)
+        day = "2025-06-01"
+        rows = []
+        for i in range(args.sales):
+            items = [{"barcode_id": f"B{j:08d}", "name": f"PART {j}", "quantity": 1, "price_per_unit": 10.0,
+                      "total_price": 10.0} for j in range(1 + i % 5)]
+            rows.append((f"{day} {i * 86400 // args.sales // 3600:02d}:00:00", json.dumps(items),
+                         10.0 * len(items), format_invoice(i + 1)))
+        with sales.database.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO sales (timestamp, items_json, total_price, customer_name, invoice_no)
+                VALUES (?, ?, ?, 'Bench', ?)
+            """, rows)
+        # Stands in for the printer: every ESC/POS byte is appended to it, synced like a device write
+        device = os.path.join(tmp, "lp0")
+        printer = BillPrinter(spool_dir=os.path.join(tmp, "spool"), device=device)
+        bill_items = [{"name": "PART", "quantity": 1, "total_price": 10.0}] * 3
+        text = printer.generate_bill("Bench", bill_items, invoice_no="INV1")
+
+        # Before: every line concatenated, header and footer rebuilt on each call
+        def concat_bill(customer_name, items, invoice_no):
+            lines = []
+            lines.append("      AL-HAFIZ AUTOS")
+            lines.append("============================")
+            lines.append(f"Invoice #: {invoice_no}")
+            lines.append(f"Customer: {customer_name}")
+            lines.append("----------------------------")
+            total = 0
+            for item in items:
+                lines.append(f"{item['name']} x{item['quantity']} = Rs.{item['total_price']}")
+                total += item['total_price']
+            lines.append("----------------------------")
+            lines.append(f"Total: Rs.{total}")
+            lines.append(f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            lines.append("============================")
+            return "\n".join(lines)
+
+        # Before: the sale waits while the bill is rendered and written out
+        def print_inline():
+            with open(device, "ab") as f:
+                f.write(render_escpos(text))
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Before: a day's reprint fetched and wrote each invoice on its own
+        def day_one_by_one():
+            page = sales.search_invoices(start=day, end="2025-06-02", limit=100)
+            while page:
+                for sale in page:
+                    customer_name, invoice_no, items, sold_at = sales.get_bill(sale[0])
+                    bill = printer.generate_bill(customer_name, items, invoice_no=invoice_no, sold_at=sold_at)
+                    with open(os.path.join(tmp, f"{invoice_no}.pdf"), "wb") as f:
+                        f.write(render_pdf([bill]))
+                page = sales.search_invoices(start=day, end="2025-06-02", after=page[-1], limit=100)
+
+        # Before: the whole audit rendered in memory, then written
+        def export_in_memory(out):
+            bills = list(sales.iter_bills(day, "2025-06-02"))
+            texts = [printer.generate_bill(c, items, invoice_no=i, sold_at=t) for c, i, items, t in bills]
+            with open(out, "wb") as f:
+                f.write(render_pdf(texts))
+
+        peaks = []
+        for export in (export_in_memory, lambda out: printer.export(sales, day, "2025-06-02", out)):
+            tracemalloc.start()
+            export(os.path.join(tmp, "audit.pdf"))
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+            tracemalloc.stop()
+
+        rows = [
+            ("format one bill", _timeit(concat_bill, [("Bench", bill_items, "INV1")] * 2000),
+             _timeit(printer.generate_bill, [("Bench", bill_items, "INV1")] * 2000)),
+            ("print at checkout", _timeit(print_inline, [()] * 50),
+             _timeit(lambda: printer.print_bill(text, invoice_no="INV1"), [()] * 50)),
+            ("export a day to PDF", _timeit(day_one_by_one, [()] * 2),
+             _timeit(lambda: printer.print_day(sales, day, os.path.join(tmp, "day.pdf")), [()] * 2)),
+        ]
+        printer.close()
+        Database.get(path).close()
+
+    _report(f"Bills, {args.sales} invoices in a day: inline vs spooled, per-invoice vs one pass", rows)
+    print(f"audit export peak memory: {peaks[0]:.1f} MB in memory, {peaks[1]:.1f} MB streamed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    p = sub.add_parser("connections", help="fresh connection per call vs pooled connection")
+    p.add_argument("--products", type=int, default=5000)
+    p.add_argument("--ops", type=int, default=2000)
+    p.set_defaults(func=bench_connections)
+
+    p = sub.add_parser("checkout", help="latency of multi-line checkout()")
+    p.add_argument("--products", type=int, default=5000)
+    p.add_argument("--lines", type=int, default=100)
+    p.add_argument("--carts", type=int, default=200)
+    p.set_defaults(func=bench_checkout)
+
+    p = sub.add_parser("analytics", help="items_json scan vs indexed sale_items aggregate")
+    p.add_argument("--products", type=int, default=5000)
+    p.add_argument("--sales", type=int, default=100000)
+    p.set_defaults(func=bench_analytics)
+
+    p = sub.add_parser("migrations", help="join cost on the legacy schema before and after migrate()")
+    p.add_argument("--products", type=int, default=100000)
+    p.add_argument("--ops", type=int, default=50)
+    p.set_defaults(func=bench_migrations)
+
+    p = sub.add_parser("search", help="Python substring filter vs FTS5 search()")
+    p.add_argument("--products", type=int, default=200000)
+    p.add_argument("--limit", type=int, default=200)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("barcodes", help="inline vs queued label rendering, and bulk rendering")
+    p.add_argument("--products", type=int, default=2000)
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=bench_barcodes)
+
+    p = sub.add_parser("history", help="load-all sales history vs keyset pages")
+    p.add_argument("--sales", type=int, default=200000)
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser("rollups", help="aggregates over sales/sale_items vs the sales_daily rollup")
+    p.add_argument("--sales", type=int, default=200000)
+    p.add_argument("--products", type=int, default=5000)
+    p.set_defaults(func=bench_rollups)
+
+    p = sub.add_parser("report", help="per-row items_json loop vs NumPy ProfitReport")
+    p.add_argument("--lines", type=int, default=1000000)
+    p.add_argument("--products", type=int, default=20000)
+    p.set_defaults(func=bench_report)
+
+    p = sub.add_parser("lowstock", help="stock_units scan vs the low-stock partial index")
+    p.add_argument("--products", type=int, default=200000)
+    p.set_defaults(func=bench_lowstock)
+
+    p = sub.add_parser("forecast", help="Python dict velocity vs NumPy forecast, cold and cached")
+    p.add_argument("--products", type=int, default=50000)
+    p.add_argument("--days", type=int, default=730)
+    p.set_defaults(func=bench_forecast)
+
+    p = sub.add_parser("cache", help="scan-to-cart latency with the product cache off and on")
+    p.add_argument("--products", type=int, default=100000)
+    p.add_argument("--scans", type=int, default=20000)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("scan", help="SellWindow scan-to-display latency (needs a display)")
+    p.add_argument("--lines", type=int, default=200)
+    p.add_argument("--products", type=int, default=20000)
+    p.set_defaults(func=bench_scan)
+
+    p = sub.add_parser("ids", help="sequence numbers per second by block size, and across processes")
+    p.add_argument("--ids", type=int, default=20000)
+    p.add_argument("--processes", type=int, default=4)
+    p.set_defaults(func=bench_ids)
+
+    p = sub.add_parser("tills", help="several till processes selling from one database at once")
+    p.add_argument("--tills", type=int, default=4)
+    p.add_argument("--sales", type=int, default=500)
+    p.add_argument("--products", type=int, default=50)
+    p.add_argument("--stock", type=int, default=400)
+    p.set_defaults(func=bench_tills)
+
+    p = sub.add_parser("server", help="concurrent HTTP clients against inventory_server on localhost")
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--products", type=int, default=200)
+    p.add_argument("--stock", type=int, default=200)
+    p.add_argument("--checkouts", type=float, default=0.3, help="share of requests that are checkouts")
+    p.set_defaults(func=bench_server)
+
+    p = sub.add_parser("ui", help="frame gaps while a heavy query runs on vs off the GUI thread")
+    p.add_argument("--products", type=int, default=200000)
+    p.set_defaults(func=bench_ui)
+
+    p = sub.add_parser("ledger", help="point-in-time stock by full ledger replay vs nearest snapshot")
+    p.add_argument("--products", type=int, default=20000)
+    p.add_argument("--movements", type=int, default=2000000)
+    p.set_defaults(func=bench_ledger)
+
+    p = sub.add_parser("customers", help="customer invoices, balance and autocomplete: LIKE scan vs indexed")
+    p.add_argument("--sales", type=int, default=300000)
+    p.add_argument("--customers", type=int, default=3000)
+    p.set_defaults(func=bench_customers)
+
+    p = sub.add_parser("invoices", help="invoice search by prefix, date, customer and amount: LIKE scan vs indexed")
+    p.add_argument("--sales", type=int, default=1000000)
+    p.add_argument("--customers", type=int, default=5000)
+    p.set_defaults(func=bench_invoices)
+
+    p = sub.add_parser("bills", help="printing at checkout and a day's reprint: inline vs spooled")
+    p.add_argument("--sales", type=int, default=2000)
+    p.set_defaults(func=bench_bills)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
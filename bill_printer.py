@@ -1,29 +1,443 @@
-import tkinter as tk
-import tempfile
+"""
+Bill text, and the print pipeline behind it.
+
+Bills are rendered to ESC/POS for 80 mm thermal printers, to PDF, or kept as
+text, and written to a spool directory by a background spooler, so a sale
+never waits on the printer. With a printer device configured the spooler
+also sends each ESC/POS file to it and moves the file to spool/printed;
+without one the spool directory itself stands in for the printer.
+
+    python bill_printer.py day 2026-03-01 [--out bills.pdf] [--db inventory.db]
+    python bill_printer.py export 2026-01-01 2026-04-01 --out audit.pdf
+"""
+import argparse
+import array
 import os
 import datetime
+import functools
+import io
+import itertools
+import textwrap
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from sales_manager import SaleManager
+
+SPOOL_DIR = "spool"
+FORMATS = {"escpos": "bin", "pdf": "pdf", "txt": "txt"}
+
+# Characters per line on an 80 mm roll in font A (576 dots / 12)
+THERMAL_COLUMNS = 48
+
+SHOP_NAME = "AL-HAFIZ AUTOS"
+# Characters per bill line; fits an 80 mm roll and the PDF page
+BILL_COLUMNS = 40
+QTY_COLUMNS = 7
+AMOUNT_COLUMNS = 12
+
+BillTemplate = namedtuple("BillTemplate", "header rule end heading name_width line wrap total")
+
+# ESC/POS commands
+ESC_INIT = b"\x1b@"
+ESC_CODEPAGE_PC437 = b"\x1bt\x00"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+GS_SIZE_DOUBLE = b"\x1d!\x11"
+GS_SIZE_NORMAL = b"\x1d!\x00"
+GS_FEED_AND_CUT = b"\x1dVB\x03"  # feed 3 lines, then partial cut
+
+# PDF pages are receipt-shaped: 80 mm wide, as long as the bill
+PDF_PAGE_WIDTH = 226.8
+PDF_MARGIN = 12
+PDF_FONT_SIZE = 7
+PDF_LEADING = 9
+# Page references and cross-reference entries written per chunk
+PDF_WRITE_CHUNK = 1000
+
+
+@functools.lru_cache(maxsize=8)
+def bill_template(columns=BILL_COLUMNS):
+    """
+    The fixed parts of a bill at one width, built once: header and rule
+    lines, and %-format strings for the aligned item and total lines.
+    """
+    name_width = columns - QTY_COLUMNS - AMOUNT_COLUMNS
+    return BillTemplate(
+        header=(SHOP_NAME.center(columns).rstrip(), "=" * columns),
+        rule="-" * columns,
+        end="=" * columns,
+        heading=f"{'Item':<{name_width}}{'Qty':>{QTY_COLUMNS}}{'Amount':>{AMOUNT_COLUMNS}}",
+        name_width=name_width,
+        line=f"%-{name_width}s%{QTY_COLUMNS}g%{AMOUNT_COLUMNS}.2f",
+        # Long names break between words, the rest indented on lines of their own
+        wrap=textwrap.TextWrapper(width=name_width - 1, subsequent_indent="  ").wrap,
+        total=f"%-{columns - AMOUNT_COLUMNS - 4}s%{AMOUNT_COLUMNS + 4}s",
+    )
+
+
+# The footer's date only changes once a second, however many bills are printed in it
+@functools.lru_cache(maxsize=1)
+def _date_line(second):
+    return time.strftime("Date: %Y-%m-%d %H:%M:%S", time.localtime(second))
+
+
+def _sale_second(sold_at):
+    # sales.timestamp is datetime('now'), i.e. UTC
+    sold_at = datetime.datetime.fromisoformat(str(sold_at))
+    return int(sold_at.replace(tzinfo=sold_at.tzinfo or datetime.timezone.utc).timestamp())
+
+
+def render_escpos(text, columns=THERMAL_COLUMNS):
+    """
+    ESC/POS byte stream for one bill: the first line (the shop name) centred
+    in double size, the rest left aligned and wrapped to the roll, then a cut.
+    """
+    lines = text.split("\n")
+    out = [ESC_INIT, ESC_CODEPAGE_PC437,
+           ESC_ALIGN_CENTER, ESC_BOLD_ON, GS_SIZE_DOUBLE, _escpos_line(lines[0].strip()),
+           GS_SIZE_NORMAL, ESC_BOLD_OFF, ESC_ALIGN_LEFT]
+    for line in lines[1:]:
+        for start in range(0, max(len(line), 1), columns):
+            out.append(_escpos_line(line[start:start + columns]))
+    out.append(GS_FEED_AND_CUT)
+    return b"".join(out)
+
+
+def _escpos_line(line):
+    return line.encode("cp437", errors="replace") + b"\n"
+
+
+def _pdf_escape(line):
+    return line.encode("latin-1", errors="replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+# Bills are a handful of lengths, so each page layout is worked out once
+@functools.lru_cache(maxsize=64)
+def _pdf_page_template(line_count):
+    """:return: (page dictionary with a %d for its contents object, start of its content stream)"""
+    height = 2 * PDF_MARGIN + line_count * PDF_LEADING
+    page = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.1f %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %%d 0 R >>" % (PDF_PAGE_WIDTH, height))
+    # Each line is shown with ', which first moves down one leading
+    stream = b"BT /F1 %d Tf %d TL %d %d Td\n" % (PDF_FONT_SIZE, PDF_LEADING, PDF_MARGIN, height - PDF_MARGIN)
+    return page, stream
+
+
+def write_pdf(f, texts):
+    """
+    Stream a PDF with one receipt-sized page per bill text, in Courier, to a
+    binary file. Pages are written as the texts arrive; only each object's
+    offset is kept, 8 bytes apiece, for the cross-reference table at the end.
+    :return: number of pages
+    """
+    offsets = array.array("q", [0, 0, 0, 0])  # by object number; 0 is the free-list head
+    size = 0
+
+    def put(*chunks):
+        nonlocal size
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+
+    def start(number):
+        if number == len(offsets):
+            offsets.append(size)
+        else:
+            offsets[number] = size
+        put(b"%d 0 obj\n" % number)
+
+    put(b"%PDF-1.4\n")
+    start(1)
+    put(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+    start(3)
+    put(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>\nendobj\n")
+    for text in texts:
+        lines = text.split("\n")
+        page, stream = _pdf_page_template(len(lines))
+        stream += b"".join(b"(" + _pdf_escape(line) + b") '\n" for line in lines) + b"ET"
+        contents = len(offsets)
+        start(contents)
+        put(b"<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(stream), stream))
+        start(contents + 1)
+        put(page % contents, b"\nendobj\n")
+    pages = (len(offsets) - 4) // 2
+
+    # The page tree goes last, once every page's number is known; it and the
+    # cross-reference table are written in chunks so neither is built whole
+    start(2)
+    put(b"<< /Type /Pages /Count %d /Kids [" % pages)
+    for first in range(5, len(offsets), 2 * PDF_WRITE_CHUNK):
+        put(b"".join(b"%d 0 R " % n for n in range(first, min(first + 2 * PDF_WRITE_CHUNK, len(offsets)), 2)))
+    put(b"] >>\nendobj\n")
+    xref = size
+    put(b"xref\n0 %d\n0000000000 65535 f \n" % len(offsets))
+    for first in range(1, len(offsets), PDF_WRITE_CHUNK):
+        put(b"".join(b"%010d 00000 n \n" % offset for offset in offsets[first:first + PDF_WRITE_CHUNK]))
+    put(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets), xref))
+    return pages
+
+
+def render_pdf(texts):
+    """PDF with one receipt-sized page per bill text, in Courier."""
+    out = io.BytesIO()
+    write_pdf(out, texts)
+    return out.getvalue()
+
+
+def render(fmt, texts):
+    """:return: the bytes of one or more bills in a FORMATS format; escpos and txt concatenate them"""
+    if fmt == "pdf":
+        return render_pdf(texts)
+    if fmt == "escpos":
+        return b"".join(render_escpos(text) for text in texts)
+    return "\n\n".join(texts).encode("utf-8")
+
+
+def write_atomic(path, data):
+    # Written beside the target and swapped in, so a half-written bill is never picked up
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def write_bills(path, fmt, texts):
+    """
+    Stream any number of bill texts into one file in a FORMATS format, each
+    written as it arrives, so memory stays flat however many there are.
+    :return: number of bills
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        if fmt == "pdf":
+            count = write_pdf(f, texts)
+        else:
+            count = 0
+            for text in texts:
+                f.write(render(fmt, [text]) + (b"\n\n" if fmt == "txt" else b""))
+                count += 1
+    os.replace(tmp, path)
+    return count
+
+
+class PrintError(Exception):
+    """Bills were spooled but the printer could not take them; their files stay in the spool."""
+
+
+class BillSpooler:
+    """
+    Writes bills into the spool directory on one background thread, in the
+    order they were queued, one file per bill and format named after the
+    invoice. A reprint of an invoice still in the spool gets its own file.
+    """
+
+    def __init__(self, spool_dir=SPOOL_DIR, formats=("escpos", "txt"), device=None):
+        self.spool_dir = spool_dir
+        self.formats = tuple(formats)
+        self.device = device
+        self.printed_dir = os.path.join(spool_dir, "printed")
+        os.makedirs(self.printed_dir, exist_ok=True)
+        self._unnamed = itertools.count(1)
+        # A single worker keeps the queue in submission order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spooler")
+
+    def submit(self, name, text):
+        """Queue one bill; returns a Future resolving to the list of files written."""
+        return self._executor.submit(self._spool, [(name, text)])
+
+    def submit_many(self, bills):
+        """Queue many (name, text) bills as one job, e.g. a whole day's reprint; bills may be a generator."""
+        return self._executor.submit(self._spool, bills)
+
+    def _spool(self, bills):
+        paths, failures = [], []
+        for name, text in bills:
+            name = name or f"bill-{datetime.datetime.now():%Y%m%d-%H%M%S}-{next(self._unnamed)}"
+            for fmt in self.formats:
+                path = write_atomic(self._free_path(name, FORMATS[fmt]), render(fmt, [text]))
+                if fmt == "escpos" and self.device:
+                    try:
+                        path = self._send(path)
+                    except PrintError as e:
+                        failures.append(e)
+                paths.append(path)
+        # Every bill is written first; the Future then fails with what the printer missed
+        if len(failures) == 1:
+            raise failures[0]
+        if failures:
+            raise PrintError(f"{len(failures)} bills were not printed, the first because {failures[0]}")
+        return paths
+
+    def _free_path(self, name, ext):
+        path = os.path.join(self.spool_dir, f"{name}.{ext}")
+        copy = 1
+        while os.path.exists(path) or os.path.exists(os.path.join(self.printed_dir, os.path.basename(path))):
+            copy += 1
+            path = os.path.join(self.spool_dir, f"{name}-{copy}.{ext}")
+        return path
+
+    def _send(self, path):
+        # A failed send leaves the file in the spool for retry_pending
+        try:
+            with open(path, "rb") as src, open(self.device, "ab") as printer:
+                printer.write(src.read())
+        except OSError as e:
+            raise PrintError(f"printing {os.path.basename(path)} failed: {e}") from e
+        printed = os.path.join(self.printed_dir, os.path.basename(path))
+        os.replace(path, printed)
+        return printed
+
+    def pending(self):
+        """ESC/POS files still waiting for the printer, oldest first."""
+        files = [os.path.join(self.spool_dir, f) for f in os.listdir(self.spool_dir) if f.endswith(".bin")]
+        return sorted(files, key=os.path.getmtime)
+
+    def retry_pending(self):
+        """
+        Queue every file a failed send left behind, e.g. once the printer is back.
+        The Future fails with PrintError at the first file the printer still refuses.
+        """
+        return self._executor.submit(self._send_pending)
+
+    def _send_pending(self):
+        return [self._send(path) for path in self.pending()] if self.device else []
+
+    def flush(self):
+        """Block until everything queued so far is written."""
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _on_failure(on_error):
+    # Nobody waits on a spooled bill, so hand its exception to the caller's callback
+    def check(future):
+        if future.exception() is not None:
+            on_error(future.exception())
+    return check
+
 
 class BillPrinter:
-    def generate_bill(self, customer_name, items, invoice_no=None):
-        lines = []
-        lines.append("      AL-HAFIZ AUTOS")
-        lines.append("============================")
+    def __init__(self, spool_dir=SPOOL_DIR, formats=("escpos", "txt"), device=None, columns=BILL_COLUMNS):
+        self.spooler = BillSpooler(spool_dir, formats, device)
+        self.columns = columns
+
+    def iter_bill_lines(self, customer_name, items, invoice_no=None, sold_at=None):
+        """
+        Lines of one bill, yielded as they are formatted.
+        :param items: dicts in the record_sale layout (name, quantity, total_price)
+        :param sold_at: the sale's timestamp as stored in sales, for reprints; None for now
+        """
+        template = bill_template(self.columns)
+        yield from template.header
         if invoice_no:
-            lines.append(f"Invoice #: {invoice_no}")
-        lines.append(f"Customer: {customer_name}")
-        lines.append("----------------------------")
+            yield f"Invoice #: {invoice_no}"
+        yield f"Customer: {customer_name}"
+        yield template.rule
+        yield template.heading
         total = 0
         for item in items:
-            lines.append(f"{item['name']} x{item['qty']} = Rs.{item['total']}")
-            total += item['total']
-        lines.append("----------------------------")
-        lines.append(f"Total: Rs.{total}")
-        lines.append(f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append("============================")
-        return "\n".join(lines)
-
-    def print_bill(self, text):
-        with open("bill.txt", "w") as f:
-            f.write(text)
-        # os.startfile("bill.txt", "print")  # Uncomment when ready to auto print
+            name = str(item["name"])
+            if len(name) < template.name_width:
+                yield template.line % (name, item["quantity"], item["total_price"])
+            else:
+                first, *rest = template.wrap(name) or [""]
+                yield template.line % (first, item["quantity"], item["total_price"])
+                yield from rest
+            total += item["total_price"]
+        yield template.rule
+        yield template.total % ("Total", "Rs.%.2f" % total)
+        yield _date_line(int(time.time()) if sold_at is None else _sale_second(sold_at))
+        yield template.end
+
+    def generate_bill(self, customer_name, items, invoice_no=None, sold_at=None):
+        return "\n".join(self.iter_bill_lines(customer_name, items, invoice_no, sold_at))
+
+    def iter_bill_texts(self, bills):
+        """
+        Format bills one at a time as they are read.
+        :param bills: iterable of (customer_name, invoice_no, items, sold_at), e.g. SaleManager.iter_bills
+        :return: generator of (invoice_no, bill text)
+        """
+        for customer_name, invoice_no, items, sold_at in bills:
+            yield invoice_no, self.generate_bill(customer_name, items, invoice_no=invoice_no, sold_at=sold_at)
+
+    def print_bill(self, text, invoice_no=None, on_error=None):
+        """
+        Queue a bill for printing and return at once.
+        :param on_error: called with the exception if the bill could not be written
+            or printed (PrintError); runs on the spooler thread
+        :return: Future resolving to the spooled file paths
+        """
+        future = self.spooler.submit(invoice_no, text)
+        if on_error is not None:
+            future.add_done_callback(_on_failure(on_error))
+        return future
+
+    def print_day(self, sales_manager, day, path=None):
+        """
+        Reprint every invoice of one day, or export them all to one file.
+        :param day: datetime.date or "YYYY-MM-DD"
+        :param path: file to export to instead of spooling, in the format its extension names
+        :return: number of invoices
+        """
+        day = datetime.date.fromisoformat(str(day))
+        return self.export(sales_manager, str(day), str(day + datetime.timedelta(days=1)), path)
+
+    def export(self, sales_manager, start, end, path=None):
+        """
+        Reprint or export every invoice in [start, end), e.g. for an audit.
+        Bills are read, formatted and written one at a time, so memory stays
+        flat however many there are.
+        :param path: .pdf, .bin (ESC/POS) or .txt file; None to spool each bill as one job
+        :return: number of invoices
+        """
+        bills = self.iter_bill_texts(sales_manager.iter_bills(start, end))
+        if path:
+            fmt = {ext: fmt for fmt, ext in FORMATS.items()}.get(os.path.splitext(path)[1][1:], "txt")
+            return write_bills(path, fmt, (text for _, text in bills))
+        # Run on the spooler thread, which reads the sales through its own connection
+        return len(self.spooler.submit_many(bills).result()) // len(self.spooler.formats)
+
+    def close(self):
+        """Finish writing whatever is still queued."""
+        self.spooler.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprint or export bills.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--spool", default=SPOOL_DIR)
+    parser.add_argument("--device", help="printer device or file the ESC/POS bytes are sent to")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("day", help="every invoice of one day")
+    p.add_argument("day", help="YYYY-MM-DD")
+    p.add_argument("--out", help="write one .pdf, .bin or .txt file here instead of spooling each bill")
+    p = sub.add_parser("export", help="every invoice in [start, end), e.g. for an audit")
+    p.add_argument("start", help="YYYY-MM-DD[ HH:MM:SS]")
+    p.add_argument("end", help="YYYY-MM-DD[ HH:MM:SS], exclusive")
+    p.add_argument("--out", help="write one .pdf, .bin or .txt file here instead of spooling each bill")
+    args = parser.parse_args()
+
+    printer = BillPrinter(spool_dir=args.spool, device=args.device)
+    sales = SaleManager(db=args.db)
+    try:
+        if args.command == "day":
+            count = printer.print_day(sales, args.day, args.out)
+        else:
+            count = printer.export(sales, args.start, args.end, args.out)
+    except PrintError as e:
+        parser.exit(1, f"{e}; the bills are kept in {args.spool}\n")
+    finally:
+        printer.close()
+    print(f"{count} invoice(s) {'exported to ' + args.out if args.out else 'spooled to ' + args.spool}")
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Customers, their balances and statements.
+
+Every sale with a customer name is linked to one customers row, matched on
+a normalised name. Each row carries running totals (invoices, billed, paid),
+kept up to date in the same transaction as the sale or payment, so a
+balance is one primary-key read and a statement only reads its own period.
+
+    python customer_manager.py [--db inventory.db] balances
+    python customer_manager.py [--db inventory.db] statement "Name" [--start 2026-01-01] [--end 2026-02-01]
+"""
+import argparse
+import re
+from collections import namedtuple
+
+from database import Database
+from migrations import migrate
+
+Customer = namedtuple("Customer", "customer_id name phone invoices billed paid balance last_sale_at")
+StatementLine = namedtuple("StatementLine", "timestamp kind ref debit credit balance")
+Statement = namedtuple("Statement", "customer opening_balance lines closing_balance")
+
+# Balances below this are treated as settled
+BALANCE_EPSILON = 0.005
+
+# Prefixes matching more customers than this are suggested from the recency
+# index instead of sorting every match
+SUGGEST_MAX_SORTED = 200
+
+_CUSTOMER_COLUMNS = "customer_id, name, phone, invoices, billed, paid, billed - paid, last_sale_at"
+
+
+def display_name(name):
+    return " ".join((name or "").split())
+
+
+def name_key(name):
+    """Matching key: case-folded with runs of whitespace collapsed, so "ALI  Autos" is "ali autos"."""
+    return " ".join((name or "").casefold().split())
+
+
+def normalize_phone(phone):
+    """Digits only, keeping a leading + ; None when nothing is left."""
+    phone = (phone or "").strip()
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return None
+    return "+" + digits if phone.startswith("+") else digits
+
+
+def prefix_end(prefix):
+    """Upper bound of a prefix range on an index: every key starting with prefix sorts below it."""
+    return prefix + "\U0010ffff"
+
+
+def resolve_customer(conn, name, phone=None):
+    """
+    Find or create the customer for a sale; call inside the sale's transaction.
+    A phone number given for a known customer without one is saved.
+    :return: customer_id, or None for a sale without a customer name
+    """
+    key = name_key(name)
+    if not key:
+        return None
+    phone = normalize_phone(phone)
+    conn.execute("""
+        INSERT INTO customers (name, name_key, phone) VALUES (?, ?, ?)
+        ON CONFLICT(name_key) DO UPDATE SET phone = COALESCE(customers.phone, excluded.phone)
+    """, (display_name(name), key, phone))
+    return conn.execute("SELECT customer_id FROM customers WHERE name_key = ?", (key,)).fetchone()[0]
+
+
+def add_sale(conn, customer_id, total, paid):
+    """Add one invoice to a customer's running totals."""
+    conn.execute("""
+        UPDATE customers
+        SET invoices = invoices + 1, billed = billed + ?, paid = paid + ?, last_sale_at = datetime('now')
+        WHERE customer_id = ?
+    """, (total, paid, customer_id))
+
+
+class CustomerManager:
+    def __init__(self, db="inventory.db"):
+        self.db = db
+        self.database = Database.get(db)
+        migrate(self.database)
+
+    def suggest(self, text, limit=10):
+        """
+        Customers whose name starts with text, or whose phone does if text is a
+        number. A narrow prefix is read as a range on the name_key or phone
+        index and sorted; a broad one walks idx_customers_recent until limit
+        matches are found.
+        :return: list of Customer, most recent buyers first
+        """
+        conn = self.database.connection()
+        phone = normalize_phone(text)
+        if phone and not re.search(r"[^\d\s+\-()]", text):
+            column, prefix = "phone", phone
+        else:
+            column, prefix = "name_key", name_key(text)
+            if not prefix:
+                return []
+        params = (prefix, prefix_end(prefix))
+        matches = conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM customers WHERE {column} >= ? AND {column} < ? LIMIT ?
+            )
+        """, params + (SUGGEST_MAX_SORTED + 1,)).fetchone()[0]
+        # Too many to sort: the + keeps the prefix test off the name_key and phone
+        # indexes so SQLite reads idx_customers_recent in order and stops at limit
+        unary = "" if matches <= SUGGEST_MAX_SORTED else "+"
+        rows = conn.execute(f"""
+            SELECT {_CUSTOMER_COLUMNS} FROM customers
+            WHERE {unary}{column} >= ? AND {unary}{column} < ?
+            ORDER BY last_sale_at DESC
+            LIMIT ?
+        """, params + (limit,)).fetchall()
+        return [Customer(*row) for row in rows]
+
+    def get_customer(self, customer_id):
+        conn = self.database.connection()
+        row = conn.execute(f"SELECT {_CUSTOMER_COLUMNS} FROM customers WHERE customer_id = ?",
+                           (customer_id,)).fetchone()
+        return Customer(*row) if row else None
+
+    def find(self, name):
+        conn = self.database.connection()
+        row = conn.execute(f"SELECT {_CUSTOMER_COLUMNS} FROM customers WHERE name_key = ?",
+                           (name_key(name),)).fetchone()
+        return Customer(*row) if row else None
+
+    def outstanding(self, min_balance=BALANCE_EPSILON):
+        """:return: list of Customer owing at least min_balance, largest balance first"""
+        conn = self.database.connection()
+        rows = conn.execute(f"""
+            SELECT {_CUSTOMER_COLUMNS} FROM customers
+            WHERE billed - paid >= ?
+            ORDER BY billed - paid DESC
+        """, (min_balance,)).fetchall()
+        return [Customer(*row) for row in rows]
+
+    def record_payment(self, customer_id, amount, ref=None):
+        """Take a payment on account, e.g. a workshop settling its month."""
+        amount = float(amount)
+        if amount <= 0:
+            raise ValueError(f"Invalid payment amount {amount}")
+        with self.database.transaction() as conn:
+            cur = conn.execute("UPDATE customers SET paid = paid + ? WHERE customer_id = ?", (amount, customer_id))
+            if cur.rowcount == 0:
+                raise ValueError(f"Unknown customer {customer_id}")
+            conn.execute("""
+                INSERT INTO customer_payments (customer_id, timestamp, amount, ref)
+                VALUES (?, datetime('now'), ?, ?)
+            """, (customer_id, amount, ref))
+
+    def statement(self, customer_id, start=None, end=None):
+        """
+        Invoices and payments in [start, end) with a running balance. The
+        opening balance is the current balance less everything since start,
+        so only the period and what follows it are read, through the
+        (customer_id, timestamp) indexes.
+        :return: Statement, or None for an unknown customer
+        """
+        customer = self.get_customer(customer_id)
+        if customer is None:
+            return None
+        conn = self.database.connection()
+        activity = """
+            SELECT timestamp, 'invoice', invoice_no, total_price, COALESCE(amount_paid, 0)
+            FROM sales WHERE customer_id = ? AND timestamp >= ?
+            UNION ALL
+            SELECT timestamp, 'payment', ref, 0, amount
+            FROM customer_payments WHERE customer_id = ? AND timestamp >= ?
+        """
+        since = start or ""
+        rows = conn.execute(f"SELECT * FROM ({activity}) ORDER BY 1", (customer_id, since, customer_id, since)).fetchall()
+        after_start = sum(debit - credit for _, _, _, debit, credit in rows)
+        opening = customer.balance - after_start
+
+        balance = opening
+        lines = []
+        for timestamp, kind, ref, debit, credit in rows:
+            if end is not None and timestamp >= end:
+                break
+            balance += debit - credit
+            lines.append(StatementLine(timestamp, kind, ref, debit, credit, balance))
+        return Statement(customer, opening, lines, balance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Customer balances and statements.")
+    parser.add_argument("--db", default="inventory.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("balances", help="customers with money outstanding")
+    p = sub.add_parser("statement", help="one customer's invoices and payments")
+    p.add_argument("name")
+    p.add_argument("--start")
+    p.add_argument("--end")
+    args = parser.parse_args()
+
+    customers = CustomerManager(db=args.db)
+    if args.command == "balances":
+        for customer in customers.outstanding():
+            print(f"{customer.name[:32]:<32} {customer.phone or '':<14} Rs.{customer.balance:>12.2f}")
+        return
+
+    customer = customers.find(args.name)
+    if customer is None:
+        parser.exit(1, f"No customer named {args.name}\n")
+    statement = customers.statement(customer.customer_id, args.start, args.end)
+    print(f"{customer.name}  opening balance Rs.{statement.opening_balance:.2f}")
+    for line in statement.lines:
+        print(f"{line.timestamp}  {line.kind:<8} {line.ref or '':<16} {line.debit:>10.2f} {line.credit:>10.2f} "
+              f"{line.balance:>12.2f}")
+    print(f"closing balance Rs.{statement.closing_balance:.2f}")
+
+
+if __name__ == "__main__":
+    main()
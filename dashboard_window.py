@@ -1,14 +1,30 @@
 from PyQt6.QtWidgets import (
     QWidget, QMainWindow, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout,
-    QTableWidget, QTableWidgetItem, QMessageBox, QComboBox, QDialog, QHeaderView
+    QTableView, QMessageBox, QComboBox, QDialog, QHeaderView, QGroupBox, QListWidget, QListWidgetItem,
+    QCompleter, QCheckBox
 )
 from PyQt6.QtGui import QAction
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, QStringListModel, pyqtSignal
 from search_invoice import InvoiceSearchWindow
 from sale_window import SaleWindow 
+from sales_manager import OutOfStockError
+from inventory_model import InventoryTableModel
+from sales_analytics import SalesAnalytics
+from db_worker import DbWorker
+from customer_manager import CustomerManager
+
+
+# Typing pause before a search runs
+SEARCH_DEBOUNCE_MS = 200
+
+# How often a running dashboard checks whether a stock snapshot is due
+SNAPSHOT_CHECK_MS = 60 * 60 * 1000
 
 
 class DashboardWindow(QMainWindow):
+    # Emitted on the spooler thread, delivered on the GUI thread
+    spool_failed = pyqtSignal(object)
+
     def __init__(self, auth, inventory, sales, printer, user):
         super().__init__()
         self.auth = auth
@@ -16,6 +32,12 @@ class DashboardWindow(QMainWindow):
         self.sales = sales
         self.printer = printer
         self.user = user
+        self.analytics = SalesAnalytics(sales.db)
+        self.customers = CustomerManager(sales.db)
+        # Table pages, KPIs and the low-stock list are read off the GUI thread
+        self.worker = DbWorker(self)
+        self.spool_failed.connect(self._spool_failed)
+        self._full_low_stock_pending = False
 
         self.setWindowTitle("Al-Hafiz Autos - Dashboard")
         self.resize(1000, 650)
@@ -23,6 +45,8 @@ class DashboardWindow(QMainWindow):
         self._setup_menu()
         self._setup_ui()
         self.refresh_table()
+        self.refresh_kpis()
+        self.refresh_low_stock()
 
     def _setup_menu(self):
         menubar = self.menuBar()
@@ -45,6 +69,7 @@ class DashboardWindow(QMainWindow):
 
         refresh_action = QAction("Refresh", self)
         refresh_action.triggered.connect(self.refresh_table)
+        refresh_action.triggered.connect(self.refresh_low_stock)
         inventory_menu.addAction(refresh_action)
 
         view_sales_action = QAction("View Sales", self)
@@ -72,6 +97,12 @@ class DashboardWindow(QMainWindow):
         title_label.setStyleSheet("font-size: 24px; font-weight: bold; color: #1a237e;")
         layout.addWidget(title_label)
 
+        # Today's and this month's sales, read from the daily rollup
+        self.kpi_label = QLabel()
+        self.kpi_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.kpi_label.setStyleSheet("font-size: 14px; color: #424242;")
+        layout.addWidget(self.kpi_label)
+
         # Search bar and Sell button row
         search_layout = QHBoxLayout()
         layout.addLayout(search_layout)
@@ -85,67 +116,137 @@ class DashboardWindow(QMainWindow):
         self.search_edit.textChanged.connect(self.on_search)
         search_layout.addWidget(self.search_edit)
 
+        # Typing restarts this timer, so a search runs once the user pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.refresh_table)
+
         sell_btn = QPushButton("Sell")
         sell_btn.clicked.connect(self.sell_selected)
         search_layout.addWidget(sell_btn)
 
-        # Table widget for inventory
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Name", "Company", "Purchase Rate", "Sale Rate", "Quantity"])
+        # Inventory table, paged in from SQLite as the user scrolls
+        self.model = InventoryTableModel(self.inventory, self, worker=self.worker)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.table.setSelectionBehavior(self.table.SelectionBehavior.SelectRows)
         self.table.setSelectionMode(self.table.SelectionMode.SingleSelection)
-        layout.addWidget(self.table)
+
+        # Parts at or below their reorder level, beside the inventory table
+        low_stock_box = QGroupBox("Low Stock")
+        low_stock_layout = QVBoxLayout(low_stock_box)
+        self.low_stock_list = QListWidget()
+        low_stock_layout.addWidget(self.low_stock_list)
+        self._low_stock_items = {}
+
+        table_layout = QHBoxLayout()
+        table_layout.addWidget(self.table, 3)
+        table_layout.addWidget(low_stock_box, 1)
+        layout.addLayout(table_layout)
+
+        self.worker.busy.connect(self._show_busy)
+        self.model.page_failed.connect(
+            lambda error: self.statusBar().showMessage(f"Could not load parts: {error}"))
+
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.setInterval(SNAPSHOT_CHECK_MS)
+        self.snapshot_timer.timeout.connect(lambda: self.worker.submit(self.inventory.snapshot_stock, key="snapshot"))
+        self.snapshot_timer.start()
+
+    def _show_busy(self, busy):
+        # Going idle clears "Loading..." but leaves an error message standing
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        elif self.statusBar().currentMessage() == "Loading...":
+            self.statusBar().clearMessage()
 
     def refresh_table(self):
-        all_products = self.inventory.get_all_products()
-        self.table.setRowCount(0)
-        search_text = self.search_edit.text().lower().strip()
-
-        for prod in all_products:
-            # prod = (barcode_id, item_name, company, purchase_rate, sale_rate, amount)
-            if search_text in prod[1].lower():
-                row = self.table.rowCount()
-                self.table.insertRow(row)
-                self.table.setItem(row, 0, QTableWidgetItem(prod[1]))
-                self.table.setItem(row, 1, QTableWidgetItem(prod[2]))
-                self.table.setItem(row, 2, QTableWidgetItem(str(prod[3])))
-                self.table.setItem(row, 3, QTableWidgetItem(str(prod[4])))
-                self.table.setItem(row, 4, QTableWidgetItem(str(prod[5])))
+        self.search_timer.stop()
+        self.model.set_query(self.search_edit.text())
+
+    def refresh_kpis(self):
+        self.worker.submit(lambda: (self.analytics.today(), self.analytics.this_month()),
+                           on_result=self._show_kpis, key="kpis")
+
+    def _show_kpis(self, totals):
+        today, month = totals
+        self.kpi_label.setText(
+            f"Today: Rs.{today.revenue:.2f} (profit Rs.{today.profit:.2f})    "
+            f"This month: Rs.{month.revenue:.2f} (profit Rs.{month.profit:.2f})"
+        )
+
+    def refresh_low_stock(self):
+        self._full_low_stock_pending = True
+        self.worker.submit(self.inventory.get_low_stock, on_result=self._show_low_stock, key="low-stock")
+
+    def _show_low_stock(self, rows):
+        self._full_low_stock_pending = False
+        self.low_stock_list.clear()
+        self._low_stock_items = {}
+        for row in rows:
+            self._set_low_stock_item(row)
+
+    def update_low_stock(self, barcode_ids):
+        """Re-check only the given parts, e.g. after a sale, and add, update or drop their entries."""
+        if self._full_low_stock_pending:
+            # The full list still loading would overwrite this update, so reload it instead
+            self.refresh_low_stock()
+            return
+        self.worker.submit(self.inventory.get_low_stock, barcode_ids,
+                           on_result=lambda rows: self._apply_low_stock(barcode_ids, rows))
+
+    def _apply_low_stock(self, barcode_ids, rows):
+        low = {row[0]: row for row in rows}
+        for barcode_id in barcode_ids:
+            if barcode_id in low:
+                self._set_low_stock_item(low[barcode_id], new_first=True)
+            elif barcode_id in self._low_stock_items:
+                item = self._low_stock_items.pop(barcode_id)
+                self.low_stock_list.takeItem(self.low_stock_list.row(item))
+
+    def _set_low_stock_item(self, row, new_first=False):
+        barcode_id, name, company, amount, reorder_level = row
+        item = self._low_stock_items.get(barcode_id)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, barcode_id)
+            self._low_stock_items[barcode_id] = item
+            if new_first:
+                self.low_stock_list.insertItem(0, item)
+            else:
+                self.low_stock_list.addItem(item)
+        item.setText(f"{name} ({company or '-'}): {amount:g} left, reorder at {reorder_level:g}")
+        item.setForeground(Qt.GlobalColor.red if amount <= 0 else Qt.GlobalColor.darkYellow)
 
     def on_search(self, text):
-        self.refresh_table()
+        self.search_timer.start()
 
     def get_selected_part_barcode(self):
-        selected_items = self.table.selectedItems()
-        if not selected_items:
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
             QMessageBox.warning(self, "No Selection", "Select a part from the table.")
             return None
-        selected_name = selected_items[0].text()
-        selected_company = selected_items[1].text()
-
-        all_products = self.inventory.get_all_products()
-        for prod in all_products:
-            if prod[1] == selected_name and prod[2] == selected_company:
-                return prod[0]
-        QMessageBox.critical(self, "Error", "Could not find product barcode.")
-        return None
+        # Rows carry their barcode_id, so no lookup by name/company is needed
+        return self.model.barcode_at(selected_rows[0].row())
 
     def add_part(self):
         dialog = PartDialog(self, "Add Part")
         if dialog.exec():
             data = dialog.get_data()
             try:
-                self.inventory.add_product(
+                barcode_id = self.inventory.add_product(
                     name=data["Name"],
                     company=data["Company"],
                     category_id=int(data["Category"].split()[0]),
                     purchase_rate=float(data["Purchase Rate"]),
                     sale_rate=float(data["Sale Rate"]),
-                    amount=float(data["Quantity"])
+                    amount=float(data["Quantity"]),
+                    reorder_level=float(data["Reorder Level"] or 0)
                 )
-                self.refresh_table()
+                self.model.refresh_product(barcode_id)
+                self.update_low_stock([barcode_id])
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Invalid input or {e}")
 
@@ -155,7 +256,8 @@ class DashboardWindow(QMainWindow):
             confirm = QMessageBox.question(self, "Confirm Delete", "Are you sure you want to delete this part?")
             if confirm == QMessageBox.StandardButton.Yes:
                 self.inventory.delete_product(barcode_id)
-                self.refresh_table()
+                self.model.remove_product(barcode_id)
+                self.update_low_stock([barcode_id])
 
     def update_part(self):
         barcode_id = self.get_selected_part_barcode()
@@ -178,9 +280,11 @@ class DashboardWindow(QMainWindow):
                     category_id=int(data["Category"].split()[0]),
                     purchase_rate=float(data["Purchase Rate"]),
                     sale_rate=float(data["Sale Rate"]),
-                    amount=float(data["Quantity"])
+                    amount=float(data["Quantity"]),
+                    reorder_level=float(data["Reorder Level"] or 0)
                 )
-                self.refresh_table()
+                self.model.refresh_product(barcode_id)
+                self.update_low_stock([barcode_id])
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Invalid input or {e}")
 
@@ -194,43 +298,53 @@ class DashboardWindow(QMainWindow):
             QMessageBox.critical(self, "Error", "Part not found.")
             return
 
-        dialog = SellDialog(self, part_data)
+        dialog = SellDialog(self, part_data, self.customers, self.worker)
         if dialog.exec():
             customer, qty = dialog.get_data()
-            price_per_unit = part_data[5]  # sale_rate
-            stock_qty = part_data[7]       # quantity
-            total = qty * price_per_unit
-            if qty > stock_qty:
+            try:
+                invoice, items = self.sales.checkout(
+                    [{"barcode_id": barcode_id, "quantity": qty}], customer,
+                    phone=dialog.get_phone(), paid=0 if dialog.on_account() else None
+                )
+            except OutOfStockError:
                 QMessageBox.critical(self, "Error", "Not enough stock")
                 return
+            except ValueError as e:
+                QMessageBox.critical(self, "Error", str(e))
+                return
 
-            invoice = self.sales.record_sale(barcode_id, qty, total, customer)
-            self.inventory.update_stock(barcode_id, -qty)
-            self.refresh_table()
-            bill_text = self.printer.generate_bill(
-                customer, [{"name": part_data[1], "qty": qty, "total": total}],
-                invoice_no=invoice
-            )
-            self.printer.print_bill(bill_text)
+            self.model.refresh_product(barcode_id)
+            self.update_low_stock([barcode_id])
+            self.refresh_kpis()
+            bill_text = self.printer.generate_bill(customer, items, invoice_no=invoice)
+            self.printer.print_bill(bill_text, invoice_no=invoice, on_error=self.spool_failed.emit)
+
+    def _spool_failed(self, error):
+        QMessageBox.critical(self, "Printer Error", f"The bill could not be printed: {error}")
 
     def view_sales(self):
-        dialog = SaleWindow(self.sales, self.printer, parent=self)
+        dialog = SaleWindow(self.sales, self.printer, parent=self, worker=self.worker)
         dialog.exec()  # Use exec() to open as a modal dialog
 
 
     def search_invoice(self):
-        self.invoice_search_dialog = InvoiceSearchWindow(self.sales, self.printer, parent=self)
+        self.invoice_search_dialog = InvoiceSearchWindow(self.sales, self.printer, parent=self, worker=self.worker)
         self.invoice_search_dialog.exec()  # open modal dialog
 
     def logout(self):
         self.close()
 
+    def closeEvent(self, event):
+        # Let queries already running finish before the managers are used elsewhere
+        self.worker.wait()
+        super().closeEvent(event)
+
 
 class PartDialog(QDialog):
     def __init__(self, parent, title, part_data=None):
         super().__init__(parent)
         self.setWindowTitle(title)
-        self.setFixedSize(400, 350)
+        self.setFixedSize(400, 410)
 
         layout = QVBoxLayout(self)
 
@@ -265,6 +379,12 @@ class PartDialog(QDialog):
         self.quantity_edit = QLineEdit()
         layout.addWidget(self.quantity_edit)
 
+        # Reorder Level
+        layout.addWidget(QLabel("Reorder Level"))
+        self.reorder_level_edit = QLineEdit()
+        self.reorder_level_edit.setPlaceholderText("0")
+        layout.addWidget(self.reorder_level_edit)
+
         # Pre-fill if updating
         if part_data:
             self.name_edit.setText(str(part_data[1]))
@@ -273,6 +393,7 @@ class PartDialog(QDialog):
             self.purchase_rate_edit.setText(str(part_data[4]))
             self.sale_rate_edit.setText(str(part_data[5]))
             self.quantity_edit.setText(str(part_data[7]))
+            self.reorder_level_edit.setText(str(part_data[8] or 0))
 
         # Buttons
         btn_layout = QHBoxLayout()
@@ -294,14 +415,18 @@ class PartDialog(QDialog):
             "Purchase Rate": self.purchase_rate_edit.text(),
             "Sale Rate": self.sale_rate_edit.text(),
             "Quantity": self.quantity_edit.text(),
+            "Reorder Level": self.reorder_level_edit.text(),
         }
 
 
 class SellDialog(QDialog):
-    def __init__(self, parent, part_data):
+    def __init__(self, parent, part_data, customers=None, worker=None):
         super().__init__(parent)
         self.setWindowTitle("Sell Part")
-        self.setFixedSize(400, 250)
+        self.setFixedSize(400, 330)
+        self.customers = customers
+        self.worker = worker
+        self._suggested = {}  # name shown in the completer -> Customer
 
         layout = QVBoxLayout(self)
 
@@ -309,10 +434,29 @@ class SellDialog(QDialog):
         self.customer_edit = QLineEdit()
         layout.addWidget(self.customer_edit)
 
+        # Known customers by name or phone prefix, looked up as the user types
+        self.suggestions = QStringListModel(self)
+        completer = QCompleter(self.suggestions, self)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        completer.activated[str].connect(self._customer_chosen)
+        self.customer_edit.setCompleter(completer)
+        self.customer_edit.textEdited.connect(self._suggest)
+
+        layout.addWidget(QLabel("Phone (optional)"))
+        self.phone_edit = QLineEdit()
+        layout.addWidget(self.phone_edit)
+
+        self.balance_label = QLabel()
+        layout.addWidget(self.balance_label)
+
         layout.addWidget(QLabel("Quantity"))
         self.quantity_edit = QLineEdit()
         layout.addWidget(self.quantity_edit)
 
+        self.on_account_check = QCheckBox("Sell on account (add to customer's balance)")
+        layout.addWidget(self.on_account_check)
+
         btn_layout = QHBoxLayout()
         layout.addLayout(btn_layout)
 
@@ -324,6 +468,31 @@ class SellDialog(QDialog):
         cancel_btn.clicked.connect(self.reject)
         btn_layout.addWidget(cancel_btn)
 
+    def _suggest(self, text):
+        self.balance_label.clear()
+        if self.customers is None or not text.strip():
+            return
+        if self.worker is None:
+            self._show_suggestions(self.customers.suggest(text))
+        else:
+            # Each keystroke supersedes the last one's lookup
+            self.worker.submit(self.customers.suggest, text, on_result=self._show_suggestions, key=(self, "suggest"))
+
+    def _show_suggestions(self, customers):
+        self._suggested = {customer.name: customer for customer in customers}
+        self.suggestions.setStringList(list(self._suggested))
+        if customers and self.customer_edit.hasFocus():
+            self.customer_edit.completer().complete()
+
+    def _customer_chosen(self, name):
+        customer = self._suggested.get(name)
+        if customer is None:
+            return
+        if customer.phone and not self.phone_edit.text().strip():
+            self.phone_edit.setText(customer.phone)
+        if abs(customer.balance) >= 0.005:
+            self.balance_label.setText(f"Outstanding balance: Rs.{customer.balance:.2f}")
+
     def _validate_and_accept(self):
         if not self.customer_edit.text().strip():
             QMessageBox.warning(self, "Validation Error", "Please enter customer name.")
@@ -337,5 +506,16 @@ class SellDialog(QDialog):
             return
         self.accept()
 
+    def done(self, result):
+        if self.worker is not None:
+            self.worker.cancel((self, "suggest"))
+        super().done(result)
+
     def get_data(self):
         return self.customer_edit.text().strip(), float(self.quantity_edit.text())
+
+    def get_phone(self):
+        return self.phone_edit.text().strip() or None
+
+    def on_account(self):
+        return self.on_account_check.isChecked()
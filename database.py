@@ -0,0 +1,111 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Applied to every pooled connection when it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-16000",     # 16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Several tills can share one file. A writer waits up to BUSY_TIMEOUT_MS
+# inside SQLite for the write lock, then transaction() backs off and asks
+# again, BEGIN_ATTEMPTS times in all, before giving up with "database is locked".
+BUSY_TIMEOUT_MS = 2000
+BEGIN_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.05
+
+
+def _is_busy(error):
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+class Database:
+    """
+    Shared connection layer for the managers.
+    Each thread gets one long-lived connection to the database file, so the
+    page cache survives between calls instead of being thrown away per query.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path="inventory.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    # One Database per file, so every manager on the same file shares connections
+    @classmethod
+    def get(cls, path="inventory.db"):
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        # Connections never leave their thread; the flag only lets close() run anywhere
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: everything executed inside the block commits once or
+        rolls back together. Nested blocks join the outer transaction.
+        The write lock is taken up front (BEGIN IMMEDIATE), so statements
+        inside the block never fail for another till's lock; keep the block
+        short, since every other writer waits for it.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        self._begin(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    @staticmethod
+    def _begin(conn):
+        for attempt in range(BEGIN_ATTEMPTS):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt == BEGIN_ATTEMPTS - 1:
+                    raise
+            # Jittered exponential backoff, so waiting tills don't retry in step
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,124 @@
+import threading
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+# Pool threads never expire, so each keeps its database connection
+WORKER_THREADS = 4
+
+
+class DbTask:
+    """Handle for one submitted call; cancel() drops its result if it hasn't been delivered."""
+
+    def __init__(self, fn, args, kwargs, on_result, on_error, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_result = on_result
+        self.on_error = on_error
+        self.key = key
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Runnable(QRunnable):
+    def __init__(self, worker, task):
+        super().__init__()
+        self.worker = worker
+        self.task = task
+
+    def run(self):
+        task = self.task
+        if task.cancelled:
+            # Superseded before it started: skip the query, but still report back
+            self.worker._done.emit(task, None, None)
+            return
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except Exception as e:
+            self.worker._done.emit(task, None, e)
+        else:
+            self.worker._done.emit(task, result, None)
+
+
+class DbWorker(QObject):
+    """
+    Runs manager calls on a QThreadPool so the GUI thread never waits on
+    SQLite. Callbacks run back on the GUI thread, through a queued signal.
+
+    Calls submitted with the same key supersede each other: only the newest
+    one's callback runs, and older ones still queued are skipped, so typing
+    a search or scrolling fast never paints stale rows.
+    """
+
+    # Emitted on a pool thread, delivered on the thread this object lives in
+    _done = pyqtSignal(object, object, object)
+    # True while any call is queued or running, e.g. for a busy cursor
+    busy = pyqtSignal(bool)
+
+    def __init__(self, parent=None, threads=WORKER_THREADS):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads)
+        self.pool.setExpiryTimeout(-1)
+        self._latest = {}  # key -> newest DbTask
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._done.connect(self._deliver)
+
+    def submit(self, fn, *args, on_result=None, on_error=None, key=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a pool thread.
+        :param on_result: called with the return value on the GUI thread
+        :param on_error: called with the exception on the GUI thread; printed to stderr if omitted
+        :param key: supersede any earlier call submitted with the same key
+        :return: DbTask
+        """
+        task = DbTask(fn, args, kwargs, on_result, on_error, key)
+        with self._lock:
+            if key is not None:
+                previous = self._latest.get(key)
+                if previous is not None:
+                    previous.cancel()
+                self._latest[key] = task
+            self._pending += 1
+            first = self._pending == 1
+        if first:
+            self.busy.emit(True)
+        self.pool.start(_Runnable(self, task))
+        return task
+
+    def cancel(self, key):
+        with self._lock:
+            task = self._latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    @pyqtSlot(object, object, object)
+    def _deliver(self, task, result, error):
+        with self._lock:
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+        if not task.cancelled:
+            if error is None:
+                if task.on_result is not None:
+                    task.on_result(result)
+            elif task.on_error is not None:
+                task.on_error(error)
+            else:
+                # Raising out of a slot would abort the whole application
+                traceback.print_exception(error)
+        self._finished()
+
+    def _finished(self):
+        with self._lock:
+            self._pending -= 1
+            idle = self._pending == 0
+        if idle:
+            self.busy.emit(False)
+
+    def wait(self, msecs=-1):
+        """Block until every queued call has run, e.g. before closing the database."""
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,154 @@
+"""
+Sales velocity and purchase-order suggestions, computed with NumPy from
+the sales_daily rollup (one row per product per day with sales).
+
+    python demand_forecast.py [--db inventory.db] [--lead-days 7] [--cover-days 30] [--csv po.csv]
+"""
+import argparse
+import csv
+import datetime
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from inventory_manager import InventoryManager
+
+# Days of history read, the moving-average window, and the EWMA half-life
+HISTORY_DAYS = 730
+MA_DAYS = 28
+HALF_LIFE_DAYS = 14
+
+POLine = namedtuple("POLine", "barcode_id item_name stock velocity days_of_cover order_qty est_cost")
+
+
+def utc_today():
+    # Sale timestamps are stored in UTC, so days are counted in UTC too
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class SalesVelocity:
+    """
+    Units sold per day for every product that sold in the window, as arrays
+    aligned with barcode_ids. moving_average covers the last ma_days; ewma
+    weights each day by 0.5 ** (age / half_life), so recent days count most.
+    """
+
+    def __init__(self, barcode_ids, moving_average, ewma, as_of):
+        self.barcode_ids = barcode_ids
+        self.moving_average = moving_average
+        self.ewma = ewma
+        self.as_of = as_of
+        self._index = {barcode_id: i for i, barcode_id in enumerate(barcode_ids)}
+
+    def lookup(self, barcode_ids, values):
+        """Pick values for a list of barcodes; parts with no sales get 0."""
+        index = np.fromiter((self._index.get(b, -1) for b in barcode_ids), dtype="i8", count=len(barcode_ids))
+        return np.where(index >= 0, values[index] if len(values) else 0.0, 0.0)
+
+
+def sales_velocity(database, today=None, history_days=HISTORY_DAYS, ma_days=MA_DAYS, half_life=HALF_LIFE_DAYS):
+    """
+    Total history_days of sales_daily per product in one pass, weighting each
+    day for the moving average and the EWMA at once.
+    :param today: datetime.date the history runs up to, inclusive
+    :return: SalesVelocity
+    """
+    today = today or utc_today()
+    ages = np.arange(history_days)
+    weights = 0.5 ** (ages / half_life)
+    recent = (ages < ma_days).astype("f8")
+    days = [(today - datetime.timedelta(days=int(age))).isoformat() for age in ages]
+
+    conn = database.connection()
+    # The day weights sit in a small temp table, so SQLite applies them while it
+    # walks idx_sales_daily_barcode and only one row per product comes back
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS forecast_days (
+            date TEXT PRIMARY KEY,
+            recent REAL NOT NULL,
+            weight REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM temp.forecast_days")
+    conn.executemany("INSERT INTO temp.forecast_days (date, recent, weight) VALUES (?, ?, ?)",
+                     zip(days, recent.tolist(), weights.tolist()))
+    rows = conn.execute("""
+        SELECT d.barcode_id, SUM(d.qty * w.recent), SUM(d.qty * w.weight)
+        FROM sales_daily d
+        JOIN temp.forecast_days w ON w.date = d.date
+        GROUP BY d.barcode_id
+    """).fetchall()
+
+    barcode_ids = [row[0] for row in rows]
+    recent_qty = np.fromiter((row[1] for row in rows), dtype="f8", count=len(rows))
+    weighted_qty = np.fromiter((row[2] for row in rows), dtype="f8", count=len(rows))
+    # Normalised by the weight of every day in the window, sold or not
+    return SalesVelocity(barcode_ids, recent_qty / ma_days, weighted_qty / weights.sum(), today)
+
+
+def purchase_order(database, velocity, lead_days=7, cover_days=30):
+    """
+    Suggest what to buy so every part lasts lead_days + cover_days at its
+    EWMA velocity, and never sits below its reorder level.
+    :return: {company: [POLine, ...]}, each company's lines by urgency (fewest days of cover first)
+    """
+    conn = database.connection()
+    rows = conn.execute("""
+        SELECT p.barcode_id, p.item_name, COALESCE(p.company, ''),
+               COALESCE(p.purchase_rate, 0), COALESCE(s.amount, 0), COALESCE(s.reorder_level, 0)
+        FROM products p
+        LEFT JOIN stock_units s ON s.barcode_id = p.barcode_id
+    """).fetchall()
+    if not rows:
+        return {}
+    barcode_ids, names, companies, purchase_rate, stock, reorder_level = zip(*rows)
+    purchase_rate = np.array(purchase_rate, dtype="f8")
+    stock = np.array(stock, dtype="f8")
+    reorder_level = np.array(reorder_level, dtype="f8")
+
+    rate = velocity.lookup(barcode_ids, velocity.ewma)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_of_cover = np.where(rate > 0, stock / rate, np.inf)
+    target = np.maximum(rate * (lead_days + cover_days), reorder_level)
+    order_qty = np.ceil(np.maximum(target - stock, 0))
+
+    order = {}
+    suggested = np.flatnonzero(order_qty > 0)
+    for i in suggested[np.argsort(days_of_cover[suggested], kind="stable")]:
+        order.setdefault(companies[i], []).append(POLine(
+            barcode_ids[i], names[i], float(stock[i]), float(rate[i]), float(days_of_cover[i]),
+            float(order_qty[i]), float(order_qty[i] * purchase_rate[i])
+        ))
+    return order
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suggest a purchase order from recent sales velocity.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--lead-days", type=int, default=7)
+    parser.add_argument("--cover-days", type=int, default=30)
+    parser.add_argument("--csv", help="also write the order to this CSV file")
+    args = parser.parse_args()
+
+    inventory = InventoryManager(db=args.db)
+    order = inventory.suggest_purchase_order(lead_days=args.lead_days, cover_days=args.cover_days)
+    for company in sorted(order):
+        lines = order[company]
+        print(f"\n{company or '(no company)'}: {len(lines)} parts, Rs.{sum(line.est_cost for line in lines):.2f}")
+        for line in lines:
+            cover = "-" if math.isinf(line.days_of_cover) else f"{line.days_of_cover:.1f}"
+            print(f"  {line.barcode_id:<16} {line.item_name[:32]:<32} stock {line.stock:>8g}  "
+                  f"{line.velocity:>7.2f}/day  cover {cover:>6}  order {line.order_qty:>6g}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("company", *POLine._fields))
+            for company in sorted(order):
+                writer.writerows((company, *line) for line in order[company])
+    inventory.barcodes.shutdown()
+
+
+if __name__ == "__main__":
+    main()
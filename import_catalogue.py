@@ -0,0 +1,169 @@
+"""
+Bulk catalogue import from a supplier CSV or XLSX price list.
+
+    python import_catalogue.py parts.csv [--db inventory.db] [--chunk-size 1000] [--no-barcodes]
+
+Rows are streamed, validated and written in chunks, one transaction per
+chunk. Barcode labels for the new parts are drawn afterwards in one batch.
+"""
+import argparse
+import csv
+import os
+import time
+from collections import namedtuple
+from itertools import islice
+
+from inventory_manager import InventoryManager
+
+# Accepted header spellings for each product field
+COLUMN_ALIASES = {
+    "barcode_id": ("barcode_id", "barcode", "code"),
+    "name": ("name", "item_name", "item", "part", "description"),
+    "company": ("company", "brand", "make"),
+    "category_id": ("category_id", "category"),
+    "purchase_rate": ("purchase_rate", "purchase", "cost", "cost_price"),
+    "sale_rate": ("sale_rate", "sale", "price", "sale_price"),
+    "amount": ("amount", "quantity", "qty", "stock"),
+}
+
+ImportResult = namedtuple("ImportResult", "imported skipped errors seconds")
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Reading .xlsx files needs openpyxl (pip install openpyxl)")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """Yield (line_no, {field: raw value}) for every data row in the file."""
+    ext = os.path.splitext(path)[1].lower()
+    rows = _read_xlsx(path) if ext in (".xlsx", ".xlsm") else _read_csv(path)
+
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [str(h).strip().lower().replace(" ", "_") for h in header]
+    positions = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                positions[field] = header.index(alias)
+                break
+    if "name" not in positions:
+        raise ValueError(f"{path}: no name column in header {header}")
+
+    for line_no, row in enumerate(rows, start=2):
+        if not any(str(cell).strip() for cell in row):
+            continue
+        yield line_no, {field: row[pos] if pos < len(row) else "" for field, pos in positions.items()}
+
+
+def _text(raw, field):
+    """The stripped cell, or None if the column is missing or the cell blank."""
+    return str(raw.get(field, "")).strip() or None
+
+
+def _number(raw, field):
+    text = (_text(raw, field) or "").replace(",", "")
+    return float(text) if text else None
+
+
+def convert_row(raw, inventory):
+    """
+    Turn one raw row into an upsert_products tuple; raises ValueError if invalid.
+    Columns missing from the file, and blank cells, come through as None, so
+    an existing part keeps what it had for them.
+    """
+    name = _text(raw, "name")
+    if not name:
+        raise ValueError("missing name")
+    barcode_id = _text(raw, "barcode_id") or inventory.generate_new_barcode()
+    category = _text(raw, "category_id")
+    category_id = None
+    if category is not None:
+        # "2", "2 - Litres" and "Litres" all mean category 2, as in PartDialog
+        category_id = 2 if category.split(" ")[0] == "2" or category.lower().startswith("litre") else 1
+    return (
+        barcode_id,
+        name,
+        _text(raw, "company"),
+        category_id,
+        _number(raw, "purchase_rate"),
+        _number(raw, "sale_rate"),
+        _number(raw, "amount"),
+    )
+
+
+def import_catalogue(path, db="inventory.db", barcode_dir="barcodes", chunk_size=1000,
+                     render_barcodes=True, progress=None):
+    """
+    Stream a CSV/XLSX price list into products and stock_units.
+    :param progress: optional callable(imported, skipped, seconds) called after each chunk
+    :return: ImportResult(imported, skipped, errors, seconds); errors is a list of (line_no, message)
+    """
+    inventory = InventoryManager(db=db, barcode_dir=barcode_dir)
+    start = time.perf_counter()
+    imported = 0
+    errors = []
+
+    rows = read_rows(path)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        converted = []
+        for line_no, raw in chunk:
+            try:
+                converted.append(convert_row(raw, inventory))
+            except ValueError as e:
+                errors.append((line_no, str(e)))
+        if converted:
+            imported += inventory.upsert_products(converted)
+        if progress:
+            progress(imported, len(errors), time.perf_counter() - start)
+
+    seconds = time.perf_counter() - start
+    if render_barcodes:
+        inventory.render_missing_barcodes()
+    inventory.barcodes.shutdown()
+    return ImportResult(imported, len(errors), errors, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV/XLSX parts list into the inventory.")
+    parser.add_argument("path")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--barcode-dir", default="barcodes")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--no-barcodes", action="store_true", help="skip drawing labels for new parts")
+    args = parser.parse_args()
+
+    def progress(imported, skipped, seconds):
+        print(f"\r{imported} imported, {skipped} skipped, {imported / max(seconds, 1e-9):.0f} rows/s", end="")
+
+    result = import_catalogue(args.path, db=args.db, barcode_dir=args.barcode_dir, chunk_size=args.chunk_size,
+                              render_barcodes=not args.no_barcodes, progress=progress)
+    print()
+    for line_no, message in result.errors[:20]:
+        print(f"line {line_no}: {message}")
+    if len(result.errors) > 20:
+        print(f"... {len(result.errors) - 20} more")
+    print(f"Imported {result.imported} rows in {result.seconds:.2f} s "
+          f"({result.imported / max(result.seconds, 1e-9):.0f} rows/s), skipped {result.skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,188 +1,367 @@
-import sqlite3
-import os
-from PIL import Image, ImageDraw, ImageFont
-import barcode
-from barcode.writer import ImageWriter
+from barcode_renderer import BarcodeRenderer
+from database import Database
+from migrations import migrate
+from product_cache import ProductCache, AMOUNT, REORDER_LEVEL
+from sequences import Sequence, format_barcode
+import stock_ledger
 
 class InventoryManager:
-    def __init__(self, db="inventory.db", barcode_dir="barcodes"):
+    def __init__(self, db="inventory.db", barcode_dir="barcodes", cache=True):
         self.db = db
         self.barcode_dir = barcode_dir
-        os.makedirs(self.barcode_dir, exist_ok=True)
+        self.database = Database.get(db)
+        # get_product rows, shared with SaleManager on the same file; None turns caching off
+        self.product_cache = ProductCache.shared(db) if cache else None
+        self.barcodes = BarcodeRenderer(barcode_dir)
+        self._velocity = None  # (newest sale id, SalesVelocity) from the last forecast
         self._init_tables()
+        self.barcode_sequence = Sequence.get(self.database, "barcode")
 
     def _init_tables(self):
-        with sqlite3.connect(self.db) as conn:
-            cur = conn.cursor()
-
-            # Your actual categories table schema
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS categories (
-                    category_id INTEGER PRIMARY KEY,
-                    category_name TEXT NOT NULL UNIQUE
-                )
-            """)
-
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    barcode_id TEXT PRIMARY KEY,
-                    item_name TEXT NOT NULL,
-                    company TEXT,
-                    purchase_rate REAL,
-                    sale_rate REAL,
-                    category_id INTGER,
-                    FOREIGN KEY (category_id) REFERENCES categories(category_id)
-                )
-            """)
-
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS stock_units (
-                    barcode_id TEXT PRIMARY KEY,
-                    unit_type TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    FOREIGN KEY (barcode_id) REFERENCES products(barcode_id)
-                )
-            """)
-
-            conn.commit()
+        migrate(self.database)
 
     # Add category by integer and name, only needed initially
     def add_category(self, category_id, category_name):
-        with sqlite3.connect(self.db) as conn:
+        with self.database.transaction() as conn:
             conn.execute(
                 "INSERT OR IGNORE INTO categories (category_id, category_name) VALUES (?, ?)",
                 (category_id, category_name)
             )
-            conn.commit()
 
     # Get category_name by category_id int
     def get_category_name(self, category_id):
-        with sqlite3.connect(self.db) as conn:
-            row = conn.execute(
-                "SELECT category_name FROM categories WHERE category_id=?",
-                (category_id,)
-            ).fetchone()
-            return row[0] if row else None
-
-    # Generate barcode image with text below
-    def _generate_barcode(self, barcode_id):
-        filename = os.path.join(self.barcode_dir, f"{barcode_id}.png")
-
-        code128 = barcode.get('code128', str(barcode_id), writer=ImageWriter())
-        code128.save(filename.replace(".png", ""))
-
-        img = Image.open(filename)
-        draw = ImageDraw.Draw(img)
-
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-        except:
-            font = ImageFont.load_default()
-
-        # Get text bounding box using textbbox
-        bbox = draw.textbbox((0, 0), str(barcode_id), font=font)
-        text_w = bbox[2] - bbox[0]  # right - left
-        text_h = bbox[3] - bbox[1]  # bottom - top
-        
-        img_w, img_h = img.size
-
-        new_img = Image.new("RGB", (img_w, img_h + text_h + 10), "white")
-        new_img.paste(img, (0, 0))
-        draw = ImageDraw.Draw(new_img)
-        draw.text(((img_w - text_w) // 2, img_h + 5), str(barcode_id), fill="black", font=font)
-
-        new_img.save(filename)
+        conn = self.database.connection()
+        row = conn.execute(
+            "SELECT category_name FROM categories WHERE category_id=?",
+            (category_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    # Sortable EAN-13 with a check digit, e.g. 2000000001234 + check
+    def generate_new_barcode(self):
+        return format_barcode(self.barcode_sequence.next_value())
 
     # Add or update a product
     # category here is integer (1 or 2)
-    def add_product(self, barcode_id=None, name=None, company=None, category_id=None, purchase_rate=None, sale_rate=None, amount=None):
+    def add_product(self, barcode_id=None, name=None, company=None, category_id=None, purchase_rate=None, sale_rate=None, amount=None,
+                    reorder_level=None):
         if barcode_id is None:
-            import time, random
-            barcode_id = f"{int(time.time())}{random.randint(100,999)}"
-
-        # Ensure category exists, if not create it
-        category_id = int(category_id)  # Ensure category is an integer
-        if category_id not in [1, 2]:
-            category_id = 1  # Default to Quantity if invalid
-            
-        # Add the category if it doesn't exist
-        with sqlite3.connect(self.db) as conn:
-            # Check if category exists
-            cur = conn.cursor()
-            cur.execute("SELECT category_name FROM categories WHERE category_id = ?", (category_id,))
-            if not cur.fetchone():
-                # Add the category
-                category_name = "Quantity" if category_id == 1 else "Litres"
-                conn.execute(
-                    "INSERT INTO categories (category_id, category_name) VALUES (?, ?)",
-                    (category_id, category_name)
-                )
-                conn.commit()
-
-        # Set unit_type based on category (1=Quantity, 2=Litres)
-        unit_type = "Quantity" if category_id == 1 else "Litres"
-
-        with sqlite3.connect(self.db) as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO products
-                (barcode_id, item_name, company, category_id, purchase_rate, sale_rate)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (barcode_id, name, company, category_id, purchase_rate, sale_rate))
-
-            conn.execute("""
-                INSERT OR REPLACE INTO stock_units
-                (barcode_id, unit_type, amount)
-                VALUES (?, ?, ?)
-            """, (barcode_id, unit_type, amount))
+            barcode_id = self.generate_new_barcode()
 
-            conn.commit()
+        self.upsert_products([(barcode_id, name, company, category_id, purchase_rate, sale_rate, amount)])
+        if reorder_level is not None:
+            self.set_reorder_level(barcode_id, reorder_level)
 
-        self._generate_barcode(barcode_id)
+        # Label PNG is drawn on the renderer's worker thread, and only if missing
+        self.barcodes.submit(barcode_id)
         return barcode_id
 
+    def upsert_products(self, rows):
+        """
+        Add or update many products with one executemany per table, in a
+        single transaction. Barcode labels are left to the caller.
+        A None field leaves an existing product's value as it is (a new one
+        gets no company, category 1, zero rates and zero stock), so a price
+        list with only some columns never wipes the others; in particular
+        stock is only set, and logged in the ledger, when an amount is given.
+        :param rows: iterable of (barcode_id, name, company, category_id, purchase_rate, sale_rate, amount)
+        :return: number of products written
+        """
+        products = []
+        stock = []
+        for barcode_id, name, company, category_id, purchase_rate, sale_rate, amount in rows:
+            unit_type = None
+            if category_id is not None:
+                category_id = int(category_id)  # Ensure category is an integer
+                if category_id not in [1, 2]:
+                    category_id = 1  # Default to Quantity if invalid
+
+                # Set unit_type based on category (1=Quantity, 2=Litres)
+                unit_type = "Quantity" if category_id == 1 else "Litres"
+
+            products.append((barcode_id, name, company, category_id, purchase_rate, sale_rate))
+            stock.append((barcode_id, unit_type, amount))
+
+        with self.database.transaction() as conn:
+            # Add the categories if they don't exist
+            conn.executemany(
+                "INSERT OR IGNORE INTO categories (category_id, category_name) VALUES (?, ?)",
+                [(c, "Quantity" if c == 1 else "Litres") for c in {row[3] or 1 for row in products}]
+            )
+
+            # An upsert rather than INSERT OR REPLACE, so the search index triggers fire
+            conn.executemany("""
+                INSERT INTO products
+                (barcode_id, item_name, company, category_id, purchase_rate, sale_rate)
+                VALUES (?1, ?2, ?3, COALESCE(?4, 1), COALESCE(?5, 0), COALESCE(?6, 0))
+                ON CONFLICT(barcode_id) DO UPDATE SET
+                    item_name = COALESCE(?2, products.item_name),
+                    company = COALESCE(?3, products.company),
+                    category_id = COALESCE(?4, products.category_id),
+                    purchase_rate = COALESCE(?5, products.purchase_rate),
+                    sale_rate = COALESCE(?6, products.sale_rate)
+            """, products)
+
+            # Ledger rows first, while stock_units still holds the old amounts
+            stock_ledger.record_stock_levels(conn, [(row[0], row[2]) for row in stock if row[2] is not None])
+
+            # Updated in place so an existing reorder_level survives
+            conn.executemany("""
+                INSERT INTO stock_units
+                (barcode_id, unit_type, amount)
+                VALUES (?1, COALESCE(?2, 'Quantity'), COALESCE(?3, 0))
+                ON CONFLICT(barcode_id) DO UPDATE SET
+                    unit_type = COALESCE(?2, stock_units.unit_type),
+                    amount = COALESCE(?3, stock_units.amount)
+            """, stock)
+        if self.product_cache is not None:
+            self.product_cache.invalidate(row[0] for row in products)
+        return len(products)
+
     def delete_product(self, barcode_id):
-        with sqlite3.connect(self.db) as conn:
+        with self.database.transaction() as conn:
+            # Whatever was left is written off in the ledger
+            stock_ledger.record_stock_levels(conn, [(barcode_id, 0)])
             conn.execute("DELETE FROM stock_units WHERE barcode_id=?", (barcode_id,))
             conn.execute("DELETE FROM products WHERE barcode_id=?", (barcode_id,))
-            conn.commit()
+        if self.product_cache is not None:
+            self.product_cache.invalidate([barcode_id])
+
+        self.barcodes.remove(barcode_id)
 
-        barcode_file = os.path.join(self.barcode_dir, f"{barcode_id}.png")
-        if os.path.exists(barcode_file):
-            os.remove(barcode_file)
+    def render_missing_barcodes(self, workers=None):
+        """Draw labels for every product without one, in parallel. Returns the count drawn."""
+        conn = self.database.connection()
+        barcode_ids = [row[0] for row in conn.execute("SELECT barcode_id FROM products")]
+        return self.barcodes.render_missing(barcode_ids, workers=workers)
 
     def get_product(self, barcode_id):
-        with sqlite3.connect(self.db) as conn:
-            return conn.execute("""
-                SELECT p.barcode_id, p.item_name, p.company, c.category_name as category_id,
-                       p.purchase_rate, p.sale_rate, s.unit_type, s.amount
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
-                WHERE p.barcode_id = ?
-            """, (barcode_id,)).fetchone()
+        conn = self.database.connection()
+        cache = self.product_cache
+        if cache is not None:
+            cache.sync(conn)
+            row = cache.get(barcode_id, None)
+            if row is not None:
+                return row
+
+        row = conn.execute("""
+            SELECT p.barcode_id, p.item_name, p.company, c.category_name as category_id,
+                   p.purchase_rate, p.sale_rate, s.unit_type, s.amount, s.reorder_level
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.category_id
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+            WHERE p.barcode_id = ?
+        """, (barcode_id,)).fetchone()
+        if cache is not None and row is not None:
+            cache.put(barcode_id, row)
+        return row
+
+    def get_product_by_barcode(self, barcode_id):
+        """
+        Scan-mode lookup: one primary-key read through get_product and its cache.
+        :return: dict with barcode_id, name, price and stock, or None if unknown
+        """
+        row = self.get_product(barcode_id)
+        if row is None:
+            return None
+        return {"barcode_id": row[0], "name": row[1], "price": row[5], "stock": row[AMOUNT] or 0}
 
     def get_all_parts(self):
         return self.get_all_products()
 
     def get_all_products(self):
-        with sqlite3.connect(self.db) as conn:
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT 
+                p.barcode_id,
+                p.item_name,
+                p.company,
+                p.purchase_rate,
+                p.sale_rate,
+                s.amount
+            FROM products p
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+        """).fetchall()
+
+    # Keyset pagination in (item_name, barcode_id) order; pass the last row's
+    # (item_name, barcode_id) as `after` to get the next page
+    def get_products_page(self, after=None, limit=200):
+        conn = self.database.connection()
+        if after is None:
             return conn.execute("""
-                SELECT 
-                    p.barcode_id,
-                    p.item_name,
-                    p.company,
-                    p.purchase_rate,
-                    p.sale_rate,
-                    s.amount
+                SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
                 FROM products p
                 LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
-            """).fetchall()
+                ORDER BY p.item_name, p.barcode_id
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return conn.execute("""
+            SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+            FROM products p
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+            WHERE (p.item_name, p.barcode_id) > (?, ?)
+            ORDER BY p.item_name, p.barcode_id
+            LIMIT ?
+        """, (*after, limit)).fetchall()
+
+    # One product shaped like a get_all_products row
+    def get_product_row(self, barcode_id):
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+            FROM products p
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+            WHERE p.barcode_id = ?
+        """, (barcode_id,)).fetchone()
+
+    # search() ranks only the first this many full-text candidates, so a
+    # one-letter prefix that matches the whole catalogue still answers in
+    # milliseconds; matches past them follow unranked
+    SEARCH_WINDOW = 1000
 
-    def update_stock(self, barcode_id, amount_change):
-        with sqlite3.connect(self.db) as conn:
-            conn.execute("""
+    def search(self, query, limit=50, offset=0):
+        """
+        Prefix search over item name, company and barcode. Every word in the
+        query must match the start of a word in the part. Among the first
+        SEARCH_WINDOW matches, parts whose name starts with the query come
+        first, then name matches, then shorter names; the remaining matches
+        follow in catalogue order. The order is the same for every offset,
+        so paging through it returns each match once.
+        Returns rows shaped like get_all_products.
+        """
+        terms = [term.replace('"', '""') for term in query.split()]
+        conn = self.database.connection()
+        if not terms:
+            return conn.execute("""
+                SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+                FROM products p
+                LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+                ORDER BY p.item_name
+                LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+
+        match = " ".join(f'"{term}"*' for term in terms)
+        window = self.SEARCH_WINDOW
+        rows = []
+        if offset < window:
+            # The ranked part: always the same window, whatever the page, and
+            # barcode_id settles ties so pages never overlap
+            rows = conn.execute("""
+                SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+                FROM (SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid LIMIT ?) f
+                JOIN products p ON p.rowid = f.rowid
+                LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+                ORDER BY p.item_name LIKE ? DESC,
+                         instr(lower(p.item_name), ?) > 0 DESC,
+                         length(p.item_name),
+                         p.item_name,
+                         p.barcode_id
+                LIMIT ? OFFSET ?
+            """, (match, window, " ".join(query.split()) + "%", terms[0].lower(),
+                  min(limit, window - offset), offset)).fetchall()
+        if offset + limit > window:
+            # Past the window, the rest of the matches in rowid order
+            start = max(offset, window)
+            rows += conn.execute("""
+                SELECT p.barcode_id, p.item_name, p.company, p.purchase_rate, p.sale_rate, s.amount
+                FROM (SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid LIMIT ? OFFSET ?) f
+                JOIN products p ON p.rowid = f.rowid
+                LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+                ORDER BY f.rowid
+            """, (match, offset + limit - start, start)).fetchall()
+        return rows
+
+    def update_stock(self, barcode_id, amount_change, kind="adjustment", ref=None):
+        """
+        Add amount_change (negative to remove) to a part's stock and log it.
+        :param kind: "receipt", "adjustment" or "return" (sales go through checkout)
+        :param ref: e.g. a supplier bill or invoice number
+        """
+        if kind not in stock_ledger.MOVEMENT_KINDS:
+            raise ValueError(f"Unknown stock movement kind {kind!r}")
+        with self.database.transaction() as conn:
+            # Relative update, so concurrent tills never overwrite each other's change
+            rows = conn.execute("""
                 UPDATE stock_units
                 SET amount = amount + ?
                 WHERE barcode_id = ?
-            """, (amount_change, barcode_id))
-            conn.commit()
+                RETURNING amount
+            """, (amount_change, barcode_id)).fetchall()
+            if rows:
+                stock_ledger.record_movements(conn, [(barcode_id, kind, amount_change, ref)])
+        if self.product_cache is not None and rows:
+            self.product_cache.patch(barcode_id, AMOUNT, rows[0][0])
+
+    def set_reorder_level(self, barcode_id, reorder_level):
+        with self.database.transaction() as conn:
+            conn.execute(
+                "UPDATE stock_units SET reorder_level = ? WHERE barcode_id = ?",
+                (reorder_level, barcode_id)
+            )
+        if self.product_cache is not None:
+            self.product_cache.patch(barcode_id, REORDER_LEVEL, float(reorder_level))
+
+    def stock_at(self, when, barcode_ids=None):
+        """Stock as it stood at `when` (UTC), from the nearest snapshot. :return: {barcode_id: amount}"""
+        return stock_ledger.stock_at(self.database, when, barcode_ids)
+
+    def get_stock_movements(self, barcode_id, start=None, end=None):
+        """:return: list of (id, timestamp, kind, qty, ref), oldest first"""
+        return stock_ledger.movements(self.database, barcode_id, start, end)
+
+    def snapshot_stock(self, force=False):
+        """Take a stock snapshot if one is due, or always with force. :return: snapshot id, or None"""
+        if force:
+            return stock_ledger.take_snapshot(self.database)
+        return stock_ledger.maybe_snapshot(self.database)
+
+    def get_low_stock(self, barcode_ids=None):
+        """
+        Parts at or below their reorder level, emptiest first. The full list is
+        read from the idx_stock_units_low partial index, so its cost follows the
+        number of low parts rather than the size of the catalogue.
+        :param barcode_ids: only check these parts, e.g. the lines of a sale
+        :return: list of (barcode_id, item_name, company, amount, reorder_level)
+        """
+        conn = self.database.connection()
+        if barcode_ids is None:
+            where, params = "", ()
+        else:
+            barcode_ids = list(barcode_ids)
+            where, params = f"AND s.barcode_id IN ({','.join('?' * len(barcode_ids))})", barcode_ids
+        # The amount <= reorder_level term must appear as written for the partial index to apply
+        return conn.execute(f"""
+            SELECT s.barcode_id, p.item_name, p.company, s.amount, s.reorder_level
+            FROM stock_units s
+            JOIN products p ON p.barcode_id = s.barcode_id
+            WHERE amount <= reorder_level {where}
+            ORDER BY s.amount - s.reorder_level, p.item_name
+        """, params).fetchall()
+
+    def sales_velocity(self):
+        """
+        Per-product units sold per day (moving average and EWMA). Recomputed
+        only when a sale newer than the cached result has been recorded, or
+        the day has changed.
+        """
+        from demand_forecast import sales_velocity, utc_today
+
+        conn = self.database.connection()
+        last_sale = conn.execute("SELECT MAX(id) FROM sales").fetchone()[0]
+        if self._velocity is not None:
+            cached_sale, velocity = self._velocity
+            if cached_sale == last_sale and velocity.as_of == utc_today():
+                return velocity
+        velocity = sales_velocity(self.database)
+        self._velocity = (last_sale, velocity)
+        return velocity
+
+    def suggest_purchase_order(self, lead_days=7, cover_days=30):
+        """
+        Parts to buy so stock covers lead_days + cover_days of sales, grouped by
+        company. Stock levels are read fresh; the sales velocity is cached.
+        :return: {company: [POLine(barcode_id, item_name, stock, velocity, days_of_cover, order_qty, est_cost)]}
+        """
+        from demand_forecast import purchase_order
+
+        return purchase_order(self.database, self.sales_velocity(), lead_days, cover_days)
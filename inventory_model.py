@@ -0,0 +1,158 @@
+from bisect import bisect_left
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+# Rows pulled from SQLite each time the view scrolls near the end
+PAGE_SIZE = 200
+
+
+class InventoryTableModel(QAbstractTableModel):
+    """
+    Lazily paged view of the catalogue, or of one search's results.
+    Rows are cached as the tuples get_all_products returns:
+    (barcode_id, item_name, company, purchase_rate, sale_rate, amount)
+    Each row's barcode_id is exposed as UserRole data and indexed in
+    barcode_id -> row, so selections and updates resolve without a query.
+    With a DbWorker, pages and refreshed rows are read off the GUI thread;
+    a new search supersedes the pages still loading for the old one.
+    """
+
+    HEADERS = ["Name", "Company", "Purchase Rate", "Sale Rate", "Quantity"]
+
+    # Emitted with the exception when a page could not be read
+    page_failed = pyqtSignal(object)
+
+    def __init__(self, inventory, parent=None, worker=None):
+        super().__init__(parent)
+        self.inventory = inventory
+        self.worker = worker
+        self.query = ""
+        self._rows = []
+        self._row_of = {}
+        self._exhausted = False
+        self._loading = False
+
+    # --- Qt model interface ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            return self._rows[index.row()][0]
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self._rows[index.row()][index.column() + 1]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        if self.query:
+            fn, args = self.inventory.search, (self.query, PAGE_SIZE, len(self._rows))
+        else:
+            after = (self._rows[-1][1], self._rows[-1][0]) if self._rows else None
+            fn, args = self.inventory.get_products_page, (after, PAGE_SIZE)
+
+        if self.worker is None:
+            self._add_page(fn(*args))
+        else:
+            self._loading = True
+            self.worker.submit(fn, *args, on_result=self._add_page, on_error=self._page_failed, key=(self, "page"))
+
+    def _add_page(self, page):
+        self._loading = False
+        if len(page) < PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+            self._rows.extend(page)
+            for row, prod in enumerate(page, start):
+                self._row_of[prod[0]] = row
+            self.endInsertRows()
+
+    def _page_failed(self, error):
+        # Leave the model as it is; scrolling asks for the page again
+        self._loading = False
+        self.page_failed.emit(error)
+
+    # --- Dashboard API ---
+
+    def set_query(self, query):
+        self.beginResetModel()
+        self.query = query.strip()
+        self._rows = []
+        self._row_of = {}
+        self._exhausted = False
+        self._loading = False  # a page still loading for the old query is superseded below
+        self.endResetModel()
+        self.fetchMore()
+
+    def barcode_at(self, row):
+        return self._rows[row][0]
+
+    def row_of(self, barcode_id):
+        return self._row_of.get(barcode_id)
+
+    # Rows from `start` on have shifted after an insert or removal
+    def _reindex_from(self, start):
+        for row in range(start, len(self._rows)):
+            self._row_of[self._rows[row][0]] = row
+
+    def refresh_product(self, barcode_id):
+        """Re-read one product after a change and repaint only its row."""
+        if self.worker is None:
+            self._apply_product(barcode_id, self.inventory.get_product_row(barcode_id))
+        else:
+            self.worker.submit(self.inventory.get_product_row, barcode_id,
+                               on_result=lambda prod: self._apply_product(barcode_id, prod),
+                               key=(self, "product", barcode_id))
+
+    def _apply_product(self, barcode_id, prod):
+        row = self.row_of(barcode_id)
+        if prod is None:
+            if row is not None:
+                self.remove_product(barcode_id)
+        elif row is not None:
+            self._rows[row] = prod
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+        elif not self.query:
+            self._insert_sorted(prod)
+        else:
+            # A new part may or may not match the current search; rerun it
+            self.set_query(self.query)
+
+    def remove_product(self, barcode_id):
+        row = self.row_of(barcode_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            del self._row_of[barcode_id]
+            self._reindex_from(row)
+            self.endRemoveRows()
+
+    def _insert_sorted(self, prod):
+        # Unfiltered pages are ordered by (item_name, barcode_id); a new part past
+        # the last loaded row will arrive with a later page instead
+        keys = [(r[1], r[0]) for r in self._rows]
+        row = bisect_left(keys, (prod[1], prod[0]))
+        if row == len(self._rows) and not self._exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, prod)
+        self._reindex_from(row)
+        self.endInsertRows()
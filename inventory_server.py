@@ -0,0 +1,325 @@
+"""
+Optional local inventory service: one process owns the database and serves
+product lookup, search, checkout and reports as JSON over HTTP, so several
+front-ends (dashboard, scanner window, handheld) can share it.
+
+    python inventory_server.py [--db inventory.db] [--host 127.0.0.1] [--port 8765]
+
+    GET  /products/<barcode_id>            product, or 404
+    GET  /products?q=brake&limit=50        prefix search
+    GET  /low-stock                        parts at or below their reorder level
+    GET  /reports/totals?start=&end=       rollup totals, today by default
+    POST /checkout   {"cart": [{"barcode_id", "quantity"}], "customer_name"}
+    POST /stock      {"barcode_id", "amount_change"}
+
+Reads run on a fixed pool of handler threads, each with its own connection.
+Every write goes through one writer thread, which commits whatever has
+queued up meanwhile in a single transaction.
+"""
+import argparse
+import datetime
+import json
+import queue
+import re
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from database import Database
+from inventory_manager import InventoryManager
+from product_cache import ProductCache
+from sales_analytics import SalesAnalytics
+from sales_manager import SaleManager, OutOfStockError
+
+DEFAULT_PORT = 8765
+HANDLER_THREADS = 16
+# Most writes committed together by the writer thread
+MAX_BATCH = 64
+
+SEARCH_FIELDS = ("barcode_id", "name", "company", "purchase_rate", "sale_rate", "stock")
+LOW_STOCK_FIELDS = ("barcode_id", "name", "company", "stock", "reorder_level")
+
+
+class WriteQueue:
+    """
+    Single writer: jobs run one after another on one thread. Jobs queued
+    while a batch runs go into the next batch, one transaction for all of
+    them, with a savepoint each so a failing job (e.g. out of stock) is
+    undone on its own. Futures resolve only once the batch has committed.
+    """
+
+    def __init__(self, database, max_batch=MAX_BATCH):
+        self.database = database
+        self.max_batch = max_batch
+        self.batches = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inventory-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._run_batch(batch)
+                    return
+                batch.append(job)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        outcomes = []
+        try:
+            with self.database.transaction() as conn:
+                for fn, args, future in batch:
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        result = fn(*args)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE job")
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # Nothing in the batch was kept, including stock the jobs patched into the cache
+            ProductCache.shared(self.database.path).clear()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.jobs += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+class InventoryService:
+    """The managers behind the HTTP API, usable in-process as well."""
+
+    def __init__(self, db="inventory.db", barcode_dir="barcodes"):
+        self.inventory = InventoryManager(db=db, barcode_dir=barcode_dir)
+        self.sales = SaleManager(db=db)
+        self.analytics = SalesAnalytics(db=db)
+        self.writer = WriteQueue(self.inventory.database)
+
+    def product(self, barcode_id):
+        return self.inventory.get_product_by_barcode(barcode_id)
+
+    def search(self, query, limit=50):
+        return [dict(zip(SEARCH_FIELDS, row)) for row in self.inventory.search(query, limit=limit)]
+
+    def low_stock(self):
+        return [dict(zip(LOW_STOCK_FIELDS, row)) for row in self.inventory.get_low_stock()]
+
+    def totals(self, start=None, end=None):
+        today = self.analytics.today_date()
+        start = start or today.isoformat()
+        end = end or (today + datetime.timedelta(days=1)).isoformat()
+        return {"start": start, "end": end, **self.analytics.totals(start, end)._asdict()}
+
+    def checkout(self, cart, customer_name=""):
+        # Sequence blocks can't be reserved inside the writer's batch transaction
+        invoice_no = self.sales.generate_invoice_no()
+        invoice_no, items = self.writer.submit(self.sales.checkout, cart, customer_name, invoice_no).result()
+        return {"invoice_no": invoice_no, "items": items}
+
+    def update_stock(self, barcode_id, amount_change):
+        self.writer.submit(self.inventory.update_stock, barcode_id, amount_change).result()
+        return self.product(barcode_id)
+
+    def shutdown(self):
+        self.writer.shutdown()
+        self.inventory.barcodes.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "InventoryServer/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, routes):
+        url = urllib.parse.urlsplit(self.path)
+        for pattern, handler in routes:
+            match = re.fullmatch(pattern, url.path)
+            if match:
+                break
+        else:
+            self._send(404, {"error": f"No route for {url.path}"})
+            return
+        try:
+            if self.command == "POST":
+                length = int(self.headers.get("Content-Length") or 0)
+                params = json.loads(self.rfile.read(length) or b"{}")
+            else:
+                params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+            status, body = handler(self.server.service, params, *map(urllib.parse.unquote, match.groups()))
+        except OutOfStockError as e:
+            self._send(409, {"error": str(e), "barcode_id": e.barcode_id,
+                             "requested": e.requested, "available": e.available})
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        else:
+            self._send(status, body)
+
+    def do_GET(self):
+        self._dispatch(GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(POST_ROUTES)
+
+
+def _get_product(service, params, barcode_id):
+    product = service.product(barcode_id)
+    return (200, product) if product else (404, {"error": f"No product for barcode {barcode_id}"})
+
+
+# Handlers take (service, params) and return (status, JSON body); params are
+# the query string for GET and the JSON body for POST
+GET_ROUTES = (
+    (r"/products/(.+)", _get_product),
+    (r"/products", lambda service, params: (200, service.search(params.get("q", ""), int(params.get("limit", 50))))),
+    (r"/low-stock", lambda service, params: (200, service.low_stock())),
+    (r"/reports/totals", lambda service, params: (200, service.totals(params.get("start"), params.get("end")))),
+)
+
+POST_ROUTES = (
+    (r"/checkout", lambda service, params: (200, service.checkout(params["cart"], params.get("customer_name", "")))),
+    (r"/stock", lambda service, params: (200, service.update_stock(params["barcode_id"],
+                                                                   float(params["amount_change"])))),
+)
+
+
+class InventoryServer(HTTPServer):
+    """
+    HTTPServer answering on a fixed pool of threads, so each keeps one
+    database connection instead of opening one per request.
+    """
+
+    # The default backlog of 5 drops connections under a burst of tills
+    request_queue_size = 128
+
+    def __init__(self, service, host="127.0.0.1", port=DEFAULT_PORT, threads=HANDLER_THREADS, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="inventory-http")
+        super().__init__((host, port), _Handler)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown()
+
+
+class InventoryClient:
+    """
+    Front-end side of the API, with the same return values as the managers'
+    methods it stands in for.
+    """
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            error = json.load(e)
+            if e.code == 404:
+                return None
+            if e.code == 409:
+                raise OutOfStockError(error["barcode_id"], error["requested"], error["available"]) from None
+            raise ValueError(error["error"]) from None
+
+    def get_product_by_barcode(self, barcode_id):
+        return self._request(f"/products/{urllib.parse.quote(barcode_id, safe='')}")
+
+    def search(self, query, limit=50):
+        return self._request(f"/products?{urllib.parse.urlencode({'q': query, 'limit': limit})}")
+
+    def get_low_stock(self):
+        return self._request("/low-stock")
+
+    def totals(self, start=None, end=None):
+        params = {k: v for k, v in (("start", start), ("end", end)) if v}
+        return self._request(f"/reports/totals?{urllib.parse.urlencode(params)}")
+
+    def checkout(self, cart, customer_name=""):
+        result = self._request("/checkout", {"cart": cart, "customer_name": customer_name})
+        return result["invoice_no"], result["items"]
+
+    def update_stock(self, barcode_id, amount_change):
+        return self._request("/stock", {"barcode_id": barcode_id, "amount_change": amount_change})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the inventory database as JSON over HTTP.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--threads", type=int, default=HANDLER_THREADS)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    service = InventoryService(db=args.db)
+    server = InventoryServer(service, args.host, args.port, threads=args.threads, verbose=args.verbose)
+    print(f"serving {args.db} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        Database.get(args.db).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,29 @@ from auth_manager import AuthManager
 from inventory_manager import InventoryManager
 from sales_manager import SaleManager
 from bill_printer import BillPrinter
+from database import Database
+from migrations import migrate
 
 def main():
     app = QApplication(sys.argv)
 
+    # Bring the schema up to date before any manager touches it
+    migrate(Database.get("inventory.db"), log=print)
+
     auth = AuthManager()
     inventory = InventoryManager()
+    # Keeps point-in-time stock queries to a short stretch of the ledger
+    inventory.snapshot_stock()
     sales = SaleManager()
     printer = BillPrinter()
 
     login_window = LoginWindow(auth, inventory, sales, printer)
     login_window.show()
 
-    sys.exit(app.exec())
+    code = app.exec()
+    # Bills still queued are written before exiting
+    printer.close()
+    sys.exit(code)
 
 if __name__ == "__main__":
     main()
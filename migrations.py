@@ -0,0 +1,448 @@
+"""
+Versioned schema migrations. The applied version lives in PRAGMA user_version
+and every manager calls migrate() on startup, so a database file is brought up
+to date exactly once whichever window opens it first.
+
+    python migrations.py [inventory.db]
+"""
+import sys
+import time
+
+from database import Database
+
+MIGRATIONS = []
+
+
+def migration(fn):
+    MIGRATIONS.append((len(MIGRATIONS) + 1, fn))
+    return fn
+
+
+@migration
+def initial_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            category_id INTEGER PRIMARY KEY,
+            category_name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            barcode_id TEXT PRIMARY KEY,
+            item_name TEXT NOT NULL,
+            company TEXT,
+            purchase_rate REAL,
+            sale_rate REAL,
+            category_id INTEGER,
+            FOREIGN KEY (category_id) REFERENCES categories(category_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_units (
+            barcode_id TEXT PRIMARY KEY,
+            unit_type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            FOREIGN KEY (barcode_id) REFERENCES products(barcode_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            question TEXT,
+            answer TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT DEFAULT (datetime('now')),
+            items_json TEXT NOT NULL,
+            total_price REAL NOT NULL,
+            customer_name TEXT,
+            invoice_no TEXT UNIQUE
+        )
+    """)
+    # One row per invoice line, so per-product questions are index lookups
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sale_items (
+            sale_id INTEGER NOT NULL,
+            barcode_id TEXT,
+            qty REAL NOT NULL,
+            unit_price REAL,
+            line_total REAL NOT NULL,
+            FOREIGN KEY (sale_id) REFERENCES sales(id)
+        )
+    """)
+
+
+# The shipped inventory.db keys stock_units on an AUTOINCREMENT stock_id and
+# never indexed barcode_id, so every product join scanned the whole table and
+# INSERT OR REPLACE appended duplicate rows. Rebuild it keyed on barcode_id,
+# keeping the newest row for each product.
+@migration
+def rebuild_stock_units(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(stock_units)")}
+    if "stock_id" not in columns:
+        return
+
+    conn.execute("""
+        CREATE TABLE stock_units_new (
+            barcode_id TEXT PRIMARY KEY,
+            unit_type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            FOREIGN KEY (barcode_id) REFERENCES products(barcode_id)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO stock_units_new (barcode_id, unit_type, amount)
+        SELECT barcode_id, unit_type, amount
+        FROM stock_units
+        WHERE stock_id IN (SELECT MAX(stock_id) FROM stock_units GROUP BY barcode_id)
+    """)
+    conn.execute("DROP TABLE stock_units")
+    conn.execute("ALTER TABLE stock_units_new RENAME TO stock_units")
+
+
+@migration
+def add_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_invoice_no ON sales(invoice_no)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_timestamp ON sales(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_item_name ON products(item_name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_barcode ON sale_items(barcode_id, sale_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items(sale_id)")
+    conn.execute("ANALYZE")
+
+
+# Full-text index over the searchable product columns. It is an external
+# content table, so the triggers below are what keep it in step with products.
+@migration
+def product_search(conn):
+    conn.execute("""
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            item_name, company, barcode_id,
+            content='products', content_rowid='rowid',
+            prefix='1 2 3 4'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, item_name, company, barcode_id)
+            VALUES (new.rowid, new.item_name, new.company, new.barcode_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, item_name, company, barcode_id)
+            VALUES ('delete', old.rowid, old.item_name, old.company, old.barcode_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER products_fts_update AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, item_name, company, barcode_id)
+            VALUES ('delete', old.rowid, old.item_name, old.company, old.barcode_id);
+            INSERT INTO products_fts (rowid, item_name, company, barcode_id)
+            VALUES (new.rowid, new.item_name, new.company, new.barcode_id);
+        END
+    """)
+    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+# Keyset paging walks products in (item_name, barcode_id) order; this index
+# serves that order directly and also covers lookups by item_name alone
+@migration
+def product_paging_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name_barcode ON products(item_name, barcode_id)")
+    conn.execute("DROP INDEX IF EXISTS idx_products_item_name")
+
+
+# Text of the sales history Items column, written with each sale so the
+# history view never has to parse items_json. Older rows stay NULL and are
+# summarised when they are first displayed.
+@migration
+def sales_items_summary(conn):
+    conn.execute("ALTER TABLE sales ADD COLUMN items_summary TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_timestamp_id ON sales(timestamp, id)")
+    conn.execute("DROP INDEX IF EXISTS idx_sales_timestamp")
+
+
+# Per-day and per-day-per-product totals kept up to date by every sale, so
+# dashboard figures read a handful of rollup rows instead of every invoice.
+# Lines now carry the purchase rate at the time of sale; older lines get
+# today's rate.
+@migration
+def sales_daily_rollup(conn):
+    conn.execute("ALTER TABLE sale_items ADD COLUMN unit_cost REAL")
+    conn.execute("""
+        UPDATE sale_items
+        SET unit_cost = (SELECT purchase_rate FROM products p WHERE p.barcode_id = sale_items.barcode_id)
+    """)
+    conn.execute("""
+        CREATE TABLE sales_daily (
+            date TEXT NOT NULL,
+            barcode_id TEXT NOT NULL,
+            qty REAL NOT NULL,
+            revenue REAL NOT NULL,
+            cost REAL NOT NULL,
+            PRIMARY KEY (date, barcode_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO sales_daily (date, barcode_id, qty, revenue, cost)
+        SELECT date(s.timestamp), COALESCE(si.barcode_id, ''),
+               SUM(si.qty), SUM(si.line_total), SUM(si.qty * COALESCE(si.unit_cost, 0))
+        FROM sale_items si
+        JOIN sales s ON s.id = si.sale_id
+        GROUP BY 1, 2
+    """)
+    # The same figures summed per day, for totals over any date range
+    conn.execute("""
+        CREATE TABLE sales_daily_totals (
+            date TEXT PRIMARY KEY,
+            invoices INTEGER NOT NULL,
+            qty REAL NOT NULL,
+            revenue REAL NOT NULL,
+            cost REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO sales_daily_totals (date, invoices, qty, revenue, cost)
+        SELECT date(s.timestamp), COUNT(DISTINCT si.sale_id),
+               SUM(si.qty), SUM(si.line_total), SUM(si.qty * COALESCE(si.unit_cost, 0))
+        FROM sale_items si
+        JOIN sales s ON s.id = si.sale_id
+        GROUP BY 1
+    """)
+
+
+# Per-product minimum stock. The partial index holds only the parts at or
+# below their level, so listing them reads that short list, not the catalogue.
+@migration
+def reorder_levels(conn):
+    conn.execute("ALTER TABLE stock_units ADD COLUMN reorder_level REAL NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_units_low
+        ON stock_units(barcode_id, amount, reorder_level)
+        WHERE amount <= reorder_level
+    """)
+
+
+# Serves per-product walks over sales_daily, such as the demand forecast's
+# single grouped pass, straight from the index
+@migration
+def sales_daily_barcode_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_daily_barcode ON sales_daily(barcode_id, date, qty)")
+
+
+@migration
+def sequences(conn):
+    # next_value is the first number no process has reserved yet (see sequences.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.executemany("INSERT OR IGNORE INTO sequences (name, next_value) VALUES (?, 1)",
+                     [("barcode",), ("invoice",)])
+
+
+@migration
+def stock_ledger(conn):
+    # Append-only: every change to stock_units.amount adds one signed row here
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY,
+            barcode_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('opening', 'receipt', 'sale', 'adjustment', 'return')),
+            qty REAL NOT NULL,
+            ref TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_barcode ON stock_movements(barcode_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_time ON stock_movements(timestamp)")
+    # Full copies of stock_units; last_movement_id is the newest movement each one includes
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            id INTEGER PRIMARY KEY,
+            taken_at TEXT NOT NULL,
+            last_movement_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_snapshots_time ON stock_snapshots(taken_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+            snapshot_id INTEGER NOT NULL,
+            barcode_id TEXT NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (snapshot_id, barcode_id)
+        ) WITHOUT ROWID
+    """)
+
+    # History starts today: current stock becomes the opening balance and the first snapshot
+    conn.execute("""
+        INSERT INTO stock_movements (barcode_id, timestamp, kind, qty)
+        SELECT barcode_id, datetime('now'), 'opening', amount FROM stock_units WHERE amount != 0
+    """)
+    cur = conn.execute("""
+        INSERT INTO stock_snapshots (taken_at, last_movement_id)
+        SELECT datetime('now'), COALESCE(MAX(id), 0) FROM stock_movements
+    """)
+    conn.execute("""
+        INSERT INTO stock_snapshot_items (snapshot_id, barcode_id, amount)
+        SELECT ?, barcode_id, amount FROM stock_units
+    """, (cur.lastrowid,))
+
+
+@migration
+def customers(conn):
+    from customer_manager import display_name, name_key
+
+    # billed/paid/invoices are running totals kept by checkout and record_payment
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL UNIQUE,
+            phone TEXT,
+            invoices INTEGER NOT NULL DEFAULT 0,
+            billed REAL NOT NULL DEFAULT 0,
+            paid REAL NOT NULL DEFAULT 0,
+            last_sale_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers(phone) WHERE phone IS NOT NULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_payments (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            amount REAL NOT NULL,
+            ref TEXT,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_payments_customer ON customer_payments(customer_id, timestamp)")
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sales)")}
+    if "customer_id" not in columns:
+        conn.execute("ALTER TABLE sales ADD COLUMN customer_id INTEGER REFERENCES customers(customer_id)")
+    if "amount_paid" not in columns:
+        # Sales before this had no credit option, so they count as paid in full
+        conn.execute("ALTER TABLE sales ADD COLUMN amount_paid REAL")
+        conn.execute("UPDATE sales SET amount_paid = total_price")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id, timestamp)")
+
+    # Link past sales by their typed name: one customer per normalised name,
+    # mapped through a temp table so sales is rewritten in a single pass
+    conn.execute("CREATE TEMP TABLE customer_names (raw TEXT PRIMARY KEY, customer_id INTEGER) WITHOUT ROWID")
+    for (raw,) in conn.execute("SELECT DISTINCT customer_name FROM sales WHERE customer_name IS NOT NULL").fetchall():
+        key = name_key(raw)
+        if not key:
+            continue
+        conn.execute("INSERT OR IGNORE INTO customers (name, name_key) VALUES (?, ?)", (display_name(raw), key))
+        conn.execute("""
+            INSERT INTO temp.customer_names (raw, customer_id)
+            SELECT ?, customer_id FROM customers WHERE name_key = ?
+        """, (raw, key))
+    conn.execute("""
+        UPDATE sales SET customer_id = (SELECT customer_id FROM temp.customer_names WHERE raw = sales.customer_name)
+        WHERE customer_name IN (SELECT raw FROM temp.customer_names)
+    """)
+    conn.execute("DROP TABLE temp.customer_names")
+    conn.execute("""
+        UPDATE customers SET (invoices, billed, paid, last_sale_at) = (
+            SELECT COUNT(*), COALESCE(SUM(total_price), 0), COALESCE(SUM(amount_paid), 0), MAX(timestamp)
+            FROM sales WHERE sales.customer_id = customers.customer_id
+        )
+    """)
+
+
+@migration
+def invoice_search(conn):
+    # The date and customer search paths get indexes holding every column their
+    # filters test, so non-matching invoices are skipped inside the index and
+    # only the rows of the page are read from sales. id is spelled out after
+    # the timestamp so keyset pages on (timestamp, id) stay in index order.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_search_time ON sales(timestamp, id, total_price, customer_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer_search ON sales(customer_id, timestamp, id, total_price)")
+    # Superseded by the above
+    conn.execute("DROP INDEX IF EXISTS idx_sales_timestamp_id")
+    conn.execute("DROP INDEX IF EXISTS idx_sales_customer")
+
+
+@migration
+def invoice_no_index(conn):
+    # invoice_no is only UNIQUE in databases created from the current schema;
+    # upgraded ones declare it plain TEXT, so the invoice number lookups and
+    # prefix search need this index back where invoice_search dropped it.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_invoice_no ON sales(invoice_no)")
+
+
+@migration
+def backfill_progress(conn):
+    # last_id: every sale up to it has been looked at by the backfill, including
+    # sales it had no lines to copy for (see SaleManager.backfill_sale_items).
+    # Starts before the first sale still without lines, or after the last sale.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO backfill_progress (name, last_id)
+        SELECT 'sale_items', COALESCE(
+            (SELECT MIN(id) - 1 FROM sales WHERE NOT EXISTS (SELECT 1 FROM sale_items WHERE sale_id = sales.id)),
+            (SELECT MAX(id) FROM sales),
+            0)
+    """)
+
+
+@migration
+def customer_recent_index(conn):
+    # Suggestions for a short name or phone prefix walk customers newest buyer
+    # first and stop at the limit; name_key and phone are in the index so the
+    # prefix is tested without reading the row
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customers_recent
+        ON customers(last_sale_at DESC, name_key, phone)
+    """)
+
+
+def schema_version(database):
+    return database.connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(database, log=None):
+    """
+    Apply every migration newer than the database's user_version, each in its
+    own transaction together with the version bump.
+    :param log: optional callable taking one line of timing output
+    :return: list of (version, name, seconds) for the migrations applied
+    """
+    applied = []
+    if schema_version(database) >= len(MIGRATIONS):
+        return applied
+
+    for version, fn in MIGRATIONS:
+        start = time.perf_counter()
+        with database.transaction() as conn:
+            # Re-read under the write lock in case another process got here first
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        elapsed = time.perf_counter() - start
+        applied.append((version, fn.__name__, elapsed))
+        if log:
+            log(f"migration {version:>3} {fn.__name__:<24} {elapsed * 1000:10.1f} ms")
+    return applied
+
+
+if __name__ == "__main__":
+    db = Database.get(sys.argv[1] if len(sys.argv) > 1 else "inventory.db")
+    print(f"schema version {schema_version(db)}")
+    migrate(db, log=print)
+    print(f"schema version {schema_version(db)}")
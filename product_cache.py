@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Product records kept per database file by default
+DEFAULT_SIZE = 2048
+
+# Other connections' commits are looked for at most this often (seconds);
+# checkout re-reads stock inside its transaction, so a brief stale read is harmless
+SYNC_INTERVAL = 0.05
+
+# Positions in a get_product row that writers patch in place
+AMOUNT = 7
+REORDER_LEVEL = 8
+
+_MISSING = object()
+
+
+class ProductCache:
+    """
+    Bounded LRU of get_product rows keyed by barcode_id, shared by every
+    manager on the same database file so a sale can patch what the
+    inventory side reads. Writers keep it current (write-through); commits
+    from other connections or processes are caught with PRAGMA data_version
+    and drop the whole cache.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = {}  # id(connection) -> (data_version last seen on it, when)
+
+    @classmethod
+    def shared(cls, path="inventory.db", maxsize=DEFAULT_SIZE):
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(maxsize)
+            return cls._instances[path]
+
+    def sync(self, conn):
+        """Drop everything if another connection has committed since conn last looked."""
+        now = time.monotonic()
+        seen = self._versions.get(id(conn))
+        if seen is not None and now - seen[1] < SYNC_INTERVAL:
+            return
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if seen is None or seen[0] != version:
+                self._rows.clear()
+            self._versions[id(conn)] = (version, now)
+
+    def get(self, barcode_id, default=_MISSING):
+        with self._lock:
+            row = self._rows.get(barcode_id, _MISSING)
+            if row is _MISSING:
+                self.misses += 1
+                return default
+            self._rows.move_to_end(barcode_id)
+            self.hits += 1
+            return row
+
+    def put(self, barcode_id, row):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._rows[barcode_id] = row
+            self._rows.move_to_end(barcode_id)
+            if len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def patch(self, barcode_id, column, value):
+        """Overwrite one column of a cached row, if the row is cached."""
+        with self._lock:
+            row = self._rows.get(barcode_id)
+            if row is not None:
+                self._rows[barcode_id] = row[:column] + (value,) + row[column + 1:]
+
+    def invalidate(self, barcode_ids):
+        with self._lock:
+            for barcode_id in barcode_ids:
+                self._rows.pop(barcode_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self):
+        """:return: (hits, misses, cached rows)"""
+        return self.hits, self.misses, len(self._rows)
+
+    def reset_stats(self):
+        self.hits = self.misses = 0
@@ -0,0 +1,187 @@
+"""
+Profit, margin and stock-movement reports computed over NumPy columns.
+
+    python profit_report.py [--db inventory.db] [--start 2025-01-01] [--end 2026-01-01] [--out reports]
+
+Sale lines are read once into arrays and totalled per product with
+bincount, so a million lines take a few seconds instead of a Python loop
+over every items_json.
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from database import Database
+from migrations import migrate
+
+# ABC classes by cumulative share of revenue
+ABC_LIMITS = (("A", 0.80), ("B", 0.95))
+
+LINE_DTYPE = np.dtype([("product", "i8"), ("qty", "f8"), ("revenue", "f8"), ("cost", "f8")])
+
+
+class ProfitReport:
+    """
+    Per-product sales figures for one period. Every array attribute has one
+    entry per product, in the order of barcode_ids.
+    :param start: first timestamp included ("YYYY-MM-DD[ HH:MM:SS]"), or None
+    :param end: first timestamp excluded, or None
+    """
+
+    def __init__(self, db="inventory.db", start=None, end=None):
+        self.database = Database.get(db)
+        migrate(self.database)
+        self.start = start
+        self.end = end
+        self._load_products()
+        self._load_lines()
+
+    def _load_products(self):
+        conn = self.database.connection()
+        rows = conn.execute("""
+            SELECT p.rowid, p.barcode_id, p.item_name, p.company,
+                   COALESCE(p.purchase_rate, 0), COALESCE(p.sale_rate, 0), COALESCE(s.amount, 0)
+            FROM products p
+            LEFT JOIN stock_units s ON s.barcode_id = p.barcode_id
+            ORDER BY p.rowid
+        """).fetchall()
+        rowids, self.barcode_ids, self.names, self.companies, purchase, sale, stock = (
+            list(zip(*rows)) if rows else [()] * 7)
+        self._rowids = np.array(rowids, dtype="i8")
+        self.purchase_rate = np.array(purchase, dtype="f8")
+        self.sale_rate = np.array(sale, dtype="f8")
+        self.stock = np.array(stock, dtype="f8")
+
+    def _load_lines(self):
+        conn = self.database.connection()
+        # Lines without a known product keep rowid 0 and only count towards the totals
+        sql = """
+            SELECT COALESCE(p.rowid, 0), si.qty, si.line_total,
+                   si.qty * COALESCE(si.unit_cost, p.purchase_rate, 0)
+            FROM sale_items si
+            LEFT JOIN products p ON p.barcode_id = si.barcode_id
+        """
+        if self.start is None and self.end is None:
+            # All-time reports skip the join to sales, a good part of the read time
+            cursor = conn.execute(sql)
+        else:
+            cursor = conn.execute(sql + """
+                JOIN sales s ON s.id = si.sale_id
+                WHERE (? IS NULL OR s.timestamp >= ?)
+                  AND (? IS NULL OR s.timestamp < ?)
+            """, (self.start, self.start, self.end, self.end))
+        lines = np.fromiter(cursor, dtype=LINE_DTYPE)
+        self.line_count = len(lines)
+        self.total_qty = lines["qty"].sum()
+        self.total_revenue = lines["revenue"].sum()
+        self.total_cost = lines["cost"].sum()
+
+        n = len(self._rowids)
+        index = np.searchsorted(self._rowids, lines["product"])
+        known = index < n
+        known[known] = self._rowids[index[known]] == lines["product"][known]
+        index = index[known]
+        self.qty_sold = np.bincount(index, weights=lines["qty"][known], minlength=n)
+        self.revenue = np.bincount(index, weights=lines["revenue"][known], minlength=n)
+        self.cogs = np.bincount(index, weights=lines["cost"][known], minlength=n)
+        self.profit = self.revenue - self.cogs
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.margin = np.where(self.revenue > 0, self.profit / self.revenue, 0.0)
+
+    def summary(self):
+        """:return: dict of period totals"""
+        profit = self.total_revenue - self.total_cost
+        return {
+            "lines": self.line_count,
+            "qty": float(self.total_qty),
+            "revenue": float(self.total_revenue),
+            "cogs": float(self.total_cost),
+            "gross_profit": float(profit),
+            "gross_margin": float(profit / self.total_revenue) if self.total_revenue else 0.0,
+        }
+
+    def abc_classes(self):
+        """A/B/C per product: A earns the first 80% of revenue, B the next 15%, C the rest."""
+        classes = np.full(len(self.revenue), "C", dtype="<U1")
+        total = self.revenue.sum()
+        if total <= 0:
+            return classes
+        order = np.argsort(-self.revenue, kind="stable")
+        # Share of revenue earned before each product, so the product crossing a limit stays in the higher class
+        share_before = (np.cumsum(self.revenue[order]) - self.revenue[order]) / total
+        ranked = np.full(len(order), "C", dtype="<U1")
+        for label, limit in reversed(ABC_LIMITS):
+            ranked[share_before < limit] = label
+        ranked[self.revenue[order] <= 0] = "C"
+        classes[order] = ranked
+        return classes
+
+    def top_movers(self, n=20):
+        """:return: product indexes of the n best sellers by quantity"""
+        sold = np.flatnonzero(self.qty_sold > 0)
+        return sold[np.argsort(-self.qty_sold[sold], kind="stable")[:n]]
+
+    def dead_stock(self):
+        """:return: product indexes in stock with no sales in the period, most capital tied up first"""
+        idle = np.flatnonzero((self.stock > 0) & (self.qty_sold == 0))
+        return idle[np.argsort(-(self.stock[idle] * self.purchase_rate[idle]), kind="stable")]
+
+    def _product_rows(self, indexes, classes):
+        for i in indexes:
+            yield (self.barcode_ids[i], self.names[i], self.companies[i] or "",
+                   f"{self.qty_sold[i]:g}", f"{self.revenue[i]:.2f}", f"{self.cogs[i]:.2f}",
+                   f"{self.profit[i]:.2f}", f"{self.margin[i] * 100:.1f}", f"{self.stock[i]:g}",
+                   f"{self.stock[i] * self.purchase_rate[i]:.2f}", classes[i])
+
+    def export_csv(self, out_dir="reports", top=20):
+        """
+        Write summary.csv, products.csv, top_movers.csv and dead_stock.csv.
+        :return: list of the paths written
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        header = ("barcode_id", "name", "company", "qty_sold", "revenue", "cogs", "gross_profit",
+                  "margin_pct", "stock", "stock_value", "abc")
+        classes = self.abc_classes()
+        by_revenue = np.argsort(-self.revenue, kind="stable")
+
+        paths = []
+        for name, indexes in (("products.csv", by_revenue),
+                              ("top_movers.csv", self.top_movers(top)),
+                              ("dead_stock.csv", self.dead_stock())):
+            path = os.path.join(out_dir, name)
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(self._product_rows(indexes, classes))
+            paths.append(path)
+
+        path = os.path.join(out_dir, "summary.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("start", "end", *self.summary()))
+            writer.writerow((self.start or "", self.end or "", *self.summary().values()))
+        paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export profit, margin, top mover, dead stock and ABC reports.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--start", help="first day included, YYYY-MM-DD")
+    parser.add_argument("--end", help="first day excluded, YYYY-MM-DD")
+    parser.add_argument("--out", default="reports")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    report = ProfitReport(db=args.db, start=args.start, end=args.end)
+    summary = report.summary()
+    print(f"{summary['lines']} lines, revenue Rs.{summary['revenue']:.2f}, "
+          f"gross profit Rs.{summary['gross_profit']:.2f} ({summary['gross_margin'] * 100:.1f}%)")
+    for path in report.export_csv(args.out, top=args.top):
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
 from PyQt6.QtWidgets import (
-    QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QPushButton, QMessageBox
+    QDialog, QVBoxLayout, QTableView, QPushButton, QMessageBox, QLabel
 )
-from PyQt6.QtCore import Qt
-import json
+from PyQt6.QtCore import Qt, pyqtSignal
+from sales_model import SalesTableModel
+from db_worker import DbWorker
 
 class SaleWindow(QDialog):
-    def __init__(self, sales_manager, printer=None, parent=None):
+    # Emitted on the spooler thread, delivered on the GUI thread
+    spool_failed = pyqtSignal(object)
+
+    def __init__(self, sales_manager, printer=None, parent=None, worker=None):
         super().__init__(parent)
         self.sales_manager = sales_manager
         self.printer = printer
+        self.worker = worker or DbWorker(self)
+        self.spool_failed.connect(self._spool_failed)
 
         self.setWindowTitle("Sales History")
         self.resize(800, 400)
@@ -18,39 +24,27 @@ class SaleWindow(QDialog):
     def _setup_ui(self):
         layout = QVBoxLayout(self)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["ID", "Time", "Items", "Total", "Customer", "Invoice"])
+        # Sales are paged in newest-first as the user scrolls
+        self.model = SalesTableModel(self.sales_manager, self, worker=self.worker)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setSelectionBehavior(self.table.SelectionBehavior.SelectRows)
         self.table.setSelectionMode(self.table.SelectionMode.SingleSelection)
         layout.addWidget(self.table)
 
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+        self.model.page_failed.connect(lambda error: self.status_label.setText(f"Could not load sales: {error}"))
+        self.model.rowsInserted.connect(lambda: self.status_label.setText(""))
+
         if self.printer:
             self.print_btn = QPushButton("Print Selected Bill")
             self.print_btn.clicked.connect(self.print_selected)
             layout.addWidget(self.print_btn)
 
     def populate_table(self):
-        sales = self.sales_manager.get_all_sales()
-        self.table.setRowCount(0)
-
-        for row in sales:
-            sale_id, timestamp, items_json, total, customer_name, invoice_no = row
-            try:
-                items = json.loads(items_json)
-                items_str = ", ".join(f"{item['name']} x{item['quantity']}" for item in items)
-            except Exception:
-                items_str = "Error parsing items"
-
-            row_pos = self.table.rowCount()
-            self.table.insertRow(row_pos)
-            self.table.setItem(row_pos, 0, QTableWidgetItem(str(sale_id)))
-            self.table.setItem(row_pos, 1, QTableWidgetItem(str(timestamp)))
-            self.table.setItem(row_pos, 2, QTableWidgetItem(items_str))
-            self.table.setItem(row_pos, 3, QTableWidgetItem(str(total)))
-            self.table.setItem(row_pos, 4, QTableWidgetItem(customer_name))
-            self.table.setItem(row_pos, 5, QTableWidgetItem(str(invoice_no)))
+        self.model.reload()
 
     def print_selected(self):
         selected_rows = self.table.selectionModel().selectedRows()
@@ -58,21 +52,28 @@ class SaleWindow(QDialog):
             QMessageBox.warning(self, "No Selection", "Please select a sale to print.")
             return
 
-        row = selected_rows[0].row()
-        invoice_no = self.table.item(row, 5).text()
-        customer_name = self.table.item(row, 4).text()
+        # row = (id, timestamp, items_summary, total_price, customer_name, invoice_no)
+        row = self.model.row_at(selected_rows[0].row())
+        self.worker.submit(self.sales_manager.get_bill, row[0],
+                           on_result=self._print_sale, on_error=self._print_failed, key=(self, "print"))
 
-        sale_record = self.sales_manager.get_sale_by_invoice(invoice_no)
-        if not sale_record:
+    def _print_failed(self, error):
+        QMessageBox.critical(self, "Error", f"Could not retrieve sale details: {error}")
+
+    def _print_sale(self, bill):
+        if not bill:
             QMessageBox.critical(self, "Error", "Could not retrieve sale details.")
             return
 
-        _, _, items_json, _, _, _ = sale_record
-        try:
-            items = json.loads(items_json)
-        except Exception:
-            QMessageBox.critical(self, "Error", "Failed to parse sale items.")
-            return
+        customer_name, invoice_no, items, sold_at = bill
+        bill_text = self.printer.generate_bill(customer_name, items, invoice_no=invoice_no, sold_at=sold_at)
+        self.printer.print_bill(bill_text, invoice_no=invoice_no, on_error=self.spool_failed.emit)
+
+    def _spool_failed(self, error):
+        QMessageBox.critical(self, "Printer Error", f"The bill could not be printed: {error}")
 
-        bill_text = self.printer.generate_bill(customer_name, items, invoice_no=invoice_no)
-        self.printer.print_bill(bill_text)
+    def done(self, result):
+        # Nothing arrives for a closed window
+        self.worker.cancel((self.model, "page"))
+        self.worker.cancel((self, "print"))
+        super().done(result)
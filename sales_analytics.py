@@ -0,0 +1,113 @@
+"""
+Sales figures read from the daily rollups. Totals touch one row per day in
+range and breakdowns one row per product per day, however many invoices
+those days hold.
+
+    python sales_analytics.py [--db inventory.db] summary
+    python sales_analytics.py [--db inventory.db] rebuild
+"""
+import argparse
+import datetime
+from collections import namedtuple
+
+from database import Database
+from migrations import migrate
+from sales_manager import SaleManager
+
+SalesTotals = namedtuple("SalesTotals", "invoices qty revenue cost profit")
+
+
+def _day(value):
+    return value if isinstance(value, str) else value.isoformat()
+
+
+class SalesAnalytics:
+    """
+    Dates are "YYYY-MM-DD" strings or datetime.date objects; ranges include
+    start and exclude end. Sale timestamps are stored in UTC, so "today" is
+    the UTC date as well.
+    """
+
+    def __init__(self, db="inventory.db"):
+        self.db = db
+        self.database = Database.get(db)
+        migrate(self.database)
+
+    @staticmethod
+    def today_date():
+        return datetime.datetime.now(datetime.timezone.utc).date()
+
+    def totals(self, start, end):
+        conn = self.database.connection()
+        invoices, qty, revenue, cost = conn.execute("""
+            SELECT COALESCE(SUM(invoices), 0), COALESCE(SUM(qty), 0),
+                   COALESCE(SUM(revenue), 0), COALESCE(SUM(cost), 0)
+            FROM sales_daily_totals
+            WHERE date >= ? AND date < ?
+        """, (_day(start), _day(end))).fetchone()
+        return SalesTotals(invoices, qty, revenue, cost, revenue - cost)
+
+    def today(self):
+        day = self.today_date()
+        return self.totals(day, day + datetime.timedelta(days=1))
+
+    def this_month(self):
+        first = self.today_date().replace(day=1)
+        next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+        return self.totals(first, next_month)
+
+    def daily(self, start, end):
+        """:return: list of (date, invoices, qty, revenue, cost), one per day with sales"""
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT date, invoices, qty, revenue, cost
+            FROM sales_daily_totals
+            WHERE date >= ? AND date < ?
+            ORDER BY date
+        """, (_day(start), _day(end))).fetchall()
+
+    def by_product(self, start, end, limit=None):
+        """:return: list of (barcode_id, item_name, qty, revenue, cost), best sellers first"""
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT d.barcode_id, p.item_name, SUM(d.qty), SUM(d.revenue) AS revenue, SUM(d.cost)
+            FROM sales_daily d
+            LEFT JOIN products p ON p.barcode_id = d.barcode_id
+            WHERE d.date >= ? AND d.date < ?
+            GROUP BY d.barcode_id
+            ORDER BY revenue DESC
+            LIMIT ?
+        """, (_day(start), _day(end), -1 if limit is None else limit)).fetchall()
+
+    def by_category(self, start, end):
+        """:return: list of (category_name, qty, revenue, cost)"""
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT COALESCE(c.category_name, 'Unknown'), SUM(d.qty), SUM(d.revenue) AS revenue, SUM(d.cost)
+            FROM sales_daily d
+            LEFT JOIN products p ON p.barcode_id = d.barcode_id
+            LEFT JOIN categories c ON c.category_id = p.category_id
+            WHERE d.date >= ? AND d.date < ?
+            GROUP BY 1
+            ORDER BY revenue DESC
+        """, (_day(start), _day(end))).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sales rollup figures and maintenance.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("command", choices=["summary", "rebuild"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"sales_daily rebuilt, {SaleManager(db=args.db).rebuild_daily_rollup()} rows")
+        return
+
+    analytics = SalesAnalytics(db=args.db)
+    for label, totals in (("Today", analytics.today()), ("This month", analytics.this_month())):
+        print(f"{label:<12} invoices {totals.invoices:>6}  qty {totals.qty:>10g}  revenue Rs.{totals.revenue:>12.2f}  "
+              f"profit Rs.{totals.profit:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,180 @@
-import sqlite3
-import datetime
-import random
 import json
+import logging
+from database import Database
+from migrations import migrate
+from product_cache import ProductCache, AMOUNT
+from sequences import Sequence, format_invoice
+import stock_ledger
+from customer_manager import resolve_customer, add_sale, display_name, name_key, prefix_end
+
+
+log = logging.getLogger(__name__)
+
+# A customer filter matching more customers than this is read in time order
+# rather than by merging each customer's invoices
+SEARCH_MAX_CUSTOMERS = 20
+
+
+def normalize_item(item):
+    """
+    One line item in the record_sale layout: barcode_id, name, quantity,
+    price_per_unit, total_price. Item dicts have used both quantity/total_price
+    and qty/total/price keys over time; the older spellings are read too.
+    """
+    quantity = float(item.get("quantity", item.get("qty", 0)) or 0)
+    total_price = float(item.get("total_price", item.get("total", 0)) or 0)
+    price_per_unit = item.get("price_per_unit", item.get("price"))
+    if price_per_unit is None and quantity:
+        price_per_unit = total_price / quantity
+    return {"barcode_id": item.get("barcode_id"), "name": item.get("name") or item.get("barcode_id") or "",
+            "quantity": quantity, "price_per_unit": price_per_unit, "total_price": total_price}
+
+
+class OutOfStockError(ValueError):
+    def __init__(self, barcode_id, requested, available):
+        self.barcode_id = barcode_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Not enough stock for {barcode_id}: requested {requested}, available {available}")
+
 
 class SaleManager:
     def __init__(self, db="inventory.db"):
         self.db = db
+        self.database = Database.get(db)
         self._init_table()
+        self.invoice_sequence = Sequence.get(self.database, "invoice")
 
     def _init_table(self):
-        with sqlite3.connect(self.db) as conn:
-            # Drop old sales table if exists (optional, you may want to migrate instead)
-            # conn.execute('DROP TABLE IF EXISTS sales')
-
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS sales (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT DEFAULT (datetime('now')),
-                    items_json TEXT NOT NULL,
-                    total_price REAL NOT NULL,
-                    customer_name TEXT,
-                    invoice_no TEXT UNIQUE
-                )
-            ''')
-            conn.commit()
+        migrate(self.database)
+        self.backfill_sale_items()
+
+    @staticmethod
+    def _line_values(sale_id, item):
+        item = normalize_item(item)
+        return (sale_id, item["barcode_id"], item["quantity"], item["price_per_unit"], item["total_price"])
+
+    # unit_cost is the part's purchase rate at the moment the line is written
+    @staticmethod
+    def _insert_lines(conn, lines):
+        conn.executemany("""
+            INSERT INTO sale_items (sale_id, barcode_id, qty, unit_price, line_total, unit_cost)
+            VALUES (?, ?, ?, ?, ?, (SELECT purchase_rate FROM products WHERE barcode_id = ?))
+        """, [line + (line[1],) for line in lines])
+
+    # Fold the lines of sales first_id..last_id into the sales_daily rollups;
+    # with sale_ids, only the lines of those sales in that range
+    @staticmethod
+    def _roll_up(conn, first_id, last_id, sale_ids=None):
+        only = f"AND si.sale_id IN ({','.join('?' * len(sale_ids))})" if sale_ids else ""
+        params = (first_id, last_id, *(sale_ids or ()))
+        conn.execute(f"""
+            INSERT INTO sales_daily (date, barcode_id, qty, revenue, cost)
+            SELECT date(s.timestamp), COALESCE(si.barcode_id, ''),
+                   SUM(si.qty), SUM(si.line_total), SUM(si.qty * COALESCE(si.unit_cost, 0))
+            FROM sale_items si
+            JOIN sales s ON s.id = si.sale_id
+            WHERE si.sale_id BETWEEN ? AND ? {only}
+            GROUP BY 1, 2
+            ON CONFLICT (date, barcode_id) DO UPDATE SET
+                qty = qty + excluded.qty,
+                revenue = revenue + excluded.revenue,
+                cost = cost + excluded.cost
+        """, params)
+        conn.execute(f"""
+            INSERT INTO sales_daily_totals (date, invoices, qty, revenue, cost)
+            SELECT date(s.timestamp), COUNT(DISTINCT si.sale_id),
+                   SUM(si.qty), SUM(si.line_total), SUM(si.qty * COALESCE(si.unit_cost, 0))
+            FROM sale_items si
+            JOIN sales s ON s.id = si.sale_id
+            WHERE si.sale_id BETWEEN ? AND ? {only}
+            GROUP BY 1
+            ON CONFLICT (date) DO UPDATE SET
+                invoices = invoices + excluded.invoices,
+                qty = qty + excluded.qty,
+                revenue = revenue + excluded.revenue,
+                cost = cost + excluded.cost
+        """, params)
+
+    def backfill_sale_items(self, batch_size=1000):
+        """
+        Copy lines of sales recorded before sale_items existed, from items_json
+        or the old single-item barcode_id/quantity columns. Works forward from
+        the backfill_progress mark, one transaction per batch, and moves the
+        mark past every sale looked at, so a sale with nothing to copy, or with
+        an unreadable items_json (logged and skipped), is not looked at again.
+        :return: number of sales backfilled
+        """
+        conn = self.database.connection()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sales)")}
+        legacy = "barcode_id" in columns and "quantity" in columns
+        legacy_cols = "barcode_id, quantity" if legacy else "NULL, NULL"
+        mark = "SELECT last_id FROM backfill_progress WHERE name = 'sale_items'"
 
+        # No sale past the mark: an up-to-date till starts without taking the write lock
+        if conn.execute(f"SELECT COALESCE(MAX(id), 0) <= ({mark}) FROM sales").fetchone()[0]:
+            return 0
+        done = 0
+        while True:
+            with self.database.transaction() as conn:
+                # Picked inside the write transaction, so sales a checkout or another
+                # till gave lines in the meantime are neither copied nor rolled up twice
+                rows = conn.execute(f"""
+                    SELECT id, items_json, total_price, {legacy_cols}
+                    FROM sales
+                    WHERE id > ({mark}) AND NOT EXISTS (SELECT 1 FROM sale_items WHERE sale_id = sales.id)
+                    ORDER BY id
+                    LIMIT ?
+                """, (batch_size,)).fetchall()
+                if not rows:
+                    # Every later sale already has its lines
+                    conn.execute("""
+                        UPDATE backfill_progress SET last_id = MAX(last_id, (SELECT COALESCE(MAX(id), 0) FROM sales))
+                        WHERE name = 'sale_items'
+                    """)
+                    return done
+
+                lines = []
+                for sale_id, items_json, total_price, barcode_id, quantity in rows:
+                    try:
+                        lines.extend(self._legacy_lines(sale_id, items_json, total_price, barcode_id, quantity))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        log.warning("Sale %s has unreadable items_json, no lines copied: %s", sale_id, e)
+
+                self._insert_lines(conn, lines)
+                self._roll_up(conn, rows[0][0], rows[-1][0], [row[0] for row in rows])
+                conn.execute("UPDATE backfill_progress SET last_id = ? WHERE name = 'sale_items'", (rows[-1][0],))
+            done += len(rows)
+
+    @classmethod
+    def _legacy_lines(cls, sale_id, items_json, total_price, barcode_id, quantity):
+        """sale_items values for one old sale; raises ValueError, TypeError or AttributeError if it is malformed"""
+        try:
+            items = json.loads(items_json) if items_json else []
+        except ValueError:
+            items = []
+        if not isinstance(items, list):
+            raise ValueError(f"expected a list of items, got {type(items).__name__}")
+        if not items and barcode_id is not None:
+            items = [{"barcode_id": barcode_id, "quantity": quantity or 0, "total_price": total_price or 0}]
+        # Built in full before returning, so a bad item leaves none of the sale's lines behind
+        return [cls._line_values(sale_id, item) for item in items]
+
+    def rebuild_daily_rollup(self):
+        """
+        Recompute sales_daily and sales_daily_totals from every sale line, e.g. after editing old sales
+        by hand. Runs as one transaction, so readers never see a partial rollup.
+        :return: number of rollup rows written
+        """
+        with self.database.transaction() as conn:
+            conn.execute("DELETE FROM sales_daily")
+            conn.execute("DELETE FROM sales_daily_totals")
+            self._roll_up(conn, 0, conn.execute("SELECT COALESCE(MAX(sale_id), 0) FROM sale_items").fetchone()[0])
+            return conn.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0]
+
+    # Sortable "INV" + 9-digit number + check digit; taken before any transaction opens
     def generate_invoice_no(self):
-        now = datetime.datetime.now()
-        return f"INV{now.strftime('%Y%m%d%H%M%S')}{random.randint(100,999)}"
+        return format_invoice(self.invoice_sequence.next_value())
 
     def record_sale(self, items, total_price, customer_name):
         """
@@ -38,33 +185,324 @@ class SaleManager:
         :return: invoice_no string
         """
         invoice_no = self.generate_invoice_no()
-        items_json = json.dumps(items)
-
-        with sqlite3.connect(self.db) as conn:
-            conn.execute('''
-                INSERT INTO sales (timestamp, items_json, total_price, customer_name, invoice_no)
-                VALUES (datetime('now'), ?, ?, ?, ?)
-            ''', (items_json, total_price, customer_name, invoice_no))
-            conn.commit()
+        with self.database.transaction() as conn:
+            self._insert_sale(conn, invoice_no, items, total_price, customer_name)
         return invoice_no
 
+    # "name xqty, ..." as shown in the sales history Items column
+    @staticmethod
+    def items_summary(items):
+        return ", ".join(
+            f"{item.get('name', item.get('barcode_id'))} x{item.get('quantity', item.get('qty'))}"
+            for item in items
+        )
+
+    def _insert_sale(self, conn, invoice_no, items, total_price, customer_name, phone=None, paid=None):
+        # Named sales are linked to a customer, whose running totals move in the same transaction
+        paid = total_price if paid is None else paid
+        customer_id = resolve_customer(conn, customer_name, phone)
+        if customer_id is not None:
+            customer_name = display_name(customer_name)
+            add_sale(conn, customer_id, total_price, paid)
+        cur = conn.execute('''
+            INSERT INTO sales (timestamp, items_json, items_summary, total_price, customer_name, invoice_no,
+                               customer_id, amount_paid)
+            VALUES (datetime('now'), ?, ?, ?, ?, ?, ?, ?)
+        ''', (json.dumps(items), self.items_summary(items), total_price, customer_name, invoice_no,
+              customer_id, paid))
+
+        sale_id = cur.lastrowid
+        self._insert_lines(conn, [self._line_values(sale_id, item) for item in items])
+        self._roll_up(conn, sale_id, sale_id)
+        return sale_id
+
+    def checkout(self, cart, customer_name, invoice_no=None, phone=None, paid=None):
+        """
+        Sell every line of a cart as one invoice: the sale row and all stock
+        decrements commit together or not at all.
+        :param cart: list of dicts, each with keys: barcode_id, quantity
+        :param customer_name: string
+        :param invoice_no: number taken earlier with generate_invoice_no, needed
+            when checkout runs inside a caller's transaction
+        :param phone: customer's phone number, saved if the customer has none yet
+        :param paid: amount paid now; None for the full total, less to sell on account
+        :return: (invoice_no, items) where items follow the record_sale item layout
+        :raises OutOfStockError: if any line asks for more than is in stock
+        """
+        # Merge repeated barcodes so each product is checked and updated once
+        quantities = {}
+        for line in cart:
+            qty = float(line["quantity"])
+            if qty <= 0:
+                raise ValueError(f"Invalid quantity {qty} for {line['barcode_id']}")
+            quantities[line["barcode_id"]] = quantities.get(line["barcode_id"], 0) + qty
+        if not quantities:
+            raise ValueError("Cart is empty")
+
+        barcodes = list(quantities)
+        placeholders = ",".join("?" * len(barcodes))
+
+        # Optimistic check: prices and stock are read without the write lock,
+        # so other tills keep selling while this cart is priced
+        conn = self.database.connection()
+        rows = conn.execute(f"""
+            SELECT p.barcode_id, p.item_name, p.sale_rate, s.amount
+            FROM products p
+            LEFT JOIN stock_units s ON p.barcode_id = s.barcode_id
+            WHERE p.barcode_id IN ({placeholders})
+        """, barcodes).fetchall()
+        products = {row[0]: row for row in rows}
+
+        items = []
+        for barcode_id in barcodes:
+            if barcode_id not in products:
+                raise ValueError(f"Unknown barcode {barcode_id}")
+            _, name, sale_rate, available = products[barcode_id]
+            qty = quantities[barcode_id]
+            if available is None or qty > available:
+                raise OutOfStockError(barcode_id, qty, available or 0)
+            items.append({
+                "barcode_id": barcode_id,
+                "name": name,
+                "quantity": qty,
+                "price_per_unit": sale_rate,
+                "total_price": qty * sale_rate,
+            })
+        total_price = sum(item["total_price"] for item in items)
+        if paid is not None and not 0 <= paid <= total_price:
+            raise ValueError(f"Paid amount {paid} must be between 0 and the total {total_price}")
+        # A number taken here and not used (stock gone meanwhile) is simply skipped
+        invoice_no = invoice_no or self.generate_invoice_no()
+
+        # Short write transaction: the amount guard re-checks stock under the
+        # lock, so a till that sold the same part meanwhile can't be oversold
+        with self.database.transaction() as conn:
+            # The savepoint lets a refused cart read its stock as it was before
+            # the decrements, also when checkout joins a caller's transaction
+            conn.execute("SAVEPOINT checkout")
+            cur = conn.executemany("""
+                UPDATE stock_units
+                SET amount = amount - ?
+                WHERE barcode_id = ? AND amount >= ?
+            """, [(item["quantity"], item["barcode_id"], item["quantity"]) for item in items])
+            refused = cur.rowcount < len(items)
+            if refused:
+                conn.execute("ROLLBACK TO checkout")
+            conn.execute("RELEASE checkout")
+            remaining = dict(conn.execute(f"""
+                SELECT barcode_id, amount FROM stock_units WHERE barcode_id IN ({placeholders})
+            """, barcodes).fetchall())
+            if refused:
+                for item in items:
+                    available = remaining.get(item["barcode_id"])
+                    if available is None or available < item["quantity"]:
+                        raise OutOfStockError(item["barcode_id"], item["quantity"], available or 0)
+            stock_ledger.record_movements(
+                conn, [(item["barcode_id"], "sale", -item["quantity"], invoice_no) for item in items])
+            self._insert_sale(conn, invoice_no, items, total_price, customer_name, phone, paid)
+
+        # Keep cached product rows in step with the committed stock levels
+        cache = ProductCache.shared(self.db)
+        for barcode_id, amount in remaining.items():
+            cache.patch(barcode_id, AMOUNT, amount)
+        return invoice_no, items
+
     def get_sales_summary(self):
-        with sqlite3.connect(self.db) as conn:
-            return conn.execute("SELECT COALESCE(SUM(total_price),0) FROM sales").fetchone()
+        conn = self.database.connection()
+        # Summed from the daily rollup rather than every sale
+        return conn.execute("SELECT COALESCE(SUM(revenue),0) FROM sales_daily_totals").fetchone()
 
     def get_all_sales(self):
-        with sqlite3.connect(self.db) as conn:
-            # Returns id, timestamp, items_json (string), total_price, customer_name, invoice_no
-            return conn.execute("""
-                SELECT id, timestamp, items_json, total_price, customer_name, invoice_no
+        conn = self.database.connection()
+        # Returns id, timestamp, items_json (string), total_price, customer_name, invoice_no
+        return conn.execute("""
+            SELECT id, timestamp, items_json, total_price, customer_name, invoice_no
+            FROM sales
+            ORDER BY timestamp DESC
+        """).fetchall()
+
+    def get_sales_page(self, before_ts=None, before_id=None, limit=100):
+        """
+        Newest-first keyset page of sales. Pass the last row's timestamp and id
+        to get the next page.
+        :return: list of (id, timestamp, items_summary, total_price, customer_name, invoice_no)
+        """
+        conn = self.database.connection()
+        if before_ts is None:
+            rows = conn.execute("""
+                SELECT id, timestamp, items_summary, total_price, customer_name, invoice_no, items_json
+                FROM sales
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT id, timestamp, items_summary, total_price, customer_name, invoice_no, items_json
                 FROM sales
-                ORDER BY timestamp DESC
-            """).fetchall()
+                WHERE (timestamp, id) < (?, ?)
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, (before_ts, before_id, limit)).fetchall()
+        return [row[:6] if row[2] is not None else self._with_summary(row) for row in rows]
+
+    # Sales written before items_summary existed are summarised only when paged in
+    def _with_summary(self, row):
+        sale_id, timestamp, _, total, customer_name, invoice_no, items_json = row
+        try:
+            items = json.loads(items_json) if items_json else []
+        except ValueError:
+            items = []
+        if not items:
+            items = [{"barcode_id": barcode_id, "quantity": qty}
+                     for barcode_id, qty, _, _ in self.get_sale_items(sale_id)]
+        return (sale_id, timestamp, self.items_summary(items), total, customer_name, invoice_no)
+
+    def search_invoices(self, invoice_prefix=None, start=None, end=None, customer=None,
+                        min_total=None, max_total=None, after=None, limit=50):
+        """
+        Keyset page of invoices matching every filter given. With an invoice
+        prefix, pages run in descending invoice number order along the
+        invoice_no index; otherwise newest first along idx_sales_search_time,
+        or idx_sales_customer_search for a few customers.
+        :param start: earliest timestamp or date, inclusive
+        :param end: timestamp or date to stop before, exclusive
+        :param customer: start of a customer's name, matched as in the sell dialog
+        :param after: last row of the previous page
+        :return: list of (id, timestamp, items_summary, total_price, customer_name, invoice_no)
+        """
+        where, params = [], []
+        prefix = (invoice_prefix or "").strip().upper()
+        if prefix:
+            where.append("invoice_no >= ? AND invoice_no < ?")
+            params += [prefix, prefix_end(prefix)]
+            order = "invoice_no DESC, id DESC"
+        else:
+            order = "timestamp DESC, id DESC"
+        if start:
+            where.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            where.append("timestamp < ?")
+            params.append(end)
+        if min_total is not None:
+            where.append("total_price >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            where.append("total_price <= ?")
+            params.append(max_total)
+        conn = self.database.connection()
+        key = name_key(customer)
+        if key:
+            customer_ids = [row[0] for row in conn.execute("""
+                SELECT customer_id FROM customers WHERE name_key >= ? AND name_key < ? LIMIT ?
+            """, (key, prefix_end(key), SEARCH_MAX_CUSTOMERS + 1))]
+            if not customer_ids:
+                return []
+            if len(customer_ids) <= SEARCH_MAX_CUSTOMERS:
+                where.append(f"customer_id IN ({','.join('?' * len(customer_ids))})")
+                params += customer_ids
+            else:
+                # Too many to merge their invoices: walk the time order instead and
+                # test customer_id inside the index (the + keeps it off the customer index)
+                where.append("+customer_id IN (SELECT customer_id FROM customers WHERE name_key >= ? AND name_key < ?)")
+                params += [key, prefix_end(key)]
+        if after is not None:
+            if prefix:
+                # id breaks ties between repeated invoice numbers in upgraded databases
+                where.append("(invoice_no, id) < (?, ?)")
+                params += [after[5], after[0]]
+            else:
+                where.append("(timestamp, id) < (?, ?)")
+                params += [after[1], after[0]]
+
+        rows = conn.execute(f"""
+            SELECT id, timestamp, items_summary, total_price, customer_name, invoice_no, items_json
+            FROM sales
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {order}
+            LIMIT ?
+        """, (*params, limit)).fetchall()
+        return [row[:6] if row[2] is not None else self._with_summary(row) for row in rows]
+
+    def get_bill(self, sale_id):
+        """
+        Everything needed to reprint a sale, with every line it was sold with.
+        Sales with no items_json are rebuilt from sale_items.
+        :return: (customer_name, invoice_no, items, timestamp) with items in the record_sale layout, or None
+        """
+        conn = self.database.connection()
+        sale = conn.execute("SELECT id, customer_name, invoice_no, items_json, timestamp FROM sales WHERE id = ?",
+                            (sale_id,)).fetchone()
+        return self._bill(conn, *sale) if sale else None
+
+    def iter_bills(self, start, end):
+        """
+        Bills of every sale in [start, end), oldest first, streamed from one
+        query along idx_sales_search_time, so reprinting or exporting any
+        number of invoices holds one at a time.
+        :return: generator of (customer_name, invoice_no, items, timestamp) as get_bill returns them
+        """
+        conn = self.database.connection()
+        sales = conn.execute("""
+            SELECT id, customer_name, invoice_no, items_json, timestamp FROM sales
+            WHERE timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp, id
+        """, (start, end))
+        for sale in sales:
+            yield self._bill(conn, *sale)
+
+    @staticmethod
+    def _bill(conn, sale_id, customer_name, invoice_no, items_json, timestamp):
+        items = json.loads(items_json) if items_json else []
+        if not items:
+            items = [{"barcode_id": barcode_id, "name": name, "quantity": qty, "price_per_unit": unit_price,
+                      "total_price": line_total}
+                     for barcode_id, qty, unit_price, line_total, name in conn.execute("""
+                        SELECT si.barcode_id, si.qty, si.unit_price, si.line_total, p.item_name
+                        FROM sale_items si LEFT JOIN products p ON p.barcode_id = si.barcode_id
+                        WHERE si.sale_id = ?
+                        ORDER BY si.rowid
+                     """, (sale_id,))]
+        return customer_name or "", invoice_no, [normalize_item(item) for item in items], timestamp
 
     def get_sale_by_invoice(self, invoice_no):
-        with sqlite3.connect(self.db) as conn:
-            return conn.execute("""
-                SELECT id, timestamp, items_json, total_price, customer_name, invoice_no
-                FROM sales
-                WHERE invoice_no = ?
-            """, (invoice_no,)).fetchone()
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT id, timestamp, items_json, total_price, customer_name, invoice_no
+            FROM sales
+            WHERE invoice_no = ?
+        """, (invoice_no,)).fetchone()
+
+    def get_sale_items(self, sale_id):
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT barcode_id, qty, unit_price, line_total
+            FROM sale_items
+            WHERE sale_id = ?
+            ORDER BY rowid
+        """, (sale_id,)).fetchall()
+
+    # start/end are timestamps as stored ("YYYY-MM-DD HH:MM:SS"); end is exclusive
+    def get_product_sales(self, barcode_id, start=None, end=None):
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT COALESCE(SUM(si.qty), 0), COALESCE(SUM(si.line_total), 0)
+            FROM sale_items si
+            JOIN sales s ON s.id = si.sale_id
+            WHERE si.barcode_id = ?
+              AND (? IS NULL OR s.timestamp >= ?)
+              AND (? IS NULL OR s.timestamp < ?)
+        """, (barcode_id, start, start, end, end)).fetchone()
+
+    def get_sales_by_product(self, start=None, end=None, limit=None):
+        conn = self.database.connection()
+        return conn.execute("""
+            SELECT si.barcode_id, SUM(si.qty) AS qty, SUM(si.line_total) AS revenue
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            WHERE (? IS NULL OR s.timestamp >= ?)
+              AND (? IS NULL OR s.timestamp < ?)
+            GROUP BY si.barcode_id
+            ORDER BY revenue DESC
+            LIMIT ?
+        """, (start, start, end, end, -1 if limit is None else limit)).fetchall()
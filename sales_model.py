@@ -0,0 +1,97 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+# Sales pulled from SQLite each time the view scrolls near the end
+PAGE_SIZE = 100
+
+
+class SalesTableModel(QAbstractTableModel):
+    """
+    Newest-first sales history, paged in with SaleManager.get_sales_page, or
+    the results of one invoice search, paged in with search_invoices.
+    Rows are cached as (id, timestamp, items_summary, total_price, customer_name, invoice_no).
+    With a DbWorker, pages are read off the GUI thread.
+    """
+
+    HEADERS = ["ID", "Time", "Items", "Total", "Customer", "Invoice"]
+
+    # Emitted with the exception when a page could not be read
+    page_failed = pyqtSignal(object)
+
+    def __init__(self, sales_manager, parent=None, worker=None):
+        super().__init__(parent)
+        self.sales_manager = sales_manager
+        self.worker = worker
+        self.filters = None
+        self._rows = []
+        self._exhausted = False
+        self._loading = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self._rows[index.row()][index.column()]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        if self.filters is not None:
+            fn = self.sales_manager.search_invoices
+            kwargs = dict(self.filters, after=self._rows[-1] if self._rows else None, limit=PAGE_SIZE)
+        elif self._rows:
+            last = self._rows[-1]
+            fn, kwargs = self.sales_manager.get_sales_page, {"before_ts": last[1], "before_id": last[0], "limit": PAGE_SIZE}
+        else:
+            fn, kwargs = self.sales_manager.get_sales_page, {"limit": PAGE_SIZE}
+
+        if self.worker is None:
+            self._add_page(fn(**kwargs))
+        else:
+            self._loading = True
+            self.worker.submit(fn, on_result=self._add_page,
+                               on_error=self._page_failed, key=(self, "page"), **kwargs)
+
+    def _add_page(self, page):
+        self._loading = False
+        if len(page) < PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+
+    def _page_failed(self, error):
+        # Leave the model as it is; scrolling asks for the page again
+        self._loading = False
+        self.page_failed.emit(error)
+
+    def reload(self):
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self._loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def search(self, **filters):
+        """Show only the invoices matching these search_invoices filters."""
+        self.filters = filters
+        self.reload()
+
+    def row_at(self, row):
+        return self._rows[row]
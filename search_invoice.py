@@ -1,30 +1,92 @@
+import datetime
+
 from PyQt6.QtWidgets import (
-    QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox
+    QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QTableView, QMessageBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
+from db_worker import DbWorker
+from sales_model import SalesTableModel
 
 
 class InvoiceSearchWindow(QDialog):
-    def __init__(self, sales_manager, printer=None, parent=None):
+    # Emitted on the spooler thread, delivered on the GUI thread
+    spool_failed = pyqtSignal(object)
+
+    def __init__(self, sales_manager, printer=None, parent=None, worker=None):
         super().__init__(parent)
         self.sales_manager = sales_manager
         self.printer = printer
+        self.worker = worker or DbWorker(self)
+        self.spool_failed.connect(self._spool_failed)
 
         self.setWindowTitle("Search Invoice")
-        self.setFixedSize(400, 180)
+        self.resize(800, 500)
         self._center_window()
 
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        layout.addWidget(QLabel("Enter Invoice Number"))
+        # Every filter is optional; the ones filled in must all match
+        filters = QGridLayout()
+        layout.addLayout(filters)
 
+        filters.addWidget(QLabel("Invoice Number"), 0, 0)
         self.entry = QLineEdit()
-        layout.addWidget(self.entry)
+        self.entry.setPlaceholderText("Whole number or its start")
+        filters.addWidget(self.entry, 0, 1)
+
+        filters.addWidget(QLabel("Customer"), 0, 2)
+        self.customer_edit = QLineEdit()
+        filters.addWidget(self.customer_edit, 0, 3)
+
+        filters.addWidget(QLabel("From Date"), 1, 0)
+        self.start_edit = QLineEdit()
+        self.start_edit.setPlaceholderText("YYYY-MM-DD")
+        filters.addWidget(self.start_edit, 1, 1)
+
+        filters.addWidget(QLabel("To Date"), 1, 2)
+        self.end_edit = QLineEdit()
+        self.end_edit.setPlaceholderText("YYYY-MM-DD")
+        filters.addWidget(self.end_edit, 1, 3)
+
+        filters.addWidget(QLabel("Min Amount"), 2, 0)
+        self.min_total_edit = QLineEdit()
+        filters.addWidget(self.min_total_edit, 2, 1)
+
+        filters.addWidget(QLabel("Max Amount"), 2, 2)
+        self.max_total_edit = QLineEdit()
+        filters.addWidget(self.max_total_edit, 2, 3)
+
+        for edit in (self.entry, self.customer_edit, self.start_edit, self.end_edit,
+                     self.min_total_edit, self.max_total_edit):
+            edit.returnPressed.connect(self.search)
 
         search_btn = QPushButton("Search")
         search_btn.clicked.connect(self.search)
         layout.addWidget(search_btn)
+        self.search_btn = search_btn
+
+        # Matches are paged in as the user scrolls
+        self.model = SalesTableModel(self.sales_manager, self, worker=self.worker)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(self.table.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(self.table.SelectionMode.SingleSelection)
+        self.table.doubleClicked.connect(self.print_selected)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        layout.addLayout(btn_layout)
+        self.status_label = QLabel("")
+        btn_layout.addWidget(self.status_label)
+        self.print_btn = QPushButton("Reprint Selected Bill")
+        self.print_btn.clicked.connect(self.print_selected)
+        btn_layout.addWidget(self.print_btn)
+
+        self.model.modelReset.connect(self._update_status)
+        self.model.rowsInserted.connect(self._update_status)
+        self.model.page_failed.connect(lambda error: self.status_label.setText(f"Could not load invoices: {error}"))
 
     def _center_window(self):
         self.setGeometry(
@@ -34,35 +96,77 @@ class InvoiceSearchWindow(QDialog):
             self.height()
         )
 
+    def _get_filters(self):
+        """:return: search_invoices keyword arguments, or None after warning about a bad field"""
+        filters = {"invoice_prefix": self.entry.text().strip(), "customer": self.customer_edit.text().strip()}
+        try:
+            for edit, key in ((self.start_edit, "start"), (self.end_edit, "end")):
+                text = edit.text().strip()
+                if text:
+                    day = datetime.date.fromisoformat(text)
+                    # The To date is inclusive, so search up to the start of the next day
+                    filters[key] = str(day + datetime.timedelta(days=1) if key == "end" else day)
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Dates must be written as YYYY-MM-DD.")
+            return None
+        try:
+            for edit, key in ((self.min_total_edit, "min_total"), (self.max_total_edit, "max_total")):
+                text = edit.text().strip()
+                if text:
+                    filters[key] = float(text)
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Amounts must be numbers.")
+            return None
+        return filters
+
     def search(self):
-        invoice_no = self.entry.text().strip()
-        print(f"Searching for invoice: {invoice_no}")  # Debug print
+        filters = self._get_filters()
+        if filters is None:
+            return
+        # Pages are looked up off the GUI thread; a new search supersedes the old one's pages
+        self.model.search(**filters)
+
+    def _update_status(self):
+        more = "+" if self.model.canFetchMore() else ""
+        self.status_label.setText(f"{self.model.rowCount()}{more} invoice(s)")
 
-        if not invoice_no:
-            QMessageBox.warning(self, "Input Error", "Please enter an invoice number.")
+    def print_selected(self):
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
+            QMessageBox.warning(self, "No Selection", "Please select an invoice to print.")
+            return
+        if not self.printer:
+            QMessageBox.critical(self, "Printer Error", "No printer configured.")
             return
 
-        result = self.sales_manager.get_sale_by_invoice(invoice_no)
-        print(f"Result from sales_manager: {result}")  # Debug print
+        # row = (id, timestamp, items_summary, total_price, customer_name, invoice_no)
+        row = self.model.row_at(selected_rows[0].row())
+        self.print_btn.setEnabled(False)
+        self.worker.submit(self.sales_manager.get_bill, row[0],
+                           on_result=self._print_result, on_error=self._print_failed, key=(self, "print"))
 
-        if not result:
+    def _print_failed(self, error):
+        self.print_btn.setEnabled(True)
+        QMessageBox.critical(self, "Error", f"Could not retrieve the invoice: {error}")
+
+    def _print_result(self, bill):
+        self.print_btn.setEnabled(True)
+        if not bill:
             QMessageBox.critical(self, "Not Found", "No sale found with this invoice number.")
             return
 
-        sale_id, timestamp, part_name, qty, total, customer_name, invoice = result
+        # Every line of the sale, not just the first
+        customer_name, invoice_no, items, sold_at = bill
+        bill_text = self.printer.generate_bill(customer_name, items, invoice_no=invoice_no, sold_at=sold_at)
 
-        if not self.printer:
-            QMessageBox.critical(self, "Printer Error", "No printer configured.")
-            return
+        self.printer.print_bill(bill_text, invoice_no=invoice_no, on_error=self.spool_failed.emit)
 
-        bill_text = self.printer.generate_bill(customer_name, [{
-            "name": part_name,
-            "qty": qty,
-            "total": total
-        }], invoice_no=invoice)
+        QMessageBox.information(self, "Success", f"Invoice {invoice_no} sent to the printer.")
 
-        print("Printing bill...")  # Debug print
-        self.printer.print_bill(bill_text)
+    def _spool_failed(self, error):
+        QMessageBox.critical(self, "Printer Error", f"The invoice could not be printed: {error}")
 
-        QMessageBox.information(self, "Success", "Invoice printed successfully.")
-        self.close()
+    def done(self, result):
+        self.worker.cancel((self.model, "page"))
+        self.worker.cancel((self, "print"))
+        super().done(result)
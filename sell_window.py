@@ -1,7 +1,5 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import time
 
 class SellWindow:
     def __init__(self, inventory_manager, sales_manager, printer=None, parent=None):
@@ -10,8 +8,11 @@ class SellWindow:
         self.printer = printer
         self.parent = parent
         self.cart = {}  # barcode → {"name": str, "price": float, "qty": int}
+        self.total_price = 0.0
 
         self.win = tk.Toplevel()
+        # Print failures arrive after this window has closed, so they are shown from the root
+        self.root = self.win.master
         self.win.title("Sell Items (Barcode Mode)")
         self.win.geometry("700x650")
         self.center_window(self.win)
@@ -61,30 +62,34 @@ class SellWindow:
         if not barcode:
             return
 
+        # Primary-key lookup, usually answered from the product cache
         product = self.inventory_manager.get_product_by_barcode(barcode)
         if not product:
             messagebox.showerror("Not Found", f"No product found for barcode: {barcode}")
             return
 
-        name, price = product["name"], float(product["price"])
-        if barcode in self.cart:
-            self.cart[barcode]["qty"] += 1
-        else:
-            self.cart[barcode] = {"name": name, "price": price, "qty": 1}
-
-        self.update_cart_display()
-
-    def update_cart_display(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-
-        total_price = 0
-        for barcode, item in self.cart.items():
-            subtotal = item["price"] * item["qty"]
-            total_price += subtotal
-            self.tree.insert("", "end", iid=barcode, values=(item["name"], item["qty"], f"{item['price']:.2f}", f"{subtotal:.2f}"))
+        item = self.cart.get(barcode)
+        qty = (item["qty"] if item else 0) + 1
+        if qty > product["stock"]:
+            messagebox.showwarning("Out of Stock", f"Only {product['stock']:g} of {product['name']} in stock.")
+            return
 
-        self.total_label.config(text=f"Total: {total_price:.2f}")
+        if item is None:
+            item = self.cart[barcode] = {"name": product["name"], "price": float(product["price"]), "qty": 0}
+        item["qty"] = qty
+        self.total_price += item["price"]
+        self.update_cart_row(barcode)
+
+    # Only the scanned line's row and the total label change, however long the cart is
+    def update_cart_row(self, barcode):
+        item = self.cart[barcode]
+        values = (item["name"], item["qty"], f"{item['price']:.2f}", f"{item['price'] * item['qty']:.2f}")
+        if self.tree.exists(barcode):
+            self.tree.item(barcode, values=values)
+        else:
+            self.tree.insert("", "end", iid=barcode, values=values)
+        self.tree.see(barcode)
+        self.total_label.config(text=f"Total: {self.total_price:.2f}")
 
     def remove_selected_item(self):
         selected = self.tree.selection()
@@ -92,39 +97,36 @@ class SellWindow:
             messagebox.showwarning("No Selection", "Please select an item to remove.")
             return
         barcode = selected[0]
-        if barcode in self.cart:
-            del self.cart[barcode]
-        self.update_cart_display()
+        item = self.cart.pop(barcode, None)
+        if item:
+            self.total_price -= item["price"] * item["qty"]
+        self.tree.delete(barcode)
+        # Start from zero again once the cart is empty, so rounding never builds up
+        if not self.cart:
+            self.total_price = 0.0
+        self.total_label.config(text=f"Total: {self.total_price:.2f}")
 
     def confirm_sale(self):
         if not self.cart:
             messagebox.showwarning("Empty Cart", "No items in cart.")
             return
 
-        invoice_no = f"INV-{int(time.time())}"
-        items_list = [
-            {"name": item["name"], "qty": item["qty"], "price": item["price"], "total": item["price"] * item["qty"]}
-            for item in self.cart.values()
-        ]
-        total_amount = sum(item["total"] for item in items_list)
-
-        # Store in DB as single record
-        self.sales_manager.add_sale(
-            timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
-            items_json=json.dumps(items_list),
-            total_price=total_amount,
-            customer_name="",
-            invoice_no=invoice_no
-        )
-
-        # Reduce stock
-        for barcode, item in self.cart.items():
-            self.inventory_manager.reduce_stock(barcode, item["qty"])
+        # Sale row and every stock decrement commit together
+        cart = [{"barcode_id": barcode, "quantity": item["qty"]} for barcode, item in self.cart.items()]
+        try:
+            invoice_no, sold = self.sales_manager.checkout(cart, customer_name="")
+        except ValueError as e:
+            messagebox.showerror("Sale Failed", str(e))
+            return
 
         # Print bill
         if self.printer:
-            bill_text = self.printer.generate_bill("", items_list, invoice_no=invoice_no)
-            self.printer.print_bill(bill_text)
+            bill_text = self.printer.generate_bill("", sold, invoice_no=invoice_no)
+            self.printer.print_bill(bill_text, invoice_no=invoice_no, on_error=self._print_failed)
 
         messagebox.showinfo("Sale Complete", f"Sale recorded with Invoice No: {invoice_no}")
         self.win.destroy()
+
+    def _print_failed(self, error):
+        # Called on the spooler thread; after() hands the message box to Tk's thread
+        self.root.after(0, lambda: messagebox.showerror("Printer Error", f"The bill could not be printed: {error}"))
@@ -0,0 +1,86 @@
+"""
+Collision-free, sortable IDs for barcodes and invoice numbers.
+
+Numbers come from the sequences table, reserved a block at a time so a
+process only writes to the database once per block. Every till and import
+reserves its own block inside BEGIN IMMEDIATE, so no two processes can
+ever be handed the same number; unused numbers in a block are skipped.
+"""
+import threading
+
+# Numbers reserved per database round trip
+DEFAULT_BLOCK = 100
+
+# GS1 "restricted circulation" prefix, meant for in-store EAN-13 codes.
+# Older time-based barcodes start with 1, so the two never overlap.
+BARCODE_PREFIX = "20"
+INVOICE_PREFIX = "INV"
+
+
+def check_digit(digits):
+    """GS1 mod-10 check digit: weights 3, 1, 3, ... from the rightmost digit."""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str(-total % 10)
+
+
+def has_valid_check_digit(code):
+    digits = code[len(INVOICE_PREFIX):] if code.startswith(INVOICE_PREFIX) else code
+    return digits.isdigit() and len(digits) > 1 and check_digit(digits[:-1]) == digits[-1]
+
+
+def format_barcode(number):
+    """EAN-13 body: prefix, 10-digit number, check digit."""
+    body = f"{BARCODE_PREFIX}{number:010d}"
+    return body + check_digit(body)
+
+
+def format_invoice(number):
+    body = f"{number:09d}"
+    return f"{INVOICE_PREFIX}{body}{check_digit(body)}"
+
+
+class Sequence:
+    """
+    Hands out increasing integers for one named sequence, reserving
+    block_size at a time. One instance per database file and name is shared
+    by the whole process, so managers on the same file draw from one block.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, database, name, block_size=DEFAULT_BLOCK):
+        self.database = database
+        self.name = name
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0  # first number past the current block
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, database, name, block_size=DEFAULT_BLOCK):
+        key = (database.path, name)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(database, name, block_size)
+            return cls._instances[key]
+
+    def next_value(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve_block()
+            value = self._next
+            self._next += 1
+            return value
+
+    def _reserve_block(self):
+        # A block reserved inside a caller's transaction would be handed out
+        # again if that transaction rolled back, so reservations commit alone
+        if self.database.connection().in_transaction:
+            raise RuntimeError(f"Take {self.name} numbers before opening a transaction")
+        with self.database.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO sequences (name, next_value) VALUES (?, 1)", (self.name,))
+            conn.execute("UPDATE sequences SET next_value = next_value + ? WHERE name = ?",
+                         (self.block_size, self.name))
+            end = conn.execute("SELECT next_value FROM sequences WHERE name = ?", (self.name,)).fetchone()[0]
+        return end - self.block_size, end
@@ -0,0 +1,186 @@
+"""
+Stock movement ledger and point-in-time stock.
+
+Every change to stock_units.amount is also appended to stock_movements as a
+signed quantity, in the same transaction. Full copies of stock_units are
+kept in stock_snapshots now and then, so stock at any moment is the nearest
+snapshot plus (or minus) the movements between it and that moment.
+
+    python stock_ledger.py [--db inventory.db] snapshot
+    python stock_ledger.py [--db inventory.db] at 2026-03-01 [--barcode B ...]
+    python stock_ledger.py [--db inventory.db] history BARCODE
+"""
+import argparse
+import datetime
+
+from database import Database
+from migrations import migrate
+
+MOVEMENT_KINDS = ("opening", "receipt", "sale", "adjustment", "return")
+
+# A new snapshot is due once this many movements, or one per product if
+# that is more, have been added since the last; a snapshot writes one row
+# per product, so this keeps snapshots no bigger than the ledger itself
+SNAPSHOT_MIN_MOVEMENTS = 10000
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def record_movements(conn, movements):
+    """
+    Append movements; call inside the transaction that changes stock_units.
+    :param movements: iterable of (barcode_id, kind, qty, ref); zero quantities are skipped
+    """
+    conn.executemany("""
+        INSERT INTO stock_movements (barcode_id, timestamp, kind, qty, ref)
+        VALUES (?, datetime('now'), ?, ?, ?)
+    """, [movement for movement in movements if movement[2]])
+
+
+def record_stock_levels(conn, levels):
+    """
+    Append the difference between current and new stock, for writes that set
+    amounts outright. A new product's stock is a receipt, a change an adjustment.
+    Call before stock_units is written.
+    :param levels: iterable of (barcode_id, new amount); when a barcode repeats,
+        its last amount is the one stock_units ends up with, so only that is diffed
+    """
+    conn.executemany("""
+        INSERT INTO stock_movements (barcode_id, timestamp, kind, qty)
+        SELECT n.barcode_id, datetime('now'),
+               CASE WHEN s.barcode_id IS NULL THEN 'receipt' ELSE 'adjustment' END,
+               n.amount - COALESCE(s.amount, 0)
+        FROM (SELECT ? AS barcode_id, COALESCE(?, 0) AS amount) n
+        LEFT JOIN stock_units s ON s.barcode_id = n.barcode_id
+        WHERE n.amount != COALESCE(s.amount, 0)
+    """, dict(levels).items())
+
+
+def take_snapshot(database):
+    """Copy every stock level as it stands now. :return: snapshot id"""
+    with database.transaction() as conn:
+        cur = conn.execute("""
+            INSERT INTO stock_snapshots (taken_at, last_movement_id)
+            SELECT datetime('now'), COALESCE(MAX(id), 0) FROM stock_movements
+        """)
+        conn.execute("""
+            INSERT INTO stock_snapshot_items (snapshot_id, barcode_id, amount)
+            SELECT ?, barcode_id, COALESCE(amount, 0) FROM stock_units
+        """, (cur.lastrowid,))
+    return cur.lastrowid
+
+
+def maybe_snapshot(database, min_movements=SNAPSHOT_MIN_MOVEMENTS):
+    """Take a snapshot if enough movements have piled up since the last. :return: snapshot id, or None"""
+    conn = database.connection()
+    since, products = conn.execute("""
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM stock_movements)
+             - (SELECT COALESCE(MAX(last_movement_id), 0) FROM stock_snapshots),
+               (SELECT COUNT(*) FROM stock_units)
+    """).fetchone()
+    if since >= max(min_movements, products):
+        return take_snapshot(database)
+    return None
+
+
+def stock_at(database, when, barcode_ids=None):
+    """
+    Stock as it stood at `when` (movements at or after it not yet applied).
+    Starts from whichever snapshot has fewer movements between it and `when`,
+    so the cost is one snapshot read and a short ledger range.
+    :param when: "YYYY-MM-DD[ HH:MM:SS]" in UTC, or a date/datetime
+    :param barcode_ids: only these parts; None for the whole catalogue
+    :return: {barcode_id: amount}
+    """
+    when = _timestamp(when)
+    conn = database.connection()
+    only, params = "", []
+    if barcode_ids is not None:
+        barcode_ids = list(barcode_ids)
+        only = f"AND barcode_id IN ({','.join('?' * len(barcode_ids))})"
+        params = barcode_ids
+
+    before = conn.execute("""
+        SELECT id, last_movement_id FROM stock_snapshots
+        WHERE taken_at <= ? ORDER BY taken_at DESC, id DESC LIMIT 1
+    """, (when,)).fetchone()
+    after = conn.execute("""
+        SELECT id, last_movement_id FROM stock_snapshots
+        WHERE taken_at >= ? ORDER BY taken_at, id LIMIT 1
+    """, (when,)).fetchone()
+    # Id of the first movement at or after `when`, to size each direction's range;
+    # ordered by timestamp so it is read from idx_stock_movements_time, not a rowid scan
+    row = conn.execute("""
+        SELECT id FROM stock_movements WHERE timestamp >= ? ORDER BY timestamp, id LIMIT 1
+    """, (when,)).fetchone()
+    boundary = row[0] if row else conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM stock_movements").fetchone()[0]
+
+    # A snapshot only fits if it ends on the right side of the boundary, which
+    # holds unless timestamps went backwards (e.g. a till's clock was changed)
+    forward_cost = boundary - 1 - before[1] if before and before[1] < boundary else None
+    backward_cost = after[1] - (boundary - 1) if after and after[1] >= boundary - 1 else None
+    if backward_cost is None or (forward_cost is not None and forward_cost <= backward_cost):
+        # With no usable snapshot before `when`, replay the ledger from the start
+        snapshot_id, last_movement_id = before if forward_cost is not None else (None, 0)
+        rows = conn.execute(f"""
+            SELECT barcode_id, SUM(amount) FROM (
+                SELECT barcode_id, amount FROM stock_snapshot_items WHERE snapshot_id = ? {only}
+                UNION ALL
+                SELECT barcode_id, qty FROM stock_movements WHERE id > ? AND timestamp < ? {only}
+            ) GROUP BY barcode_id
+        """, (snapshot_id, *params, last_movement_id, when, *params))
+    else:
+        # Walk back from a later snapshot, undoing what happened since `when`
+        snapshot_id, last_movement_id = after
+        rows = conn.execute(f"""
+            SELECT barcode_id, SUM(amount) FROM (
+                SELECT barcode_id, amount FROM stock_snapshot_items WHERE snapshot_id = ? {only}
+                UNION ALL
+                SELECT barcode_id, -qty FROM stock_movements WHERE id <= ? AND timestamp >= ? {only}
+            ) GROUP BY barcode_id
+        """, (snapshot_id, *params, last_movement_id, when, *params))
+    return dict(rows.fetchall())
+
+
+def movements(database, barcode_id, start=None, end=None):
+    """:return: list of (id, timestamp, kind, qty, ref) for one part, oldest first"""
+    conn = database.connection()
+    return conn.execute("""
+        SELECT id, timestamp, kind, qty, ref FROM stock_movements
+        WHERE barcode_id = ?
+          AND (? IS NULL OR timestamp >= ?)
+          AND (? IS NULL OR timestamp < ?)
+        ORDER BY timestamp, id
+    """, (barcode_id, start, start, end, end)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock ledger snapshots and point-in-time stock.")
+    parser.add_argument("--db", default="inventory.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("snapshot", help="copy current stock levels now")
+    p = sub.add_parser("at", help="stock as it stood at a date or time (UTC)")
+    p.add_argument("when")
+    p.add_argument("--barcode", nargs="*")
+    p = sub.add_parser("history", help="every movement of one part")
+    p.add_argument("barcode")
+    args = parser.parse_args()
+
+    database = Database.get(args.db)
+    migrate(database)
+    if args.command == "snapshot":
+        print(f"snapshot {take_snapshot(database)} taken")
+    elif args.command == "at":
+        for barcode_id, amount in sorted(stock_at(database, args.when, args.barcode).items()):
+            print(f"{barcode_id:<16} {amount:>10g}")
+    else:
+        for movement_id, timestamp, kind, qty, ref in movements(database, args.barcode):
+            print(f"{timestamp}  {kind:<10} {qty:>+10g}  {ref or ''}")
+
+
+if __name__ == "__main__":
+    main()
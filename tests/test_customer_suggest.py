@@ -0,0 +1,36 @@
+from customer_manager import CustomerManager, SUGGEST_MAX_SORTED, name_key
+from database import Database
+
+
+def _customers(tmp_path, count):
+    customers = CustomerManager(db=str(tmp_path / "customers.db"))
+    with customers.database.transaction() as conn:
+        conn.executemany("INSERT INTO customers (name, name_key, phone, last_sale_at) VALUES (?, ?, ?, ?)", [
+            (f"Workshop {i:05d}", name_key(f"Workshop {i:05d}"), f"0300{i:07d}",
+             None if i % 7 == 0 else f"2026-{1 + i % 12:02d}-{1 + i * 13 % 28:02d} 10:00:{i % 60:02d}")
+            for i in range(count)
+        ])
+    return customers
+
+
+def _expected(customers, column, prefix, limit):
+    rows = customers.database.connection().execute(
+        f"SELECT customer_id, last_sale_at, {column} FROM customers").fetchall()
+    rows = [row for row in rows if row[2] and row[2].startswith(prefix)]
+    rows.sort(key=lambda row: row[1] or "", reverse=True)
+    return [row[1] for row in rows[:limit]]
+
+
+def test_suggest_orders_broad_and_narrow_prefixes_by_recency(tmp_path):
+    customers = _customers(tmp_path, 3 * SUGGEST_MAX_SORTED)
+    try:
+        # "workshop" and "0300" match every customer, the rest fewer than SUGGEST_MAX_SORTED
+        for text, column, prefix in [("work", "name_key", "workshop"), ("0300", "phone", "0300"),
+                                     ("workshop 001", "name_key", "workshop 001"),
+                                     ("03000000", "phone", "03000000")]:
+            got = [customer.last_sale_at for customer in customers.suggest(text, 15)]
+            assert got == _expected(customers, column, prefix, 15)
+            assert all(getattr(customer, "phone" if column == "phone" else "name").lower().startswith(prefix)
+                       for customer in customers.suggest(text, 15))
+    finally:
+        Database.get(customers.db).close()
@@ -0,0 +1,45 @@
+from database import Database
+from inventory_manager import InventoryManager
+
+PAGE = 200
+
+
+def _inventory(tmp_path, parts):
+    inventory = InventoryManager(db=str(tmp_path / "inventory.db"), barcode_dir=str(tmp_path / "barcodes"))
+    inventory.upsert_products([
+        (f"B{i:05d}", f"PART {i % 40}", "ACME", 1, 10.0, 12.0, 5) for i in range(parts)
+    ])
+    return inventory
+
+
+def _all_pages(inventory, query):
+    rows = []
+    while True:
+        page = inventory.search(query, PAGE, len(rows))
+        rows += page
+        if len(page) < PAGE:
+            return rows
+
+
+def test_search_pages_past_the_window_are_unique_and_complete(tmp_path):
+    parts = 3 * InventoryManager.SEARCH_WINDOW
+    inventory = _inventory(tmp_path, parts)
+    try:
+        barcodes = [row[0] for row in _all_pages(inventory, "part")]
+        assert len(barcodes) == parts
+        assert set(barcodes) == {f"B{i:05d}" for i in range(parts)}
+    finally:
+        inventory.barcodes.shutdown()
+        Database.get(inventory.db).close()
+
+
+def test_search_pages_match_one_unpaged_read(tmp_path):
+    inventory = _inventory(tmp_path, InventoryManager.SEARCH_WINDOW + 500)
+    try:
+        # Page boundaries that straddle the end of the ranked window
+        whole = inventory.search("part 1", 10000)
+        assert _all_pages(inventory, "part 1") == whole
+        assert inventory.search("part 1", 300, 900) == whole[900:1200]
+    finally:
+        inventory.barcodes.shutdown()
+        Database.get(inventory.db).close()